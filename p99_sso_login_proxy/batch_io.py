@@ -0,0 +1,344 @@
+"""Batched datagram transport for the proxy's UDP sockets (Linux).
+
+asyncio's selector datagram transport makes one ``recvfrom`` syscall per
+readiness event, allocating a fresh ``bytes`` for every datagram, and one
+``sendto`` syscall per outgoing datagram.
+
+:class:`BatchDatagramTransport` instead drains up to :data:`RECV_BATCH`
+datagrams per readiness event with a single ``recvmmsg`` into buffers it
+allocates once, and hands each one to the protocol as a ``memoryview``.
+Outgoing datagrams are queued and written with ``sendmmsg``, up to
+:data:`SEND_BATCH` per syscall, once per loop tick. CPython binds neither
+call, so they are reached through ``ctypes``.
+
+The views passed to ``datagram_received`` point into the reused buffers
+and are only valid during the call; protocols must copy anything they
+keep. :class:`server.LoginProxy` copies each packet exactly once, into the
+``bytearray`` its rewrite stages edit in place.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import ctypes
+import errno
+import functools
+import logging
+import os
+import socket
+import struct
+import sys
+from collections.abc import Callable
+
+logger = logging.getLogger("batch_io")
+
+# Datagrams read per readiness event before yielding back to the loop.
+RECV_BATCH = 64
+
+# Datagrams written per sendmmsg call.
+SEND_BATCH = 64
+
+# Receive buffer size. SOE sessions negotiate a max packet size of a few
+# hundred bytes, so anything near this is not login traffic.
+MAX_DATAGRAM = 4096
+
+# sizeof(struct sockaddr_storage)
+_SOCKADDR_LEN = 128
+
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+Address = tuple[str, int]
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+_recvmmsg = None
+_sendmmsg = None
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _recvmmsg = _libc.recvmmsg
+        _sendmmsg = _libc.sendmmsg
+    except (OSError, AttributeError):
+        _recvmmsg = _sendmmsg = None
+    else:
+        _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        _recvmmsg.restype = ctypes.c_int
+        _sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        _sendmmsg.restype = ctypes.c_int
+
+
+def supported() -> bool:
+    """Return True where the batched transport is used (Linux)."""
+    return _recvmmsg is not None and _sendmmsg is not None
+
+
+def _buffer_address(buf: bytearray) -> int:
+    return ctypes.addressof((ctypes.c_char * len(buf)).from_buffer(buf))
+
+
+def _bytes_address(data: bytes) -> int:
+    return ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value or 0
+
+
+@functools.lru_cache(maxsize=1024)
+def _decode_sockaddr(raw: bytes) -> tuple | None:
+    """Turn a kernel ``sockaddr_in``/``sockaddr_in6`` into a socket address."""
+    family = int.from_bytes(raw[:2], sys.byteorder)
+    if family == socket.AF_INET:
+        port = int.from_bytes(raw[2:4], "big")
+        return socket.inet_ntop(socket.AF_INET, raw[4:8]), port
+    if family == socket.AF_INET6:
+        port, flowinfo = struct.unpack("!HI", raw[2:8])
+        scope_id = int.from_bytes(raw[24:28], sys.byteorder)
+        return socket.inet_ntop(socket.AF_INET6, raw[8:24]), port, flowinfo, scope_id
+    return None
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_sockaddr(addr: tuple) -> bytes:
+    """Build the ``sockaddr`` for an IP address tuple (no name lookup)."""
+    host, port = addr[0], addr[1]
+    if ":" in host:
+        flowinfo = addr[2] if len(addr) > 2 else 0
+        scope_id = addr[3] if len(addr) > 3 else 0
+        return (
+            struct.pack("=H", socket.AF_INET6)
+            + struct.pack("!HI", port, flowinfo)
+            + socket.inet_pton(socket.AF_INET6, host)
+            + struct.pack("=I", scope_id)
+        )
+    return (
+        struct.pack("=H", socket.AF_INET) + struct.pack("!H", port) + socket.inet_pton(socket.AF_INET, host) + bytes(8)
+    )
+
+
+class BatchDatagramTransport(asyncio.DatagramTransport):
+    """Datagram transport that reads and writes a UDP socket in batches."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        sock: socket.socket,
+        protocol: asyncio.DatagramProtocol,
+        address: Address | None = None,
+    ):
+        super().__init__({"socket": sock, "sockname": sock.getsockname(), "peername": address})
+        self._loop = loop
+        self._sock = sock
+        self._fd = sock.fileno()
+        self._protocol = protocol
+        # Peer of a connected socket; sendto() then needs no address.
+        self._address = address
+
+        # recvmmsg: one slot per datagram, each with its own data and
+        # source address buffer, all allocated once.
+        self._recv_data = bytearray(RECV_BATCH * MAX_DATAGRAM)
+        self._recv_view = memoryview(self._recv_data)
+        self._recv_names = bytearray(RECV_BATCH * _SOCKADDR_LEN)
+        self._recv_iov = (_IoVec * RECV_BATCH)()
+        self._recv_msgs = (_MMsgHdr * RECV_BATCH)()
+        data_base = _buffer_address(self._recv_data)
+        names_base = _buffer_address(self._recv_names)
+        for i in range(RECV_BATCH):
+            self._recv_iov[i].iov_base = data_base + i * MAX_DATAGRAM
+            self._recv_iov[i].iov_len = MAX_DATAGRAM
+            hdr = self._recv_msgs[i].msg_hdr
+            hdr.msg_name = names_base + i * _SOCKADDR_LEN
+            hdr.msg_namelen = _SOCKADDR_LEN
+            hdr.msg_iov = ctypes.pointer(self._recv_iov[i])
+            hdr.msg_iovlen = 1
+        # Slots the last recvmmsg filled; their name lengths need resetting.
+        self._recv_used = 0
+
+        # sendmmsg: headers are filled in per flush from the queue.
+        self._send_iov = (_IoVec * SEND_BATCH)()
+        self._send_msgs = (_MMsgHdr * SEND_BATCH)()
+        for i in range(SEND_BATCH):
+            hdr = self._send_msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._send_iov[i])
+            hdr.msg_iovlen = 1
+        self._send_queue: collections.deque[tuple[bytes, Address | None]] = collections.deque()
+        self._flush_scheduled = False
+        self._writing = False
+        self._closing = False
+        loop.call_soon(protocol.connection_made, self)
+        loop.call_soon(loop.add_reader, self._fd, self._read_ready)
+
+    # ------------------------------------------------------------------
+    # Receive
+    # ------------------------------------------------------------------
+    def _read_ready(self) -> None:
+        if self._closing:
+            return
+        msgs = self._recv_msgs
+        for i in range(self._recv_used):
+            msgs[i].msg_hdr.msg_namelen = _SOCKADDR_LEN
+        count = _recvmmsg(self._fd, msgs, RECV_BATCH, socket.MSG_DONTWAIT, None)
+        if count < 0:
+            self._recv_used = 0
+            err = ctypes.get_errno()
+            if err not in _WOULD_BLOCK:
+                self._protocol.error_received(OSError(err, os.strerror(err)))
+            return
+        self._recv_used = count
+        names = self._recv_names
+        view = self._recv_view
+        for i in range(count):
+            if self._closing:
+                return
+            msg = msgs[i]
+            start = i * _SOCKADDR_LEN
+            addr = self._address or _decode_sockaddr(bytes(names[start : start + msg.msg_hdr.msg_namelen]))
+            start = i * MAX_DATAGRAM
+            self._protocol.datagram_received(view[start : start + msg.msg_len], addr)
+
+    # ------------------------------------------------------------------
+    # Send
+    # ------------------------------------------------------------------
+    def sendto(self, data, addr: Address | None = None) -> None:
+        if self._closing:
+            return
+        if addr is None:
+            addr = self._address
+        self._send_queue.append((data if isinstance(data, bytes) else bytes(data), addr))
+        if not self._flush_scheduled and not self._writing:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        queue = self._send_queue
+        msgs = self._send_msgs
+        iov = self._send_iov
+        while queue:
+            count = min(len(queue), SEND_BATCH)
+            # The datagrams stay in the queue, and so alive, until sent;
+            # this keeps their sockaddrs alive for the call.
+            names = []
+            error = None
+            for i in range(count):
+                data, addr = queue[i]
+                iov[i].iov_base = _bytes_address(data)
+                iov[i].iov_len = len(data)
+                if self._address is not None:
+                    continue
+                try:
+                    name = _encode_sockaddr(addr)
+                except (OSError, TypeError, ValueError) as exc:
+                    # Send what precedes it; it is dropped at the head of the queue.
+                    count, error = i, exc
+                    break
+                names.append(name)
+                hdr = msgs[i].msg_hdr
+                hdr.msg_name = _bytes_address(name)
+                hdr.msg_namelen = len(name)
+            if count == 0:
+                queue.popleft()
+                self._protocol.error_received(error)
+                continue
+            sent = _sendmmsg(self._fd, msgs, count, socket.MSG_DONTWAIT)
+            if sent < 0:
+                err = ctypes.get_errno()
+                if err in _WOULD_BLOCK:
+                    # Socket buffer full; finish when it drains.
+                    if not self._writing:
+                        self._writing = True
+                        self._loop.add_writer(self._fd, self._flush)
+                    return
+                # Only the first datagram failed; the rest are retried.
+                self._protocol.error_received(OSError(err, os.strerror(err)))
+                sent = 1
+            for _ in range(sent):
+                queue.popleft()
+        if self._writing:
+            self._writing = False
+            self._loop.remove_writer(self._fd)
+        if self._closing:
+            self._finish()
+
+    def get_write_buffer_size(self) -> int:
+        return sum(len(data) for data, _ in self._send_queue)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        return self._protocol
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        if not self._send_queue:
+            self._loop.call_soon(self._finish)
+
+    def abort(self) -> None:
+        self._send_queue.clear()
+        self.close()
+
+    def _finish(self) -> None:
+        if self._sock.fileno() == -1:
+            return
+        if self._writing:
+            self._loop.remove_writer(self._fd)
+        self._sock.close()
+        self._protocol.connection_lost(None)
+
+
+async def create_datagram_endpoint(
+    loop: asyncio.AbstractEventLoop,
+    protocol_factory: Callable[[], asyncio.DatagramProtocol],
+    *,
+    local_addr: Address | None = None,
+    remote_addr: Address | None = None,
+    reuse_port: bool | None = None,
+) -> tuple[BatchDatagramTransport, asyncio.DatagramProtocol]:
+    """Batched counterpart of :meth:`loop.create_datagram_endpoint`.
+
+    Supports the subset of arguments the proxy uses.
+    """
+    target = local_addr or remote_addr
+    infos = await loop.getaddrinfo(*target, type=socket.SOCK_DGRAM)
+    family = infos[0][0]
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if local_addr is not None:
+            sock.bind(infos[0][4])
+        address = None
+        if remote_addr is not None:
+            if local_addr is not None:
+                infos = await loop.getaddrinfo(*remote_addr, family=family, type=socket.SOCK_DGRAM)
+            address = infos[0][4]
+            await loop.sock_connect(sock, address)
+    except OSError:
+        sock.close()
+        raise
+    protocol = protocol_factory()
+    return BatchDatagramTransport(loop, sock, protocol, address), protocol
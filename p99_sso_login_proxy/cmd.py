@@ -23,7 +23,7 @@ class QtAsyncApp(QApplication):
 
     def __init__(self, argv):
         super().__init__(argv)
-        self.loop = asyncio.new_event_loop()
+        self.loop = server.new_event_loop()
         self.running = False
         self.transport = None
         self.exit_event = threading.Event()
@@ -96,6 +96,11 @@ class QtAsyncApp(QApplication):
         future.add_done_callback(_on_restart_done)
         logger.info("Restart scheduled on asyncio loop.")
 
+    def prewarm_proxy(self):
+        """Have the proxy ready the login path (main thread)."""
+        if self.transport is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.transport.get_protocol().prewarm)
+
     def stop_event_loop(self):
         logger.info("Stopping event loop in QtAsyncApp")
         self.exit_event.set()
@@ -192,6 +197,12 @@ def _enforce_single_instance() -> bool:
 
 
 def main():
+    if "--headless" in sys.argv[1:]:
+        from p99_sso_login_proxy import headless
+
+        headless.main()
+        return
+
     qt_app = QtAsyncApp(sys.argv)
     theme.apply_app_theme(qt_app, dark_mode=config.DARK_MODE)
 
@@ -235,6 +246,7 @@ def main():
         main_window.start_eq_func = start_eq_windows
     else:
         main_window.start_eq_func = start_eq_linux
+    main_window.prewarm_func = qt_app.prewarm_proxy
 
     if config.LAUNCH_STARTUP:
         QTimer.singleShot(0, main_window.on_launch_eq)
@@ -1,7 +1,6 @@
 import datetime
 import os
 import re
-import socket
 
 from p99_sso_login_proxy import __version_semver__, utils
 from p99_sso_login_proxy.config_repair import load_config_parser, resolve_backend_name
@@ -34,12 +33,9 @@ ENCRYPTION_IV = utils.hex_to_bytes(CONFIG.get("encryption", "iv", fallback="\\x0
 
 EQEMU_LOGIN_HOST = CONFIG.get("DEFAULT", "login_server", fallback="login.eqemulator.net")
 EQEMU_PORT = CONFIG.getint("DEFAULT", "login_port", fallback=5998)
-try:
-    EQEMU_LOGIN_IP = socket.gethostbyname(EQEMU_LOGIN_HOST)
-except socket.gaierror:
-    # Fall back to the hostname itself if DNS resolution fails (e.g. no internet)
-    EQEMU_LOGIN_IP = EQEMU_LOGIN_HOST
-EQEMU_ADDR = (EQEMU_LOGIN_IP, EQEMU_PORT)
+# Configured login server; the proxy resolves (and re-resolves) the name
+# in the background, see resolver.LoginServerResolver
+EQEMU_ADDR = (EQEMU_LOGIN_HOST, EQEMU_PORT)
 
 DEFAULT_ICON_SET = "p99"
 
@@ -107,6 +103,56 @@ PROXY_ONLY = CONFIG.getboolean("DEFAULT", "proxy_only", fallback=False)
 # Whether to run in proxy mode
 PROXY_ENABLED = CONFIG.getboolean("DEFAULT", "proxy_enabled", fallback=True)
 
+# Pack everything the proxy sends to one peer in a single event-loop tick
+# into as few OP_Combined datagrams as the negotiated max packet size allows
+COALESCE_OUTBOUND = CONFIG.getboolean("DEFAULT", "coalesce_outbound", fallback=False)
+
+# ACK server-list fragments to the login server as soon as they arrive
+# instead of waiting for the client to ACK the rebuilt list
+ACK_SERVER_FRAGMENTS = CONFIG.getboolean("DEFAULT", "ack_server_fragments", fallback=False)
+
+# Answer client KeepAlive / SessionStatRequest probes from the proxy instead
+# of forwarding them; the proxy keeps the upstream session alive on its own
+LOCAL_TRANSPORT_PROBES = CONFIG.getboolean("DEFAULT", "local_transport_probes", fallback=False)
+
+# Seconds of upstream silence before the proxy sends its own KeepAlive
+UPSTREAM_KEEPALIVE_INTERVAL = CONFIG.getint("DEFAULT", "upstream_keepalive_interval", fallback=15)
+
+# Seconds a filtered server list is reused for the next login (0 disables)
+SERVER_LIST_CACHE_TTL = CONFIG.getint("DEFAULT", "server_list_cache_ttl", fallback=0)
+
+# Give every client its own socket to the login server so replies map
+# straight to their session (needed for concurrent logins; forced on for
+# proxy workers, where the shared port's replies may reach another worker)
+PER_CLIENT_UPSTREAM = CONFIG.getboolean("DEFAULT", "per_client_upstream", fallback=True)
+
+# Headless mode only: number of proxy worker processes sharing the listen
+# port via SO_REUSEPORT (1 = single process; needs Linux/BSD)
+PROXY_WORKERS = CONFIG.getint("DEFAULT", "proxy_workers", fallback=1)
+
+# Linux only: read and write proxy sockets with recvmmsg/sendmmsg, many
+# datagrams per syscall into reused buffers, instead of one per datagram
+BATCHED_DATAGRAM_IO = CONFIG.getboolean("DEFAULT", "batched_datagram_io", fallback=False)
+
+# Run the proxy/WebSocket event loop on uvloop when it is installed
+# (Linux/macOS; ignored on Windows)
+USE_UVLOOP = CONFIG.getboolean("DEFAULT", "use_uvloop", fallback=False)
+
+# Seconds between background DNS lookups of the login server
+LOGIN_DNS_REFRESH = CONFIG.getint("DEFAULT", "login_dns_refresh", fallback=300)
+
+# Seconds between login server latency/health probes (0 disables them)
+LOGIN_PROBE_INTERVAL = CONFIG.getint("DEFAULT", "login_probe_interval", fallback=30)
+
+# Seconds SSO credentials are reused for a repeat login of the same name
+# (0 disables), and how many names are remembered
+SSO_CREDENTIAL_CACHE_TTL = CONFIG.getint("DEFAULT", "sso_credential_cache_ttl", fallback=120)
+SSO_CREDENTIAL_CACHE_SIZE = CONFIG.getint("DEFAULT", "sso_credential_cache_size", fallback=64)
+
+# Milliseconds to gather SSO login lookups into one request when the backend
+# supports it, so a group of boxes logging in together waits once (0 disables)
+SSO_BATCH_WINDOW_MS = CONFIG.getint("DEFAULT", "sso_batch_window_ms", fallback=5)
+
 # Per-backend API tokens keyed by backend display name
 _API_TOKENS_SECTION = "api_tokens"
 _legacy_token = CONFIG.get("DEFAULT", "user_api_token", fallback="")
@@ -0,0 +1,51 @@
+"""Pre-encrypted login credentials for local accounts.
+
+A local or local_char login swaps the client's credentials for a local
+account's. The DES ciphertext for an account only depends on its name,
+password and the configured key/IV, so it is worked out once by
+:func:`prime` (at proxy start and after the local account list is edited)
+and the login path just splices the stored bytes in.
+
+Entries are keyed by everything that goes into the ciphertext, so a changed
+password or key can never hit a stale entry; :func:`prime` also drops the
+entries for accounts that changed or went away.
+"""
+
+from __future__ import annotations
+
+from p99_sso_login_proxy import config
+from p99_sso_login_proxy import login_protocol as lp
+
+# (account, password, key, iv) -> encrypted "account\0password\0"
+_cache: dict[tuple[str, str, bytes, bytes], bytes] = {}
+
+
+def _cache_key(account: str) -> tuple[str, str, bytes, bytes]:
+    return account, config.LOCAL_ACCOUNTS[account]["password"], config.ENCRYPTION_KEY, config.ENCRYPTION_IV
+
+
+def _encrypt(key: tuple[str, str, bytes, bytes]) -> bytes:
+    account, password, des_key, _iv = key
+    return lp.encrypt_login_credentials(account, password, des_key, config.iv())
+
+
+def encrypted(account: str) -> bytes:
+    """Return the encrypted credentials for local *account*.
+
+    Raises ``KeyError`` if *account* is not in ``config.LOCAL_ACCOUNTS``.
+    """
+    key = _cache_key(account)
+    enc = _cache.get(key)
+    if enc is None:
+        enc = _cache[key] = _encrypt(key)
+    return enc
+
+
+def prime() -> None:
+    """Encrypt every local account now, forgetting any outdated entries."""
+    global _cache
+    fresh = {}
+    for account in list(config.LOCAL_ACCOUNTS):
+        key = _cache_key(account)
+        fresh[key] = _cache.get(key) or _encrypt(key)
+    _cache = fresh
@@ -0,0 +1,75 @@
+"""Headless daemon: run the login proxy and SSO client without Qt.
+
+Meant for an always-on proxy on a small Linux box serving a whole LAN.
+Nothing here (or in the modules it imports) needs PySide6; connection
+events go to the log through :class:`stats.LoggingProxyStats`.
+
+Run with ``p99loginproxy-headless``, ``python -m p99_sso_login_proxy.headless``
+or ``p99loginproxy --headless``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import signal
+
+from p99_sso_login_proxy import config, server, stats, workers, ws_client
+
+logger = logging.getLogger("headless")
+
+_LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+async def run(stop: asyncio.Event | None = None) -> None:
+    """Serve until *stop* is set (or SIGINT/SIGTERM arrives)."""
+    loop = asyncio.get_running_loop()
+    if stop is None:
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, getattr(signal, "SIGTERM", None)):
+            if sig is None:
+                continue
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows event loops don't support signal handlers; Ctrl+C
+                # then surfaces as KeyboardInterrupt in main().
+                logger.debug("Signal handler for %s not installed", sig, exc_info=True)
+
+    logger.info("%s v%s running headless", config.APP_NAME, config.APP_VERSION)
+    if config.PROXY_WORKERS > 1:
+        if workers.supported():
+            await workers.run_pool(config.PROXY_WORKERS, stop)
+            return
+        logger.warning("proxy_workers=%d needs SO_REUSEPORT; running one process", config.PROXY_WORKERS)
+
+    transport = await server.main()
+    ws_task = asyncio.create_task(ws_client.start())
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Shutting down.")
+        transport.close()
+        ws_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await ws_task
+
+
+def main() -> None:
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=logging.INFO, format=_LOG_FORMAT)
+    logging.getLogger("websockets").setLevel(logging.INFO)
+    stats.PROXY_STATS = stats.LoggingProxyStats()
+    loop = server.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        with contextlib.suppress(KeyboardInterrupt):
+            loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Login server latency probe and health monitor.
+
+Every ``login_probe_interval`` seconds the proxy opens a throwaway SOE
+session with each login server address: a ``SessionRequest``, then a
+``SessionDisconnect`` as soon as the ``SessionResponse`` arrives. The round
+trip (or a loss, if nothing comes back within :data:`PROBE_TIMEOUT`) goes
+into a rolling window per address.
+
+The results feed the resolver's address choice, and a summary of the best
+address goes to ``stats.PROXY_STATS`` for the Proxy tab and the warning
+shown before launching EverQuest.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+
+from p99_sso_login_proxy import config, resolver, stats
+from p99_sso_login_proxy import soe_protocol as soe
+
+logger = logging.getLogger("health")
+
+# Seconds to wait for a SessionResponse before counting a probe as lost.
+PROBE_TIMEOUT = 2.0
+
+# Probes per address kept for percentiles and loss.
+PROBE_WINDOW = 20
+
+# Consecutive lost probes after which an address is down.
+DOWN_AFTER = 3
+
+# Median RTT (seconds) above which an address counts as slow.
+SLOW_RTT = 0.5
+
+# Better states sort first when choosing the address to report.
+_STATE_RANK = {
+    stats.LOGIN_SERVER_UP: 0,
+    stats.LOGIN_SERVER_SLOW: 1,
+    stats.LOGIN_SERVER_UNKNOWN: 2,
+    stats.LOGIN_SERVER_DOWN: 3,
+}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, connect_code: int):
+        self.connect_code = connect_code
+        self.response: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        if self.response.done() or len(data) < 17:
+            return
+        if soe.get_transport_opcode(data) != soe.TransportOp.SessionResponse:
+            return
+        response = soe.parse_session_response(data)
+        if response["connect_code"] == self.connect_code:
+            self.response.set_result(response)
+
+    def error_received(self, exc: Exception) -> None:
+        # e.g. ICMP port unreachable: the server is down, no need to wait.
+        if not self.response.done():
+            self.response.set_exception(exc)
+
+
+class LoginServerMonitor:
+    """Probe the login server's addresses and publish their health."""
+
+    def __init__(self, login_server: resolver.LoginServerResolver, interval: float | None = None):
+        self.login_server = login_server
+        self.interval = config.LOGIN_PROBE_INTERVAL if interval is None else interval
+        # Per address: RTT in seconds, or None for a lost probe.
+        self._samples: dict[resolver.Address, deque[float | None]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def probe(self, addr: resolver.Address) -> float | None:
+        """Time one SessionRequest round trip to *addr*; ``None`` if lost."""
+        loop = asyncio.get_running_loop()
+        connect_code = random.getrandbits(32)
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _ProbeProtocol(connect_code), remote_addr=addr
+            )
+        except OSError as exc:
+            logger.debug("Could not open probe socket to %s: %s", addr, exc)
+            return None
+        try:
+            sent = time.monotonic()
+            transport.sendto(soe.build_session_request(connect_code))
+            try:
+                response = await asyncio.wait_for(protocol.response, PROBE_TIMEOUT)
+            # asyncio.TimeoutError is only the builtin from 3.11 on.
+            except (asyncio.TimeoutError, OSError):  # noqa: UP041
+                return None
+            rtt = time.monotonic() - sent
+            crc = soe.SessionCrc(response["encode_key"], response["crc_bytes"])
+            transport.sendto(crc.append(soe.build_session_disconnect(connect_code)))
+            return rtt
+        finally:
+            transport.close()
+
+    def record(self, addr: resolver.Address, rtt: float | None) -> None:
+        self._samples.setdefault(addr, deque(maxlen=PROBE_WINDOW)).append(rtt)
+        if rtt is None:
+            self.login_server.record_failure(addr)
+        else:
+            self.login_server.record_rtt(addr, rtt)
+
+    def address_health(self, addr: resolver.Address) -> tuple[str, float | None, float | None, float | None]:
+        """Return ``(state, rtt_p50, rtt_p95, loss)`` for *addr*."""
+        samples = self._samples.get(addr)
+        if not samples:
+            return stats.LOGIN_SERVER_UNKNOWN, None, None, None
+        rtts = [rtt for rtt in samples if rtt is not None]
+        loss = 1 - len(rtts) / len(samples)
+        recent = list(samples)[-DOWN_AFTER:]
+        if not rtts or (len(recent) == DOWN_AFTER and all(rtt is None for rtt in recent)):
+            return stats.LOGIN_SERVER_DOWN, None, None, loss
+        p50 = percentile(rtts, 50)
+        state = stats.LOGIN_SERVER_SLOW if p50 > SLOW_RTT else stats.LOGIN_SERVER_UP
+        return state, p50, percentile(rtts, 95), loss
+
+    def summary(self) -> tuple[str, float | None, float | None, float | None]:
+        """Health of the best current address (the one logins will favour)."""
+        reports = [self.address_health(addr) for addr in self.login_server.addresses]
+        if not reports:
+            # Nothing resolved yet, so nothing has been probed.
+            return stats.LOGIN_SERVER_UNKNOWN, None, None, None
+        return min(reports, key=lambda report: (_STATE_RANK[report[0]], report[1] or 0.0))
+
+    async def probe_all(self) -> None:
+        addresses = await self.login_server.resolve()
+        results = await asyncio.gather(*(self.probe(addr) for addr in addresses))
+        for addr, rtt in zip(addresses, results, strict=True):
+            self.record(addr, rtt)
+        stats.PROXY_STATS.update_login_server_health(*self.summary())
+
+    async def _probe_forever(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception:
+                # One bad round must not end monitoring for the session.
+                logger.exception("Login server health probe failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Begin probing on the running loop (unless disabled)."""
+        if self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._probe_forever())
+
+    def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
@@ -13,7 +13,7 @@ import logging
 import threading
 from collections.abc import Callable
 
-from p99_sso_login_proxy import config, utils
+from p99_sso_login_proxy import config, routing, utils
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +54,7 @@ def _ensure_entry(name: str) -> dict:
         }
         config.LOCAL_CHARACTERS[key] = entry
         config.LOCAL_CHARACTER_NAMES.add(key)
+        routing.invalidate()
     else:
         entry.setdefault("items", _blank_items())
         for wk in (*utils.LOCAL_CHARACTER_BOOL_ITEMS, *utils.LOCAL_CHARACTER_COUNT_ITEMS):
@@ -168,6 +169,7 @@ def set_entry(entry: dict) -> None:
         }
         config.LOCAL_CHARACTERS[key] = normalized
         config.LOCAL_CHARACTER_NAMES.add(key)
+        routing.invalidate()
 
 
 def delete_entry(name: str) -> bool:
@@ -178,6 +180,7 @@ def delete_entry(name: str) -> bool:
             return False
         del config.LOCAL_CHARACTERS[key]
         config.LOCAL_CHARACTER_NAMES.discard(key)
+        routing.invalidate()
     return True
 
 
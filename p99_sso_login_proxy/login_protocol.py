@@ -315,7 +315,7 @@ class ServerEntry:
 
 
 def parse_server_list(
-    app_payload: bytes,
+    app_payload: bytes | memoryview,
 ) -> tuple[list[ServerEntry], bytes]:
     """Parse OP_ServerListResponse.
 
@@ -324,8 +324,8 @@ def parse_server_list(
     Returns ``(servers, header_bytes)`` where *header_bytes* is the
     original 16-byte header for passthrough when rebuilding.
     """
-    data = app_payload[2:]  # skip app opcode
-    header_bytes = bytes(data[:16])
+    data = bytes(app_payload[2:])  # skip app opcode; one copy for the string searches
+    header_bytes = data[:16]
     count = struct.unpack("<I", data[16:20])[0]
     pos = 20
 
@@ -359,7 +359,7 @@ def parse_server_list(
                 region=region,
                 status=status,
                 player_count=player_count,
-                raw=bytes(data[start:pos]),
+                raw=data[start:pos],
             )
         )
 
@@ -0,0 +1,188 @@
+"""Background DNS resolution for the login server address.
+
+The login server hostname is resolved on the event loop (``getaddrinfo``
+runs in the loop's executor), so a slow DNS server never blocks startup,
+and it is re-resolved periodically so a changed IP is picked up without a
+restart. The standard library does not expose record TTLs, so the
+``login_dns_refresh`` interval stands in for one; refreshes run ahead of
+expiry so lookups stay off the login path.
+
+Nothing is ever sent to the hostname itself: until a lookup has produced
+an address, sessions wait for one (see :meth:`LoginServerResolver.wait_for_address`).
+A numeric ``login_server`` needs no lookup.
+
+When the name has several addresses, each client session is sent to the
+one with the lowest measured SessionRequest -> SessionResponse round trip
+(addresses not measured yet are tried first, so each gets measured). An
+address whose SessionRequest goes unanswered is skipped for a while.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import ipaddress
+import logging
+import socket
+import time
+
+from p99_sso_login_proxy import config
+
+logger = logging.getLogger("resolver")
+
+Address = tuple[str, int]
+
+# Refresh once this fraction of the interval has passed.
+REFRESH_AHEAD = 0.8
+
+# Seconds before retrying after a failed lookup.
+RETRY_INTERVAL = 30
+
+# Seconds between lookups while a session is waiting for an address.
+PENDING_RETRY_INTERVAL = 2
+
+# Seconds to wait for one lookup.
+RESOLVE_TIMEOUT = 5
+
+# Seconds an unresponsive address is passed over.
+FAILURE_BACKOFF = 60
+
+# Weight of the newest sample in the smoothed RTT.
+RTT_SMOOTHING = 0.3
+
+
+@functools.lru_cache(maxsize=8)
+def _is_numeric(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class LoginServerResolver:
+    """Keep the login server's addresses fresh and choose one per session.
+
+    Resolves whatever ``config.EQEMU_ADDR`` currently names. Until a lookup
+    succeeds there are no addresses, unless the configured host is numeric.
+    """
+
+    def __init__(self, refresh_interval: float | None = None):
+        self.refresh_interval = config.LOGIN_DNS_REFRESH if refresh_interval is None else refresh_interval
+        self._target: Address | None = None
+        self._addresses: list[Address] = []
+        self._expires = 0.0
+        # Every address this resolver has handed out; replies from any of
+        # them are login server traffic even after the name moves.
+        self._known: set[Address] = set()
+        self._rtt: dict[Address, float] = {}
+        self._failed_until: dict[Address, float] = {}
+        self._lookup: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+
+    @property
+    def resolved(self) -> bool:
+        """True if fresh addresses for the configured server are known."""
+        if _is_numeric(config.EQEMU_ADDR[0]):
+            return True
+        return self._target == config.EQEMU_ADDR and bool(self._addresses) and time.monotonic() < self._expires
+
+    @property
+    def addresses(self) -> list[Address]:
+        """The configured server's IP addresses; empty until a lookup succeeds."""
+        if self._target == config.EQEMU_ADDR and self._addresses:
+            return list(self._addresses)
+        if _is_numeric(config.EQEMU_ADDR[0]):
+            return [config.EQEMU_ADDR]
+        return []
+
+    def is_server(self, addr: tuple[str, int]) -> bool:
+        """Return True if *addr* is (or recently was) a login server address."""
+        return addr in self._known
+
+    def pick(self) -> Address | None:
+        """Return the address a new session should use, or None if none is known yet."""
+        addresses = self.addresses
+        if not addresses:
+            return None
+        now = time.monotonic()
+        choice = min(
+            addresses,
+            key=lambda addr: (self._failed_until.get(addr, 0.0) > now, self._rtt.get(addr, 0.0)),
+        )
+        self._known.add(choice)
+        return choice
+
+    def record_rtt(self, addr: Address, rtt: float) -> None:
+        previous = self._rtt.get(addr)
+        self._rtt[addr] = rtt if previous is None else previous + RTT_SMOOTHING * (rtt - previous)
+        self._failed_until.pop(addr, None)
+
+    def record_failure(self, addr: Address) -> None:
+        now = time.monotonic()
+        # Only the first failure is news; repeats just extend the backoff.
+        if self._failed_until.get(addr, 0.0) <= now and len(self.addresses) > 1:
+            logger.info("Login server %s:%d did not answer; trying another address", *addr)
+        self._failed_until[addr] = now + FAILURE_BACKOFF
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    async def resolve(self) -> list[Address]:
+        """Return current addresses, looking them up first if stale."""
+        if not self.resolved:
+            await self.refresh()
+        return self.addresses
+
+    async def wait_for_address(self) -> Address:
+        """Return :meth:`pick`'s choice, retrying lookups until one succeeds."""
+        while True:
+            await self.resolve()
+            choice = self.pick()
+            if choice is not None:
+                return choice
+            await asyncio.sleep(PENDING_RETRY_INTERVAL)
+
+    async def refresh(self) -> bool:
+        """Look the name up now (sharing any lookup already running)."""
+        if self._lookup is None or self._lookup.done():
+            self._lookup = asyncio.ensure_future(self._do_lookup())
+        return await asyncio.shield(self._lookup)
+
+    async def _do_lookup(self) -> bool:
+        target = config.EQEMU_ADDR
+        host, port = target
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM),
+                RESOLVE_TIMEOUT,
+            )
+        # asyncio.TimeoutError is only the builtin from 3.11 on.
+        except (asyncio.TimeoutError, OSError) as exc:  # noqa: UP041
+            logger.warning("Could not resolve login server %s: %s", host, exc or "timed out")
+            return False
+        addresses = list(dict.fromkeys(info[4][:2] for info in infos))
+        if addresses != self._addresses or target != self._target:
+            logger.info("Login server %s resolves to %s", host, ", ".join(ip for ip, _ in addresses))
+        self._target = target
+        self._addresses = addresses
+        self._known.update(addresses)
+        self._expires = time.monotonic() + self.refresh_interval
+        return True
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            ok = await self.refresh()
+            await asyncio.sleep(self.refresh_interval * REFRESH_AHEAD if ok else RETRY_INTERVAL)
+
+    def start(self) -> None:
+        """Begin background refreshes on the running loop."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_forever())
+
+    def stop(self) -> None:
+        for task in (self._refresh_task, self._lookup):
+            if task is not None and not task.done():
+                task.cancel()
+        self._refresh_task = None
@@ -0,0 +1,83 @@
+"""Login-name routing index.
+
+Deciding what to do with a Login packet used to mean testing the name
+against ``config.SKIP_SSO_ACCOUNTS``, ``config.LOCAL_ACCOUNT_NAME_MAP``,
+``config.LOCAL_CHARACTER_NAMES`` and ``config.ALL_CACHED_NAMES`` (a list that
+runs to tens of thousands of names once dynamic tags are expanded), several
+times per login. This module folds those sources into one dict from
+lowercase login name to ``(route, target_account)``, so dispatch is a single
+lookup.
+
+The index is built on first use and rebuilt by :func:`invalidate`, which
+every change to a source (in place or by replacing it) must call, so the
+login path itself never rebuilds. Building and swapping in the new index
+both happen under ``local_characters._lock``, so two rebuilds can't land out
+of order, and readers on other threads never see a half-built table.
+"""
+
+from __future__ import annotations
+
+from p99_sso_login_proxy import config, local_characters
+
+PROXY_ONLY = "proxy_only"
+SKIP_SSO = "skip_sso"
+LOCAL = "local"
+LOCAL_CHAR = "local_char"
+SSO = "sso"
+PASSTHROUGH = "passthrough"
+
+Route = tuple[str, str | None]
+
+# None until the first lookup; afterwards replaced whole by invalidate().
+_index: dict[str, Route] | None = None
+
+
+def build() -> dict[str, Route]:
+    """Compile the routing index from the current config sources.
+
+    Later sources win, so they are applied lowest precedence first:
+    SSO roster, local characters, local accounts, then skip_sso.
+    """
+    # The local-character mutators hold the lock; the other sources are
+    # copied up front so a concurrent edit can't break the iteration.
+    with local_characters._lock:
+        characters = [
+            (name, (config.LOCAL_CHARACTERS.get(name) or {}).get("account"))
+            for name in list(config.LOCAL_CHARACTER_NAMES)
+        ]
+        accounts = list(config.LOCAL_ACCOUNT_NAME_MAP.items())
+        skip_sso = list(config.SKIP_SSO_ACCOUNTS)
+        index: dict[str, Route] = dict.fromkeys(list(config.ALL_CACHED_NAMES), (SSO, None))
+    for name, account in characters:
+        index[name] = (LOCAL_CHAR, (account or "").lower() or None)
+    for name, account in accounts:
+        index[name] = (LOCAL, account)
+    for name in skip_sso:
+        index[name] = (SKIP_SSO, name)
+    return index
+
+
+def invalidate() -> None:
+    """Rebuild the index after a source changed."""
+    global _index
+    with local_characters._lock:
+        _index = build()
+
+
+def route(username: str) -> Route:
+    """Return ``(route, target_account)`` for a lowercase login name.
+
+    ``target_account`` is the local account to log in as for ``local`` and
+    ``local_char`` (``None`` if a local character names no account), and the
+    login name itself for ``proxy_only``, ``skip_sso`` and ``passthrough``.
+    """
+    global _index
+    if config.PROXY_ONLY:
+        return PROXY_ONLY, username
+    index = _index
+    if index is None:
+        with local_characters._lock:
+            if _index is None:
+                _index = build()
+            index = _index
+    return index.get(username) or (PASSTHROUGH, username)
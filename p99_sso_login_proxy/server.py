@@ -3,18 +3,70 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
-import struct
+import math
+import sys
 import time
-
-from p99_sso_login_proxy import config, local_characters, ui, ws_client
+import zlib
+from collections.abc import Awaitable, Callable
+
+from p99_sso_login_proxy import (
+    batch_io,
+    config,
+    credentials,
+    health,
+    local_characters,
+    resolver,
+    routing,
+    stats,
+    ws_client,
+)
 from p99_sso_login_proxy import login_protocol as lp
 from p99_sso_login_proxy import soe_protocol as soe
 from p99_sso_login_proxy.login_protocol import LoginPacket
-from p99_sso_login_proxy.session import ProxySessionState
+from p99_sso_login_proxy.session import ProxySessionState, ServerListCache, filter_server_list
+from p99_sso_login_proxy.sso_cache import SSO_CREDENTIALS
+from p99_sso_login_proxy.timer_wheel import TimerWheel
 
 logger = logging.getLogger("server")
 
+# SOE default until a SessionResponse negotiates the real value.
+DEFAULT_MAX_PACKET_SIZE = 512
+
+# Seconds of client silence after which its session is retired.
+CLIENT_IDLE_TIMEOUT = 60
+
+# Seconds after a pre-warm during which further triggers are ignored.
+PREWARM_INTERVAL = 30
+
+# ``(username) -> (real_user, encrypted_credentials, error_detail)``
+LoginAuth = Callable[[str], Awaitable[tuple[str | None, bytes | None, str | None]]]
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """Create the loop the proxy and WebSocket run on.
+
+    uvloop when ``use_uvloop`` is set and it is installed, otherwise the
+    default asyncio loop.
+    """
+    if config.USE_UVLOOP and sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("use_uvloop is set but uvloop is not installed; using the default event loop")
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def _create_datagram_endpoint(protocol_factory, **kwargs):
+    """Open a UDP endpoint with the batched transport when it is enabled."""
+    loop = asyncio.get_running_loop()
+    if config.BATCHED_DATAGRAM_IO and batch_io.supported():
+        return batch_io.create_datagram_endpoint(loop, protocol_factory, **kwargs)
+    return loop.create_datagram_endpoint(protocol_factory, **kwargs)
+
 
 def debug_write_packet(buf: bytes, login_to_client):
     length = len(buf)
@@ -33,59 +85,343 @@ def debug_write_packet(buf: bytes, login_to_client):
     logger.debug("\n".join(lines))
 
 
-class LoginProxy(asyncio.DatagramProtocol):
-    transport: asyncio.DatagramTransport
-    last_recv_time: float
-    in_session: bool
-    session: ProxySessionState
-    client_addr: tuple[str, int] | None
+class ClientSession:
+    """Everything the proxy tracks for one EQ client, keyed by its address.
 
-    def __init__(self):
-        super().__init__()
+    Each client negotiates its own SOE session (CRC key, compression, max
+    packet size), so none of this may be shared between boxes logging in
+    at the same time.
+    """
+
+    def __init__(self, addr: tuple[str, int], server_list_cache: ServerListCache):
+        self.addr = addr
+        self.session = ProxySessionState(server_list_cache)
         self.in_session = False
         self.last_recv_time = 0.0
-        self.session = ProxySessionState()
-        self._auth_in_flight = False
-        self._auth_task: asyncio.Task | None = None
+        # Whether this client is counted in PROXY_STATS.active_connections.
+        self.counted_active = False
+        self.crc = soe.SessionCrc()
+        self.codec = soe.SoeCodec()
+        # Largest datagram either peer accepts, from the SessionResponse.
+        self.max_packet_size = DEFAULT_MAX_PACKET_SIZE
+        self.auth_in_flight = False
+        self.auth_task: asyncio.Task | None = None
         # SSO bad-password retry state. Set in _async_auth_and_forward
         # whenever we successfully rewrite credentials, consumed exactly
         # once on the first server response that follows.
-        self._sso_original_login: bytes | None = None
-        self._sso_retry_armed: bool = False
-        self._sso_retry_fired: bool = False
-        self._crc_bytes: int = 0
-        self._crc_key: int = 0
-        ui.PROXY_STATS.update_status("Initializing")
-
-    def session_free(self):
+        self.sso_original_login: bytes | None = None
+        self.sso_login_name: str | None = None
+        self.sso_retry_armed = False
+        self.sso_retry_fired = False
+        # Local transport-probe responder: datagram counts toward the client
+        # for SessionStatResponse, and the upstream keep-alive timer.
+        self.packets_sent = 0
+        self.packets_recv = 0
+        self.last_upstream_send = 0.0
+        self.keepalive_handle: asyncio.TimerHandle | None = None
+        # Dedicated socket to the login server, so its replies identify this
+        # client by arrival socket alone. While it is being opened, wire
+        # datagrams wait in upstream_backlog (None when not opening).
+        self.upstream: asyncio.DatagramTransport | None = None
+        self.upstream_backlog: list[bytes] | None = None
+        self.upstream_task: asyncio.Task | None = None
+        # Login server address this client's session talks to, and when its
+        # unanswered SessionRequest went out (for RTT and failover).
+        # None until the login server's name has resolved.
+        self.server_addr: tuple[str, int] | None = None
+        self.session_request_time: float | None = None
+        self.closed = False
+
+    def send_upstream(self, wire: bytes, shared: asyncio.DatagramTransport | None) -> None:
+        """Send a framed datagram to the login server for this client.
+
+        Falls back to the proxy's *shared* socket when this client has no
+        upstream socket of its own, and drops the datagram when *shared* is
+        None. Without an address to send to (only possible with no running
+        loop to look one up) the datagram is dropped too.
+        """
+        if self.upstream is not None:
+            self.upstream.sendto(wire)
+        elif self.upstream_backlog is not None:
+            self.upstream_backlog.append(wire)
+        elif shared is None:
+            logger.debug("No upstream socket for client %s; dropping datagram", self.addr)
+        elif self.server_addr is not None:
+            shared.sendto(wire, self.server_addr)
+        else:
+            logger.debug("No login server address for client %s yet; dropping datagram", self.addr)
+
+    def session_free(self) -> None:
+        """Reset the SOE session state ahead of a new session."""
         self.session.reset()
-        self._sso_original_login = None
-        self._sso_retry_armed = False
-        self._sso_retry_fired = False
+        self.sso_original_login = None
+        self.sso_retry_armed = False
+        self.sso_retry_fired = False
+        self.packets_sent = 0
+        self.packets_recv = 0
+
+    def max_payload_len(self) -> int:
+        """Largest packet we may build before wire framing is added.
+
+        Leaves room for the CRC trailer and, on compressed sessions, the
+        flag byte a packet gains if it doesn't shrink.
+        """
+        return self.max_packet_size - self.crc.crc_bytes - (1 if self.codec.enabled else 0)
+
+    def cancel_keepalive(self) -> None:
+        """Stop the upstream keep-alive timer, if one is pending."""
+        if self.keepalive_handle is not None:
+            self.keepalive_handle.cancel()
+            self.keepalive_handle = None
+
+    def close(self) -> None:
+        """Stop timers, tasks and sockets that would otherwise outlive the entry."""
+        self.closed = True
+        self.cancel_keepalive()
+        for task in (self.auth_task, self.upstream_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self.upstream is not None:
+            self.upstream.close()
+            self.upstream = None
+
+
+class UpstreamProtocol(asyncio.DatagramProtocol):
+    """One client's socket to the login server; hands replies to its owner."""
+
+    def __init__(self, proxy: LoginProxy, client: ClientSession):
+        self.proxy = proxy
+        self.client = client
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        self.proxy.handle_server_packet(data, addr, client=self.client)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning("Upstream socket error for client %s: %s", self.client.addr, exc)
+
+
+class LoginProxy(asyncio.DatagramProtocol):
+    """UDP proxy between any number of EQ clients and the login server.
+
+    Per-client state lives in ``clients`` (one :class:`ClientSession` per
+    client address) and is passed explicitly to every handler.
+    """
+
+    transport: asyncio.DatagramTransport
+
+    def __init__(
+        self,
+        login_auth: LoginAuth | None = None,
+        probe_login_server: bool = True,
+        reuse_port: bool = False,
+    ):
+        super().__init__()
+        # Behind SO_REUSEPORT a reply to the shared listen port may be handed
+        # to another worker, so every client needs an upstream socket of its own.
+        self._reuse_port = reuse_port
+        # SSO credential lookup; ws_client's unless a worker process passes
+        # its IPC stand-in.
+        self._login_auth = login_auth
+        # Outlives individual sessions so back-to-back logins reuse it.
+        self.server_list_cache = ServerListCache(config.SERVER_LIST_CACHE_TTL)
+        self.login_server = resolver.LoginServerResolver()
+        # In a worker pool only one process probes; an interval of 0 disables it.
+        self.login_server_monitor = health.LoginServerMonitor(
+            self.login_server, interval=None if probe_login_server else 0
+        )
+        self.clients: dict[tuple[str, int], ClientSession] = {}
+        # Replies on the shared socket go to the client that last sent upstream.
+        self._upstream_client: ClientSession | None = None
+        # Retires clients once they have been silent for CLIENT_IDLE_TIMEOUT.
+        self._idle_wheel = TimerWheel(self._check_idle)
+        # Inbound datagrams dropped for a bad CRC or undecodable compression.
+        self.corrupt_packets: int = 0
+        # Outbound coalescing: datagrams queued per (client, destination)
+        # during the current loop tick, flushed by flush_outbound().
+        self._outbound: dict[tuple[ClientSession, tuple[str, int] | None], list[bytes]] = {}
+        self._flush_scheduled: bool = False
+        self._prewarmed_at = -math.inf
+        self._prewarm_task: asyncio.Task | None = None
+        stats.PROXY_STATS.update_status("Initializing")
+
+    def _client_for(self, addr: tuple[str, int], now: float) -> ClientSession:
+        """Return the table entry for *addr*, creating it if needed."""
+        client = self.clients.get(addr)
+        if client is not None:
+            return client
+        client = ClientSession(addr, self.server_list_cache)
+        client.server_addr = self.login_server.pick()
+        client.last_recv_time = now
+        self.clients[addr] = client
+        logger.debug("Tracking new client %s (%d active)", addr, len(self.clients))
+        # Without a running loop (tests driving the proxy directly) nothing expires.
+        with contextlib.suppress(RuntimeError):
+            self._idle_wheel.schedule(client, CLIENT_IDLE_TIMEOUT)
+        self._open_upstream(client)
+        return client
+
+    def _open_upstream(self, client: ClientSession) -> None:
+        """Pick *client*'s login server address and open its upstream socket.
+
+        Until an address is known and the socket open, the client's wire
+        datagrams wait in its backlog; a failed lookup is retried rather
+        than falling back to the hostname. Without a running loop (or
+        with ``per_client_upstream`` off) the client uses the shared socket.
+        A worker sharing the listen port never does: the socket is opened
+        regardless of ``per_client_upstream``, and a client whose socket
+        can't be opened is retired.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        per_client = config.PER_CLIENT_UPSTREAM or self._reuse_port
+        if not per_client and client.server_addr is not None:
+            return
+        if client.upstream_backlog is None:
+            client.upstream_backlog = []
+
+        async def _open():
+            client.server_addr = await self.login_server.wait_for_address()
+            transport = None
+            if per_client:
+                try:
+                    transport, _ = await _create_datagram_endpoint(
+                        lambda: UpstreamProtocol(self, client),
+                        remote_addr=client.server_addr,
+                    )
+                except OSError as exc:
+                    if self._reuse_port:
+                        logger.warning("Could not open upstream socket for %s, dropping client: %s", client.addr, exc)
+                        # Already finishing; retiring the client mustn't cancel it.
+                        client.upstream_backlog, client.upstream_task = None, None
+                        if not client.closed:
+                            self._retire_client(client)
+                        return
+                    logger.warning("Could not open upstream socket for %s, using shared socket: %s", client.addr, exc)
+            backlog, client.upstream_backlog = client.upstream_backlog or [], None
+            if transport is not None and client.closed:
+                transport.close()
+                return
+            client.upstream = transport
+            for wire in backlog:
+                client.send_upstream(wire, self._shared_upstream())
+
+        client.upstream_task = asyncio.ensure_future(_open())
+
+    def _shared_upstream(self) -> asyncio.DatagramTransport | None:
+        """The socket clients without their own may reach the login server on."""
+        return None if self._reuse_port else self.transport
+
+    def _check_idle(self, client: ClientSession) -> float | None:
+        """Timer wheel callback: retire *client* if it has gone quiet.
+
+        Returns the seconds until *client* could next be idle when it is
+        still active (or mid-auth), so the wheel checks again then.
+        """
+        if client.closed or self.clients.get(client.addr) is not client:
+            return None
+        idle = time.time() - client.last_recv_time
+        if client.auth_in_flight or idle < CLIENT_IDLE_TIMEOUT:
+            return max(CLIENT_IDLE_TIMEOUT - idle, self._idle_wheel.tick)
+        self._retire_client(client)
+        return None
+
+    def _retire_client(self, client: ClientSession) -> None:
+        """Drop *client* from the table and release what it holds."""
+        logger.debug("Retiring client %s", client.addr)
+        self._idle_wheel.discard(client)
+        client.close()
+        self.clients.pop(client.addr, None)
+        if client.counted_active:
+            client.counted_active = False
+            stats.PROXY_STATS.connection_completed()
+        if client is self._upstream_client:
+            self._upstream_client = None
+
+    def _note_session_request(self, client: ClientSession) -> None:
+        """Time the client's SessionRequest for the login server's RTT.
+
+        A repeat while the previous one is unanswered counts as a failure
+        of the current address, and moves the client to another address
+        if the name has several.
+        """
+        if client.session_request_time is None:
+            self.prewarm()
+        elif client.server_addr is not None:
+            self.login_server.record_failure(client.server_addr)
+            new_addr = self.login_server.pick()
+            if new_addr is not None and new_addr != client.server_addr:
+                logger.info("Moving client %s to login server %s:%d", client.addr, *new_addr)
+                if client.upstream_task is not None and not client.upstream_task.done():
+                    client.upstream_task.cancel()
+                if client.upstream is not None:
+                    client.upstream.close()
+                    client.upstream = None
+                client.server_addr = new_addr
+                self._open_upstream(client)
+        client.session_request_time = time.monotonic()
+
+    def prewarm(self) -> None:
+        """Ready the path a login is about to take.
+
+        Brings the SSO WebSocket up if it is down, refreshes the login
+        server's addresses and probes them, so none of that is waited on
+        when the Login packet arrives. Runs when EverQuest is launched and
+        on a client's first SessionRequest; repeats within
+        :data:`PREWARM_INTERVAL` seconds do nothing.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        now = time.monotonic()
+        if now - self._prewarmed_at < PREWARM_INTERVAL:
+            return
+        self._prewarmed_at = now
+        logger.debug("Pre-warming the login path")
+        # Worker processes leave the WebSocket to the parent.
+        if self._login_auth is None:
+            ws_client.prewarm()
+        if self._prewarm_task is None or self._prewarm_task.done():
+            self._prewarm_task = asyncio.ensure_future(self._prewarm_login_server())
+
+    async def _prewarm_login_server(self) -> None:
+        if not await self.login_server.refresh():
+            logger.warning("Could not resolve login server %s; using last known address", config.EQEMU_ADDR[0])
+        # Probing is off when the periodic monitor is; respect that here too.
+        if self.login_server_monitor.interval > 0:
+            await self.login_server_monitor.probe_all()
 
     def connection_made(self, transport):
         self.transport = transport
+        credentials.prime()
+        self.login_server.start()
+        self.login_server_monitor.start()
         # Update UI stats with listening information
         local_addr = transport.get_extra_info("sockname")
         if local_addr:
             host, port = local_addr
-            ui.PROXY_STATS.update_listening_info(host, port)
-            ui.PROXY_STATS.update_status("Listening")
+            stats.PROXY_STATS.update_listening_info(host, port)
+            stats.PROXY_STATS.update_status("Listening")
         logger.info("Proxy listening on %s", local_addr)
 
+    def connection_lost(self, exc: Exception | None) -> None:
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+        self._idle_wheel.close()
+        # Upstream sockets, keep-alives and auth tasks outlive the listen socket otherwise.
+        for client in self.clients.values():
+            client.close()
+        self.login_server_monitor.stop()
+        self.login_server.stop()
+
     # ------------------------------------------------------------------
     # Auth credential rewrite
     # ------------------------------------------------------------------
     def _needs_sso(self, username: str) -> bool:
         """Return True if *username* should go through the SSO API."""
-        return (
-            not config.PROXY_ONLY
-            and username not in config.SKIP_SSO_ACCOUNTS
-            and username not in config.LOCAL_ACCOUNT_NAME_MAP
-            and username not in config.LOCAL_CHARACTER_NAMES
-            and username in config.ALL_CACHED_NAMES
-            and bool(config.USER_API_TOKEN)
-        )
+        return routing.route(username)[0] == routing.SSO and bool(config.USER_API_TOKEN)
 
     def _try_sync_rewrite(
         self,
@@ -99,104 +435,105 @@ class LoginProxy(asyncio.DatagramProtocol):
         or ``None`` if the caller should attempt SSO auth instead.
         """
         username = login.username.lower()
+        method, new_user = routing.route(username)
+
+        if method in (routing.PROXY_ONLY, routing.SKIP_SSO, routing.PASSTHROUGH):
+            stats.PROXY_STATS.user_login(alias=username, account=username, method=method)
+            local_characters.note_login(method, username)
+            return buf, method
 
-        if config.PROXY_ONLY:
-            ui.PROXY_STATS.user_login(alias=username, account=username, method="proxy_only")
-            local_characters.note_login("proxy_only", username)
-            return buf, "proxy_only"
-
-        if username in config.SKIP_SSO_ACCOUNTS:
-            ui.PROXY_STATS.user_login(alias=username, account=username, method="skip_sso")
-            local_characters.note_login("skip_sso", username)
-            return buf, "skip_sso"
-
-        if (
-            username not in config.ALL_CACHED_NAMES
-            and username not in config.LOCAL_ACCOUNT_NAME_MAP
-            and username not in config.LOCAL_CHARACTER_NAMES
-        ):
-            ui.PROXY_STATS.user_login(alias=username, account=username, method="passthrough")
-            local_characters.note_login("passthrough", username)
-            return buf, "passthrough"
-
-        if username in config.LOCAL_ACCOUNT_NAME_MAP:
-            new_user = config.LOCAL_ACCOUNT_NAME_MAP[username]
-            new_pass = config.LOCAL_ACCOUNTS[new_user]["password"]
+        if method == routing.LOCAL:
             logger.info("Overwriting client supplied password with local account for %s: %s", username, new_user)
-            result_buf = login.rewrite_credentials(new_user, new_pass, config.ENCRYPTION_KEY, config.iv())
-            ui.PROXY_STATS.user_login(alias=username, account=new_user, method="local")
+            result_buf = login.splice_encrypted_credentials(credentials.encrypted(new_user))
+            stats.PROXY_STATS.user_login(alias=username, account=new_user, method="local")
             local_characters.note_login("local", new_user)
             return result_buf, "local"
 
-        if username in config.LOCAL_CHARACTER_NAMES:
-            character = config.LOCAL_CHARACTERS.get(username) or {}
-            new_user = (character.get("account") or "").lower()
+        if method == routing.LOCAL_CHAR:
             account_data = config.LOCAL_ACCOUNTS.get(new_user) if new_user else None
             if not account_data:
                 logger.warning(
                     "Local character %s references unknown account %r; passing through",
                     username,
-                    new_user,
+                    new_user or "",
                 )
-                ui.PROXY_STATS.user_login(alias=username, account=username, method="passthrough")
+                stats.PROXY_STATS.user_login(alias=username, account=username, method="passthrough")
                 local_characters.note_login("passthrough", username)
                 return buf, "passthrough"
-            new_pass = account_data["password"]
             logger.info("Overwriting client supplied password with local character for %s -> %s", username, new_user)
-            result_buf = login.rewrite_credentials(new_user, new_pass, config.ENCRYPTION_KEY, config.iv())
-            ui.PROXY_STATS.user_login(alias=username, account=new_user, method="local_char")
+            result_buf = login.splice_encrypted_credentials(credentials.encrypted(new_user))
+            stats.PROXY_STATS.user_login(alias=username, account=new_user, method="local_char")
             local_characters.note_login("local_char", new_user)
             return result_buf, "local_char"
 
         return buf, None
 
+    def _apply_sso_credentials(
+        self,
+        client: ClientSession,
+        buf: bytearray,
+        login: LoginPacket,
+        new_user: str,
+        encrypted: bytes,
+    ) -> bytearray:
+        """Splice SSO credentials into *buf* and arm the bad-password retry."""
+        username = login.username.lower()
+        # Snapshot the original client Login packet so we can replay it if the
+        # SSO password is rejected (see _fire_sso_retry).
+        original_packet = bytes(buf)
+        logger.info("Auth rewrite successful for %s -> %s", username, new_user)
+        result_buf = login.splice_encrypted_credentials(encrypted)
+        client.sso_original_login = original_packet
+        client.sso_login_name = username
+        client.sso_retry_armed = True
+        client.sso_retry_fired = False
+        logger.debug("SSO retry armed for %s (orig %d bytes)", username, len(original_packet))
+        stats.PROXY_STATS.user_login(alias=username, account=new_user, method="sso")
+        local_characters.note_login("sso", new_user)
+        return result_buf
+
     async def _async_auth_and_forward(
         self,
+        client: ClientSession,
         data: bytearray,
         login: LoginPacket,
         recv_time: float,
+        client_seq: int | None = None,
     ) -> None:
         """Perform SSO auth over WebSocket and forward."""
         username = login.username.lower()
-        # Snapshot the original client Login packet so we can replay it if the
-        # SSO password is rejected (see _fire_sso_retry).
-        original_packet = bytes(data)
         try:
-            new_user, encrypted, error_detail = await ws_client.request_login_auth(username)
+            login_auth = self._login_auth or ws_client.request_login_auth
+            new_user, encrypted, error_detail = await login_auth(username)
 
             if error_detail:
                 logger.warning("SSO login rejected for %s: %s", username, error_detail)
-                ui.PROXY_STATS.auth_error(username, error_detail)
+                stats.PROXY_STATS.auth_error(username, error_detail)
+                SSO_CREDENTIALS.invalidate(username)
 
             if new_user and encrypted:
-                logger.info("Auth rewrite successful for %s -> %s", username, new_user)
-                data = login.splice_encrypted_credentials(encrypted)
-                self._sso_original_login = original_packet
-                self._sso_retry_armed = True
-                self._sso_retry_fired = False
-                logger.debug("SSO retry armed for %s (orig %d bytes)", username, len(original_packet))
-                ui.PROXY_STATS.user_login(alias=username, account=new_user, method="sso")
-                local_characters.note_login("sso", new_user)
+                SSO_CREDENTIALS.put(username, new_user, encrypted)
+                data = self._apply_sso_credentials(client, data, login, new_user, encrypted)
         except Exception:
             logger.exception("Failed to check login for %s", username)
         finally:
-            self._auth_in_flight = False
-            self.last_recv_time = recv_time
-            self.send_to_loginserver(data)
+            client.auth_in_flight = False
+            client.last_recv_time = recv_time
+            self._forward_client_packet(client, data, client_seq)
 
     # ------------------------------------------------------------------
     # SSO bad-password retry  (server -> client interception)
     # ------------------------------------------------------------------
     def _try_intercept_bad_password_combined(
         self,
+        client: ClientSession,
         data: bytearray,
-        start_index: int,
-        length: int,
+        cp: soe.CombinedPacket,
     ) -> bool:
         """Inspect a S->C ``OP_Combined`` for the SSO LoginAccepted response.
 
-        Walks the sub-packets looking for an ``OP_Packet`` carrying a
-        ``LoginAccepted``. If we find one:
+        Walks the sub-packets of the already-parsed index *cp* looking for
+        an ``OP_Packet`` carrying a ``LoginAccepted``. If we find one:
 
         * **Good login**: just disarm, return ``False``, let the caller's
           normal Combined dispatch forward everything.
@@ -208,44 +545,44 @@ class LoginProxy(asyncio.DatagramProtocol):
         Returns ``True`` iff the caller must NOT forward the original
         datagram itself.
         """
-        if not self._sso_retry_armed or self._sso_retry_fired:
-            return False
-        try:
-            cp = soe.CombinedPacket.parse(data, start_index, length)
-        except (struct.error, ValueError):
+        if not client.sso_retry_armed or client.sso_retry_fired:
             return False
 
-        bad_sub = None
-        for sub in cp:
-            if sub.transport_op != soe.TransportOp.Packet:
+        offsets = cp.offsets
+        lengths = cp.lengths
+        ops = cp.ops
+        bad_index = -1
+        for i in range(len(ops)):
+            if ops[i] != soe.TransportOp.Packet:
                 continue
-            classification = self._classify_login_accepted_sub(data, sub.offset, sub.length)
+            classification = self._classify_login_accepted_sub(data, offsets[i], lengths[i])
             if classification is None:
                 continue
-            self._sso_retry_armed = False
+            client.sso_retry_armed = False
             if classification == "good":
                 logger.debug("SSO LoginAccepted ok inside Combined; no retry needed")
                 return False
-            bad_sub = sub
+            bad_index = i
             break
 
-        if bad_sub is None:
+        if bad_index < 0:
             return False
 
         # Forward the surviving sub-packets first, while cs_offset is still
         # zero. The most important one is the server's Ack of the client's
         # original Login -- if we drop it the client will retransmit and the
         # retry orchestration desynchronizes.
-        for sub in cp:
-            if sub.offset == bad_sub.offset:
+        for i in range(len(ops)):
+            if i == bad_index:
                 continue
-            self._forward_server_sub(data, sub)
+            self._forward_server_sub(client, data, offsets[i], lengths[i], ops[i])
 
-        self._fire_sso_retry(soe.get_sequence(data, bad_sub.offset))
+        self._fire_sso_retry(client, soe.get_sequence(data, offsets[bad_index]))
         return True
 
     def _try_intercept_bad_password_packet(
         self,
+        client: ClientSession,
         data: bytes,
         start_index: int,
         length: int,
@@ -256,18 +593,18 @@ class LoginProxy(asyncio.DatagramProtocol):
         On a good login (or any other LoginAccepted-shaped payload), disarm
         and let the caller forward normally.
         """
-        if not self._sso_retry_armed or self._sso_retry_fired:
+        if not client.sso_retry_armed or client.sso_retry_fired:
             return False
         classification = self._classify_login_accepted_sub(data, start_index, length)
         if classification is None:
             return False
 
-        self._sso_retry_armed = False
+        client.sso_retry_armed = False
         if classification == "good":
             logger.debug("SSO LoginAccepted ok; no retry needed")
             return False
 
-        self._fire_sso_retry(soe.get_sequence(data, start_index))
+        self._fire_sso_retry(client, soe.get_sequence(data, start_index))
         return True
 
     @staticmethod
@@ -284,29 +621,55 @@ class LoginProxy(asyncio.DatagramProtocol):
         """
         if length < 6:  # transport(4) + at least app opcode(2)
             return None
-        app_payload = bytes(data[start_index + 4 : start_index + length])
-        if len(app_payload) < 2:
-            return None
-        if lp.get_app_opcode(app_payload) != lp.AppOp.LoginAccepted:
+        # Check the LE app opcode in place so non-login subs cost no copy.
+        if data[start_index + 4] | (data[start_index + 5] << 8) != lp.AppOp.LoginAccepted:
             return None
+        app_payload = bytes(data[start_index + 4 : start_index + length])
         return "bad" if lp.is_bad_password_login_result(app_payload) else "good"
 
-    def _forward_server_sub(self, data: bytes, sub) -> None:
+    def _drop_suppressed_subs(self, client: ClientSession, data: bytearray, cp: soe.CombinedPacket) -> bool:
+        """Handle a S->C Combined that retransmits a suppressed packet.
+
+        Re-ACKs the suppressed sub-packet(s) to the server and forwards the
+        rest individually. Returns ``True`` iff the caller must NOT forward
+        the original datagram.
+        """
+        offsets = cp.offsets
+        ops = cp.ops
+        suppressed = [
+            i
+            for i in range(len(ops))
+            if ops[i] == soe.TransportOp.Packet and client.session.is_suppressed(soe.get_sequence(data, offsets[i]))
+        ]
+        if not suppressed:
+            return False
+        for i in range(len(ops)):
+            if i in suppressed:
+                server_seq = soe.get_sequence(data, offsets[i])
+                logger.debug("Server retransmitted suppressed seq=%d inside Combined; re-ACKing", server_seq)
+                self.send_to_loginserver(client, soe.build_ack(server_seq))
+            else:
+                self._forward_server_sub(client, data, offsets[i], cp.lengths[i], ops[i])
+        return True
+
+    def _forward_server_sub(
+        self, client: ClientSession, data: bytes, offset: int, length: int, transport_op: int
+    ) -> None:
         """Forward one sub-packet of a S->C Combined as its own datagram.
 
         Used when the proxy is surgically removing one sub-packet (the bad
         LoginAccepted) and forwarding the rest. Applies the same rewrites
         that ``recv_combined`` would have applied for a sub of this type.
         """
-        sub_buf = bytearray(data[sub.offset : sub.offset + sub.length])
-        if sub.transport_op == soe.TransportOp.Ack:
-            self.session.adjust_server_ack(sub_buf, 0)
-        elif sub.transport_op == soe.TransportOp.Packet:
-            self.session.recv_packet(sub_buf, 0)
+        sub_buf = bytearray(memoryview(data)[offset : offset + length])
+        if transport_op == soe.TransportOp.Ack:
+            client.session.adjust_server_ack(sub_buf, 0)
+        elif transport_op == soe.TransportOp.Packet:
+            client.session.recv_packet(sub_buf, 0)
         # Other transport ops (Fragment etc.) are forwarded raw.
-        self.send_to_client(sub_buf)
+        self.send_to_client(client, sub_buf)
 
-    def _fire_sso_retry(self, server_seq_to_ack: int) -> None:
+    def _fire_sso_retry(self, client: ClientSession, server_seq_to_ack: int) -> None:
         """Replay the original client Login on the existing SOE session.
 
         Sequencing:
@@ -319,33 +682,37 @@ class LoginProxy(asyncio.DatagramProtocol):
              client OP_Packet) lands at the next server-side sequence.
           4. Send the replayed Login.
         """
-        if self._sso_original_login is None:
+        # The stored credentials were just refused; don't hand them out again.
+        if client.sso_login_name is not None:
+            SSO_CREDENTIALS.invalidate(client.sso_login_name)
+
+        if client.sso_original_login is None:
             logger.error(
                 "SSO bad-password detected but no original Login captured "
                 "(server seq=%d); cannot retry, forwarding instead",
                 server_seq_to_ack,
             )
-            self._sso_retry_armed = True  # let it fall through normally
+            client.sso_retry_armed = True  # let it fall through normally
             return
 
         logger.warning(
             "SSO password rejected by server (seq=%d); retrying with original client credentials",
             server_seq_to_ack,
         )
-        self.send_to_loginserver(soe.build_ack(server_seq_to_ack))
-        self.session.note_suppressed_server_packet(server_seq_to_ack)
-        self.session.note_injected_client_packet()
+        self.send_to_loginserver(client, soe.build_ack(server_seq_to_ack))
+        client.session.note_suppressed_server_packet(server_seq_to_ack)
+        client.session.note_injected_client_packet()
 
-        retry = bytearray(self._sso_original_login)
-        self.session.adjust_combined(retry)
-        self._sso_retry_fired = True
+        retry = bytearray(client.sso_original_login)
+        client.session.adjust_combined(retry)
+        client.sso_retry_fired = True
         logger.debug(
             "SSO retry fired: cs_offset=%d, seq_from_server=%d, seq_to_client=%d",
-            self.session.cs_offset,
-            self.session.seq_from_server,
-            self.session.seq_to_client,
+            client.session.cs_offset,
+            client.session.seq_from_server,
+            client.session.seq_to_client,
         )
-        self.send_to_loginserver(retry)
+        self.send_to_loginserver(client, retry)
 
     # ------------------------------------------------------------------
     # Client -> Login Server
@@ -359,62 +726,121 @@ class LoginProxy(asyncio.DatagramProtocol):
             soe.TransportOp.SessionResponse,
         )
 
-    def _strip_wire_crc(self, data: bytes | bytearray) -> bytes:
-        raw = bytes(data)
-        if self._crc_bytes == 0 or not self._packet_uses_crc(raw):
+    def _strip_wire_crc(self, client: ClientSession, data: bytes | bytearray | memoryview) -> memoryview | None:
+        """Verify and remove the trailing CRC of an inbound datagram.
+
+        Returns a view of the packet without copying it, or ``None`` (and
+        counts the failure) if the CRC does not match, in which case the
+        caller must drop the datagram.
+        """
+        raw = memoryview(data)
+        if not client.crc.enabled or not self._packet_uses_crc(raw):
             return raw
-        return soe.strip_crc(raw, self._crc_bytes)
+        if not client.crc.verify(raw):
+            self.corrupt_packets += 1
+            logger.debug(
+                "Dropping %s with bad CRC (%d dropped so far)",
+                soe.transport_name(soe.get_transport_opcode(raw)),
+                self.corrupt_packets,
+            )
+            return None
+        return soe.strip_crc(raw, client.crc.crc_bytes)
 
-    def _append_wire_crc(self, data: bytes | bytearray) -> bytes:
-        raw = bytes(data)
-        if self._crc_bytes == 0 or not self._packet_uses_crc(raw):
+    def _append_wire_crc(self, client: ClientSession, data: bytes | bytearray) -> bytes | bytearray:
+        """Frame *data* for the wire in a buffer of its own."""
+        if not client.crc.enabled or not self._packet_uses_crc(data):
+            return bytes(data)
+        return client.crc.append(data)
+
+    def _from_wire(self, client: ClientSession, data: bytes | bytearray | memoryview) -> bytes | memoryview | None:
+        """Verify and strip the CRC, then undo SOE compression.
+
+        The result may be a view into *data*; callers copy it into the
+        ``bytearray`` they rewrite. Returns ``None`` if the datagram is
+        corrupt and must be dropped.
+        """
+        raw = self._strip_wire_crc(client, data)
+        if raw is None or not client.codec.enabled or not self._packet_uses_crc(raw):
             return raw
-        return soe.append_crc(raw, self._crc_key, self._crc_bytes)
+        try:
+            return client.codec.decode(raw)
+        except zlib.error:
+            self.corrupt_packets += 1
+            logger.debug("Dropping packet that failed to decompress (%d dropped so far)", self.corrupt_packets)
+            return None
+
+    def _to_wire(self, client: ClientSession, data: bytes | bytearray) -> bytes | bytearray:
+        """Apply SOE compression (if negotiated) and append the CRC."""
+        if client.codec.enabled and self._packet_uses_crc(data):
+            data = client.codec.encode(data)
+        return self._append_wire_crc(client, data)
 
     def handle_client_packet(
         self,
-        data: bytearray,
+        data: bytes | bytearray | memoryview,
         addr: tuple[str, int],
     ):
         """Called on a packet from the client"""
-        data = bytearray(self._strip_wire_crc(data))
         recv_time = time.time()
+        client = self._client_for(addr, recv_time)
+        stripped = self._from_wire(client, data)
+        if stripped is None:
+            return
+        # The one copy of the packet; rewrites below edit it in place.
+        data = bytearray(stripped)
         # debug_write_packet(data, False)
 
         # logger.debug("Received data from client %s", addr)
 
-        # Store client address for responses
-        self.client_addr = addr
-
-        if not self.in_session or (recv_time - self.last_recv_time) > 60:
-            logger.debug(
-                "Session reset needed: in_session=%s, time_since_last=%.2fs",
-                self.in_session,
-                recv_time - self.last_recv_time,
-            )
-            self.session_free()
-            if not self.in_session:
+        if not client.in_session:
+            logger.debug("No established session; resetting session state")
+            client.session_free()
+            if not client.counted_active:
                 logger.debug("New connection established, updating stats")
-                ui.PROXY_STATS.connection_started()
+                client.counted_active = True
+                stats.PROXY_STATS.connection_started()
+        client.packets_recv += 1
 
         opcode = soe.get_transport_opcode(data)
         logger.debug("Processing client packet with opcode: %s", soe.transport_name(opcode))
 
+        if config.LOCAL_TRANSPORT_PROBES and client.in_session and self._answer_probe_locally(client, data, opcode):
+            client.last_recv_time = recv_time
+            return
+
+        cp = soe.CombinedPacket.parse(data) if opcode == soe.TransportOp.Combined else None
+        client_seq = self._client_packet_seq(data, opcode, cp)
+        if client_seq is not None:
+            cached = client.session.client_window.get(client_seq)
+            if cached is not None:
+                # Retransmission: replay exactly what we forwarded the first
+                # time, without re-running rewrites or re-authenticating.
+                logger.debug("Client retransmitted seq=%d; replaying forwarded packet", client_seq)
+                client.last_recv_time = recv_time
+                self.send_to_loginserver(client, cached)
+                return
+
         if opcode == soe.TransportOp.Combined:
             logger.debug("Adjusting combined packet sequence")
-            self.session.adjust_combined(data)
+            client.session.adjust_combined(data, cp)
 
             login = LoginPacket.parse(data, config.ENCRYPTION_KEY, config.iv())
             if login and self._needs_sso(login.username.lower()):
-                if self._auth_in_flight:
-                    self.last_recv_time = recv_time
+                if client.auth_in_flight:
+                    client.last_recv_time = recv_time
                     logger.debug("Dropping retry login packet (auth already in flight)")
                     return
-                self._auth_in_flight = True
-                self._auth_task = asyncio.ensure_future(self._async_auth_and_forward(data, login, recv_time))
-                return
+                cached_auth = SSO_CREDENTIALS.get(login.username.lower())
+                if cached_auth is None:
+                    client.auth_in_flight = True
+                    client.auth_task = asyncio.ensure_future(
+                        self._async_auth_and_forward(client, data, login, recv_time, client_seq)
+                    )
+                    return
+                logger.debug("Using cached SSO credentials for %s", login.username.lower())
+                data = self._apply_sso_credentials(client, data, login, *cached_auth)
 
-            if login:
+            elif login:
                 result_buf, _method = self._try_sync_rewrite(data, login)
                 if result_buf is not data:
                     data = result_buf
@@ -423,99 +849,247 @@ class LoginProxy(asyncio.DatagramProtocol):
 
         elif opcode == soe.TransportOp.SessionDisconnect:
             logger.debug("Session disconnect received, cleaning up")
-            self.in_session = False
-            self.session_free()
-            ui.PROXY_STATS.connection_completed()
+            client.in_session = False
+            client.cancel_keepalive()
+            client.session_free()
+            if client.counted_active:
+                client.counted_active = False
+                stats.PROXY_STATS.connection_completed()
 
         elif opcode == soe.TransportOp.Ack:
             logger.debug("Adjusting ACK sequence values")
-            self.session.adjust_ack(data)
+            client.session.adjust_ack(data)
 
         elif opcode == soe.TransportOp.Packet:
             # Standalone client OP_Packet (e.g. ServerListRequest sent
             # without a leading ACK). Apply cs_offset if a retry has fired.
-            self.session.adjust_client_packet(data)
+            client.session.adjust_client_packet(data)
+
+        elif opcode == soe.TransportOp.SessionRequest:
+            self._note_session_request(client)
 
         elif opcode == soe.TransportOp.KeepAlive:
             logger.debug("Keep-alive packet received")
 
-        self.last_recv_time = recv_time
+        client.last_recv_time = recv_time
         logger.debug("Forwarding processed packet to login server")
-        self.send_to_loginserver(data)
+        self._forward_client_packet(client, data, client_seq)
+
+    def _refresh_server_list_cache(self, app_payload: bytes) -> None:
+        """Re-filter a live upstream server list into the cache.
+
+        Deferred to the next loop iteration when possible so the parse never
+        delays the packets being handled right now.
+        """
+
+        def _refresh():
+            try:
+                self.server_list_cache.put(filter_server_list(app_payload))
+            except Exception:
+                logger.exception("Failed to refresh cached server list")
+                self.server_list_cache.clear()
+
+        try:
+            asyncio.get_running_loop().call_soon(_refresh)
+        except RuntimeError:
+            _refresh()
+
+    # ------------------------------------------------------------------
+    # Local transport probes
+    # ------------------------------------------------------------------
+    def _answer_probe_locally(self, client: ClientSession, data: bytearray, opcode: int) -> bool:
+        """Answer a client KeepAlive / SessionStatRequest without the server.
+
+        KeepAlive needs no reply, so it is simply absorbed; a stat request is
+        answered from the proxy's own counters. Either way the upstream
+        keep-alive timer takes over keeping the login server session open.
+        Returns ``True`` iff the packet was handled and must not be forwarded.
+        """
+        if opcode == soe.TransportOp.KeepAlive:
+            logger.debug("Keep-alive from client absorbed locally")
+        elif opcode == soe.TransportOp.SessionStatRequest:
+            try:
+                request = soe.parse_session_stat_request(data)
+            except ValueError:
+                # Let the server deal with anything we can't parse.
+                return False
+            logger.debug("Answering session stat request %d locally", request["request_id"])
+            self.send_to_client(
+                client,
+                soe.build_session_stat_response(
+                    request["request_id"],
+                    request["packets_sent"],
+                    request["packets_recv"],
+                    client.packets_sent,
+                    client.packets_recv,
+                    int(time.time() * 1000),
+                ),
+            )
+        else:
+            return False
+        self._arm_upstream_keepalive(client)
+        return True
+
+    def _arm_upstream_keepalive(self, client: ClientSession) -> None:
+        """Schedule the next upstream keep-alive check, if not already."""
+        if client.keepalive_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        client.keepalive_handle = loop.call_later(config.UPSTREAM_KEEPALIVE_INTERVAL, self._upstream_keepalive, client)
+
+    def _upstream_keepalive(self, client: ClientSession) -> None:
+        """Keep *client*'s login server session open while it idles.
+
+        Only sends when nothing else went upstream for a full interval, and
+        stops re-arming once the session ends.
+        """
+        client.keepalive_handle = None
+        if not client.in_session:
+            return
+        if time.time() - client.last_upstream_send >= config.UPSTREAM_KEEPALIVE_INTERVAL:
+            logger.debug("Upstream idle; sending proxy keep-alive to login server")
+            self.send_to_loginserver(client, soe.build_keepalive())
+        self._arm_upstream_keepalive(client)
+
+    @staticmethod
+    def _client_packet_seq(
+        data: bytearray,
+        opcode: int,
+        cp: soe.CombinedPacket | None,
+    ) -> int | None:
+        """Return the client sequence of the single OP_Packet in *data*.
+
+        ``None`` if the datagram carries no OP_Packet (or several), in which
+        case it is never treated as a retransmission.
+        """
+        if opcode == soe.TransportOp.Packet and len(data) >= 4:
+            return soe.get_sequence(data)
+        if cp is not None and cp.ops.count(soe.TransportOp.Packet) == 1:
+            return soe.get_sequence(data, cp.offsets[cp.index_of(soe.TransportOp.Packet)])
+        return None
+
+    def _forward_client_packet(self, client: ClientSession, data: bytearray | bytes, client_seq: int | None) -> None:
+        """Send a processed client datagram and remember it for replays."""
+        if client_seq is not None:
+            # The window and the send queue share one immutable copy.
+            data = bytes(data)
+            client.session.client_window.put(client_seq, data)
+        self.send_to_loginserver(client, data)
 
     # ------------------------------------------------------------------
     # Login Server -> Client
     # ------------------------------------------------------------------
     def handle_server_packet(
         self,
-        data: bytes,
+        data: bytes | bytearray | memoryview,
         addr: tuple[str, int] | None = None,
         start_index: int = 0,
         length: int | None = None,
+        client: ClientSession | None = None,
     ):
-        """Handle packets from the login server"""
+        """Handle packets from the login server
+
+        *client* is the owner of the upstream socket the packet arrived on;
+        packets on the shared socket go to the client that last sent
+        upstream.
+        """
+        client = client or self._upstream_client
+        if client is None:
+            logger.debug("Dropping login server packet: no client has sent upstream")
+            return
         if start_index == 0 and (length is None or length == len(data)):
-            data = self._strip_wire_crc(data)
+            stripped = self._from_wire(client, data)
+            if stripped is None:
+                return
+            data = stripped
         if length is None:
             length = len(data)
         # debug_write_packet(data, True)
         data = bytearray(data)
         # logger.debug(
         #     "Received message from login server: %s", data)
-        opcode = soe.get_transport_opcode(data[start_index:])
+        opcode = soe.get_transport_opcode(data, start_index)
 
         if opcode != soe.TransportOp.Fragment:
             logger.debug("Processing server packet with opcode: %s", soe.transport_name(opcode))
 
         if opcode == soe.TransportOp.SessionResponse:
+            if client.session_request_time is not None and client.server_addr is not None:
+                rtt = time.monotonic() - client.session_request_time
+                self.login_server.record_rtt(client.server_addr, rtt)
+                client.session_request_time = None
             response = soe.parse_session_response(data)
-            self._crc_bytes = response["crc_bytes"]
-            self._crc_key = response["encode_key"]
-            self.in_session = True
-            self.session_free()
+            client.crc.configure(response["encode_key"], response["crc_bytes"])
+            client.max_packet_size = response["max_packet_size"] or DEFAULT_MAX_PACKET_SIZE
+            client.codec.configure(response["encode_pass1"], response["encode_pass2"])
+            client.in_session = True
+            client.session_free()
+            client.session.max_packet_len = client.max_payload_len()
             logger.debug(
-                "Session response received, session established (crc_bytes=%d, crc_key=0x%08X)",
-                self._crc_bytes,
-                self._crc_key,
+                "Session response received, session established (crc_bytes=%d, crc_key=0x%08X, compressed=%s)",
+                client.crc.crc_bytes,
+                client.crc.key,
+                client.codec.enabled,
             )
 
         elif opcode == soe.TransportOp.Combined:
             logger.debug("Received combined packet, applying rewrites")
-            if self._try_intercept_bad_password_combined(data, start_index, length):
+            # Parse once; the interception and rewrite stages share the index.
+            cp = soe.CombinedPacket.parse(data, start_index, length)
+            if self._drop_suppressed_subs(client, data, cp):
+                return
+            if self._try_intercept_bad_password_combined(client, data, cp):
                 logger.debug("Suppressed SSO bad-password Combined from server")
                 return
-            forwarded = self.session.recv_combined(data, start_index, length)
+            forwarded = client.session.recv_combined(data, start_index, length, combined=cp)
             if forwarded is None:
                 return
             data = forwarded
 
         elif opcode == soe.TransportOp.Packet:
             logger.debug("Processing standard packet")
-            if self._try_intercept_bad_password_packet(data, start_index, length):
+            server_seq = soe.get_sequence(data, start_index)
+            if client.session.is_suppressed(server_seq):
+                logger.debug("Server retransmitted suppressed seq=%d; re-ACKing", server_seq)
+                self.send_to_loginserver(client, soe.build_ack(server_seq))
+                return
+            if self._try_intercept_bad_password_packet(client, data, start_index, length):
                 logger.debug("Suppressed SSO bad-password Packet from server")
                 return
-            self.session.recv_packet(data, start_index, length)
+            client.session.recv_packet(data, start_index, length)
 
         elif opcode == soe.TransportOp.Fragment:
             # logger.debug("Processing fragment packet")
-            maybe_server_list = self.session.recv_fragment(data, start_index, length)
+            maybe_server_list = client.session.recv_fragment(data, start_index, length)
+            if (
+                config.ACK_SERVER_FRAGMENTS or client.session.served_cached_server_list
+            ) and client.session.fragment_ack_seq is not None:
+                # ACK in the server's sequence space right away so its send
+                # window never waits on the client's round trip (which, after
+                # a cache hit, may already be over).
+                self.send_to_loginserver(client, soe.build_ack(client.session.fragment_ack_seq))
+            if client.session.upstream_server_list is not None:
+                self._refresh_server_list_cache(client.session.upstream_server_list)
+                client.session.upstream_server_list = None
             if maybe_server_list is not None:
-                # We're finished with the server list, forward it
-                data = maybe_server_list
+                # We're finished with the server list, forward it (as one
+                # packet or re-fragmented to fit the client's max length)
                 logger.debug("Server list fragments complete, forwarding to client")
-            else:
-                # Don't forward, whole point is to filter this
-                # logger.debug(
-                #     "Fragment part of server list,"
-                #     " not forwarding individually")
-                return
+                for packet in maybe_server_list:
+                    self.send_to_client(client, packet)
+            # Individual fragments are never forwarded, whole point is to
+            # filter this
+            return
 
         elif opcode == soe.TransportOp.Ack:
-            logger.debug("Forwarding server ACK to client (cs_offset=%d)", self.session.cs_offset)
-            self.session.adjust_server_ack(data, start_index)
+            logger.debug("Forwarding server ACK to client (cs_offset=%d)", client.session.cs_offset)
+            client.session.adjust_server_ack(data, start_index)
 
         logger.debug("Forwarding processed packet to client")
-        self.send_to_client(data)
+        self.send_to_client(client, data)
 
     # ------------------------------------------------------------------
     # I/O
@@ -526,41 +1100,106 @@ class LoginProxy(asyncio.DatagramProtocol):
         addr: tuple[str, int],
     ) -> None:
         """Called when a datagram is received"""
-        if addr == config.EQEMU_ADDR:
+        if self.login_server.is_server(addr):
             # Packet from login server
             self.handle_server_packet(data, addr)
         else:
             # Packet from client
-            self.handle_client_packet(bytearray(data), addr)
+            self.handle_client_packet(data, addr)
 
-    def send_to_client(self, data: bytearray | bytes):
-        if not data or not self.client_addr:
+    def send_to_client(self, client: ClientSession, data: bytearray | bytes):
+        if not data or not client.addr:
             logger.debug("Empty data or no client address, not sending to client")
             return
         # logger.debug(
         #     "Sending data to client %s: %s",
-        #     self.client_addr, data)
-        self.transport.sendto(self._append_wire_crc(data), self.client_addr)
+        #     client.addr, data)
+        self._send(client, data, client.addr)
 
-    def send_to_loginserver(self, data: bytearray | bytes):
+    def send_to_loginserver(self, client: ClientSession, data: bytearray | bytes):
         if not data:
             logger.debug("Empty data, not sending to loginserver")
             return
         # logger.debug("Sending data to loginserver: %s", data)
-        self.transport.sendto(self._append_wire_crc(data), config.EQEMU_ADDR)
+        self._upstream_client = client
+        self._send(client, data, None)
+
+    def _send(self, client: ClientSession, data: bytearray | bytes, addr: tuple[str, int] | None) -> None:
+        """Queue *data* for *addr*, or send it now when not coalescing.
+
+        *addr* ``None`` means the login server, at whichever address the
+        client's session uses when the datagram goes out.
+
+        Queued datagrams are packed by :meth:`flush_outbound`, which runs
+        once at the end of the current event-loop tick. A mutable *data* is
+        copied when queued, so the caller may reuse its buffer right away.
+        """
+        if not config.COALESCE_OUTBOUND:
+            self._transmit(client, data, addr)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called outside the proxy loop; there is no tick to batch over.
+            self._transmit(client, data, addr)
+            return
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        self._outbound.setdefault((client, addr), []).append(data)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self.flush_outbound)
+
+    def flush_outbound(self) -> None:
+        """Pack and send every datagram queued since the last flush."""
+        self._flush_scheduled = False
+        if not self._outbound:
+            return
+        outbound, self._outbound = self._outbound, {}
+        for (client, addr), packets in outbound.items():
+            # Framing (CRC key, compression) belongs to the queuing client.
+            datagrams = soe.coalesce_packets(packets, client.max_payload_len())
+            if len(datagrams) < len(packets):
+                logger.debug(
+                    "Coalesced %d packets into %d datagrams for %s",
+                    len(packets),
+                    len(datagrams),
+                    addr or "login server",
+                )
+            for dgram in datagrams:
+                self._transmit(client, dgram, addr)
+
+    def _transmit(self, client: ClientSession, data: bytearray | bytes, addr: tuple[str, int] | None) -> None:
+        """Put one datagram on the wire and update per-peer bookkeeping."""
+        if addr is None:
+            client.send_upstream(self._to_wire(client, data), self._shared_upstream())
+            client.last_upstream_send = time.time()
+        else:
+            self.transport.sendto(self._to_wire(client, data), addr)
+            client.packets_sent += 1
 
 
-async def main():
+async def main(
+    reuse_port: bool = False,
+    login_auth: LoginAuth | None = None,
+    probe_login_server: bool = True,
+):
+    """Bind the proxy's listening socket.
+
+    *reuse_port* sets ``SO_REUSEPORT`` so several worker processes can share
+    the port, and gives every client its own upstream socket; *login_auth* replaces the in-process WebSocket auth, and
+    *probe_login_server* False leaves health probes to another process.
+    """
     # Update UI status
-    ui.PROXY_STATS.update_status("Starting")
+    stats.PROXY_STATS.update_status("Starting")
     logger.info("Starting proxy server")
 
-    loop = asyncio.get_running_loop()
-    transport, _ = await loop.create_datagram_endpoint(
-        LoginProxy,
+    transport, _ = await _create_datagram_endpoint(
+        lambda: LoginProxy(login_auth, probe_login_server, reuse_port),
         local_addr=(config.LISTEN_HOST, config.LISTEN_PORT),
+        reuse_port=reuse_port or None,
     )
     logger.info("Started UDP proxy, listening on %s:%s", config.LISTEN_HOST, config.LISTEN_PORT)
-    ui.PROXY_STATS.reset_uptime()
+    stats.PROXY_STATS.reset_uptime()
 
     return transport
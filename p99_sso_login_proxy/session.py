@@ -16,6 +16,8 @@ diverge, so the proxy must rewrite them in both directions:
 from __future__ import annotations
 
 import logging
+import time
+from typing import Any
 
 from p99_sso_login_proxy import login_protocol as lp
 from p99_sso_login_proxy import soe_protocol as soe
@@ -27,6 +29,99 @@ P99_SERVER_PREFIXES = (
     "an interesting",
 )
 
+# How many recently handled sequences each direction remembers for
+# answering retransmissions locally.
+RETRANSMIT_WINDOW = 64
+
+# Client max packet length assumed until a SessionResponse says otherwise.
+DEFAULT_MAX_PACKET_LEN = 512
+
+# Server-window markers for server packets that never reached the client.
+SUPPRESSED = -1  # eaten by the proxy (SSO bad-password LoginAccepted)
+CONSUMED = -2  # swallowed into the server-list fragment assembler
+
+
+class RetransmitWindow:
+    """Bounded map of the most recently handled sequence numbers.
+
+    Oldest entries are evicted first once ``size`` is exceeded, so the
+    window tracks the tail of the stream a peer could still retransmit.
+    """
+
+    def __init__(self, size: int = RETRANSMIT_WINDOW):
+        self.size = size
+        self._entries: dict[int, Any] = {}
+
+    def __contains__(self, seq: int) -> bool:
+        return seq in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, seq: int) -> Any:
+        return self._entries.get(seq)
+
+    def put(self, seq: int, value: Any) -> None:
+        self._entries.pop(seq, None)
+        self._entries[seq] = value
+        if len(self._entries) > self.size:
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ServerListCache:
+    """The most recent filtered server list, shared by every session of
+    one proxy so repeat logins can be answered without waiting on (or
+    parsing) the upstream download.
+
+    A ``ttl`` of 0 disables the cache.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._payload: bytes | None = None
+        self._stored_at: float = 0.0
+
+    def get(self) -> bytes | None:
+        """Return the cached rebuilt app payload if it is still fresh."""
+        if self._payload is None or time.monotonic() - self._stored_at > self.ttl:
+            return None
+        return self._payload
+
+    def put(self, payload: bytes) -> None:
+        if self.ttl > 0:
+            self._payload = payload
+            self._stored_at = time.monotonic()
+
+    def clear(self) -> None:
+        self._payload = None
+
+
+def filter_server_list(app_payload: bytes | memoryview) -> bytes:
+    """Parse a ServerListResponse, keep only P99 servers and rebuild it.
+
+    *app_payload* starts with the 2-byte LE app opcode; so does the
+    result.
+    """
+    servers, header_bytes = lp.parse_server_list(app_payload)
+    logger.debug(
+        "Unfiltered server list (%d): %s",
+        len(servers),
+        [s.name for s in servers],
+    )
+
+    filtered = [s for s in servers if any(s.name.lower().startswith(prefix) for prefix in P99_SERVER_PREFIXES)]
+    logger.info(
+        "Server list: %d total, %d after filter: %s",
+        len(servers),
+        len(filtered),
+        [s.name for s in filtered],
+    )
+
+    return lp.build_server_list_response(filtered, header_bytes)
+
 
 class ProxySessionState:
     """Manages sequence-number translation and server-list
@@ -47,14 +142,45 @@ class ProxySessionState:
     Login on the existing SOE session, every subsequent client OP_Packet
     sequence has to be shifted by +1 before forwarding to the server, or
     the server will see duplicate / out-of-order sequences.
+
+    Two retransmission windows let duplicates be answered without touching
+    any of the counters above:
+
+    * ``server_window`` - server sequence -> the client sequence it was
+      forwarded as (or ``SUPPRESSED`` / ``CONSUMED``). A retransmitted
+      server packet is re-stamped with its original client sequence.
+    * ``client_window`` - client sequence -> the exact bytes forwarded to
+      the server (credentials already rewritten), replayed as-is.
+
+    With a ``server_list_cache`` (owned by the proxy, outliving the
+    session), a fresh cached server list is sequenced to the client as soon
+    as the first upstream fragment arrives. The upstream copy is still
+    reassembled so server-side sequencing and ACKs stay correct, then left
+    unparsed in ``upstream_server_list`` for the owner to refresh the cache
+    from off the hot path.
     """
 
-    def __init__(self):
+    def __init__(self, server_list_cache: ServerListCache | None = None):
         self.seq_to_client: int = 0
         self.seq_from_server: int = 0
         self.cs_offset: int = 0
         self._fragment_assembler = soe.FragmentAssembler()
         self._pending_app_opcode: int | None = None
+        # Server-side sequence the proxy may ACK on the client's behalf after
+        # the most recent recv_fragment (highest contiguous fragment so far).
+        self.fragment_ack_seq: int | None = None
+        self.server_window: RetransmitWindow = RetransmitWindow()
+        self.client_window: RetransmitWindow = RetransmitWindow()
+        # Largest datagram (before CRC/compression framing) the client will
+        # accept; set from the SessionResponse and kept across resets.
+        self.max_packet_len: int = DEFAULT_MAX_PACKET_LEN
+        self.server_list_cache = server_list_cache
+        # True once the in-progress (or last) server list was answered from
+        # the cache; its fragments are then ACKed by the proxy, since the
+        # client ACKs the cached packets before the upstream copy is done.
+        self.served_cached_server_list: bool = False
+        # Raw upstream ServerListResponse swallowed after a cache hit.
+        self.upstream_server_list: bytes | None = None
 
     def reset(self):
         self.seq_to_client = 0
@@ -62,22 +188,36 @@ class ProxySessionState:
         self.cs_offset = 0
         self._fragment_assembler.reset()
         self._pending_app_opcode = None
+        self.fragment_ack_seq = None
+        self.server_window.clear()
+        self.client_window.clear()
+        self.served_cached_server_list = False
+        self.upstream_server_list = None
 
     # ------------------------------------------------------------------
     # Client -> Server  (rewrite ACK sequences, apply cs_offset)
     # ------------------------------------------------------------------
-    def adjust_combined(self, buf: bytearray) -> None:
+    def adjust_combined(
+        self,
+        buf: bytearray,
+        combined: soe.CombinedPacket | None = None,
+    ) -> None:
         """Adjust a client-to-server OP_Combined in place.
 
         Rewrites every ACK sub-packet to the server's sequence space and
-        shifts every Packet sub-packet by ``cs_offset``.
+        shifts every Packet sub-packet by ``cs_offset``. Pass *combined* to
+        reuse an index the caller already parsed from *buf*.
         """
-        combined = soe.CombinedPacket.parse(buf)
-        for sub in combined:
-            if sub.transport_op == soe.TransportOp.Ack:
-                self._rewrite_ack(buf, sub.offset)
-            elif sub.transport_op == soe.TransportOp.Packet and self.cs_offset:
-                self._shift_packet_seq(buf, sub.offset, self.cs_offset)
+        if combined is None:
+            combined = soe.CombinedPacket.parse(buf)
+        offsets = combined.offsets
+        ops = combined.ops
+        for i in range(len(ops)):
+            op = ops[i]
+            if op == soe.TransportOp.Ack:
+                self._rewrite_ack(buf, offsets[i])
+            elif op == soe.TransportOp.Packet and self.cs_offset:
+                self._shift_packet_seq(buf, offsets[i], self.cs_offset)
 
     def adjust_ack(
         self,
@@ -146,6 +286,11 @@ class ProxySessionState:
         # Be defensive: the suppressed packet's sequence might be ahead of
         # what we've seen if the server skipped one for any reason.
         self.seq_from_server = max(self.seq_from_server, server_seq + 1)
+        self.server_window.put(server_seq, SUPPRESSED)
+
+    def is_suppressed(self, server_seq: int) -> bool:
+        """Return True if *server_seq* is a packet the proxy already ate."""
+        return self.server_window.get(server_seq) == SUPPRESSED
 
     def note_injected_client_packet(self) -> None:
         """Record that the proxy injected an extra C->S OP_Packet.
@@ -163,6 +308,7 @@ class ProxySessionState:
         buf: bytearray,
         start_index: int = 0,
         length: int | None = None,
+        combined: soe.CombinedPacket | None = None,
     ) -> bytearray | None:
         """Apply S->C rewrites to every sub-packet of an ``OP_Combined``.
 
@@ -177,17 +323,23 @@ class ProxySessionState:
         was harmless when server-seq == client-seq but caused the EQ client
         to stall on out-of-order sequences after the SSO retry had shifted
         sequences.
+
+        Pass *combined* to reuse the index the caller already parsed.
         """
         if length is None:
             length = len(buf) - start_index
 
-        combined = soe.CombinedPacket.parse(buf, start_index, length)
-        for sub in combined:
-            if sub.transport_op == soe.TransportOp.Ack:
-                self.adjust_server_ack(buf, sub.offset)
-            elif sub.transport_op == soe.TransportOp.Packet:
-                self._rewrite_server_packet_seq(buf, sub.offset)
-            elif sub.transport_op == soe.TransportOp.Fragment:
+        if combined is None:
+            combined = soe.CombinedPacket.parse(buf, start_index, length)
+        offsets = combined.offsets
+        ops = combined.ops
+        for i in range(len(ops)):
+            op = ops[i]
+            if op == soe.TransportOp.Ack:
+                self.adjust_server_ack(buf, offsets[i])
+            elif op == soe.TransportOp.Packet:
+                self._rewrite_server_packet_seq(buf, offsets[i])
+            elif op == soe.TransportOp.Fragment:
                 # Fragments inside Combineds are uncommon in this protocol;
                 # the server list is sent as standalone Fragments. If we
                 # ever see one here, leave it alone and forward as-is.
@@ -224,9 +376,18 @@ class ProxySessionState:
         server's sequence matches what we expected next; out-of-order
         packets are still rewritten so the client sees a coherent stream
         but ``seq_from_server`` is not bumped past a gap.
+
+        A retransmission of a packet already forwarded reuses the client
+        sequence it was given the first time and advances nothing.
         """
         server_seq = soe.get_sequence(buf, offset)
+        client_seq = self.server_window.get(server_seq)
+        if client_seq is not None and client_seq >= 0:
+            logger.debug("Server retransmitted seq=%d; re-sending as client seq=%d", server_seq, client_seq)
+            soe.set_sequence(buf, offset, client_seq)
+            return
         soe.set_sequence(buf, offset, self.seq_to_client)
+        self.server_window.put(server_seq, self.seq_to_client)
         self.seq_to_client += 1
 
         if server_seq != self.seq_from_server:
@@ -243,27 +404,46 @@ class ProxySessionState:
         buf: bytearray,
         start_index: int = 0,
         length: int | None = None,
-    ) -> bytearray | None:
+    ) -> list[bytes] | None:
         """Handle an OP_Fragment from the server.
 
-        Returns a single assembled + filtered server list packet
-        when all fragments have arrived, or ``None`` if still
-        accumulating.
+        Returns the assembled + filtered server list, ready to send to the
+        client, when all fragments have arrived (or, on a server list cache
+        hit, as soon as the first one does), or ``None`` if still
+        accumulating. Afterwards ``fragment_ack_seq`` holds the server
+        sequence of the highest contiguous fragment received.
         """
         if length is None:
             length = len(buf) - start_index
-        raw = bytes(buf[start_index : start_index + length])
+        raw = memoryview(buf)[start_index : start_index + length]
 
         server_seq = soe.get_sequence(raw, 0)
+        if self.server_window.get(server_seq) == CONSUMED:
+            # Retransmission of a fragment we already have; the server only
+            # needs to hear the ACK again. ACKs are cumulative, so it covers
+            # the contiguous run, not a fragment parked past a gap.
+            if self._fragment_assembler.active:
+                self.fragment_ack_seq = self._fragment_assembler.contiguous_seq
+            return None
+        self.server_window.put(server_seq, CONSUMED)
         self.seq_from_server = (server_seq + 1) & 0xFFFF
 
+        early: list[bytes] | None = None
         if not self._fragment_assembler.active:
             header = soe.parse_first_fragment_header(raw)
             self._pending_app_opcode = header["app_opcode"]
+            self.served_cached_server_list = False
+            if header["app_opcode"] == lp.AppOp.ServerListResponse and self.server_list_cache is not None:
+                cached = self.server_list_cache.get()
+                if cached is not None:
+                    logger.debug("Serving cached server list while the upstream copy downloads")
+                    self.served_cached_server_list = True
+                    early = self._sequence_for_client(cached)
 
         assembled = self._fragment_assembler.add(server_seq, raw)
+        self.fragment_ack_seq = self._fragment_assembler.contiguous_seq
         if assembled is None:
-            return None
+            return early
 
         app_opcode = self._pending_app_opcode
         self._fragment_assembler.reset()
@@ -273,6 +453,10 @@ class ProxySessionState:
             logger.debug("Ignoring non-server-list fragment (app_op=0x%04X)", app_opcode)
             return None
 
+        if self.served_cached_server_list:
+            self.upstream_server_list = bytes(assembled)
+            return early
+
         return self._filter_and_build_server_list(assembled)
 
     # ------------------------------------------------------------------
@@ -280,36 +464,32 @@ class ProxySessionState:
     # ------------------------------------------------------------------
     def _filter_and_build_server_list(
         self,
-        app_payload: bytes,
-    ) -> bytearray:
-        """Parse, filter to P99 servers, and rebuild as a single
-        OP_Packet.
+        app_payload: bytes | memoryview,
+    ) -> list[bytes]:
+        """Parse, filter to P99 servers, and rebuild for the client.
 
         *app_payload* already starts with the 2-byte LE app opcode
         (from the first fragment's data after total_len).
         """
-        servers, header_bytes = lp.parse_server_list(app_payload)
-        logger.debug(
-            "Unfiltered server list (%d): %s",
-            len(servers),
-            [s.name for s in servers],
-        )
-
-        filtered = [s for s in servers if any(s.name.lower().startswith(prefix) for prefix in P99_SERVER_PREFIXES)]
-        logger.info(
-            "Server list: %d total, %d after filter: %s",
-            len(servers),
-            len(filtered),
-            [s.name for s in filtered],
-        )
-
-        rebuilt = lp.build_server_list_response(filtered, header_bytes)
-
-        out = bytearray()
-        out += soe.TransportOp.Packet.to_bytes(2, "big")
-        out += self.seq_to_client.to_bytes(2, "big")
-        out += rebuilt
-        self.seq_to_client += 1
+        rebuilt = filter_server_list(app_payload)
+        if self.server_list_cache is not None:
+            self.server_list_cache.put(rebuilt)
+        return self._sequence_for_client(rebuilt)
+
+    def _sequence_for_client(self, app_payload: bytes) -> list[bytes]:
+        """Wrap *app_payload* in client-side sequence numbers.
+
+        A single OP_Packet when it fits in ``max_packet_len``, otherwise a
+        run of OP_Fragments, one client sequence each, so the client never
+        sees a datagram larger than it negotiated.
+        """
+        packet = soe.wrap_app_packet(self.seq_to_client, app_payload)
+        if len(packet) <= self.max_packet_len:
+            out = [packet]
+        else:
+            out = soe.build_fragments(app_payload, self.seq_to_client, self.max_packet_len)
+            logger.debug("Server list is %d bytes; sending as %d fragments", len(app_payload), len(out))
+        self.seq_to_client += len(out)
         return out
 
 
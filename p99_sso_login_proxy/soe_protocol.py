@@ -9,6 +9,9 @@ from __future__ import annotations
 
 import logging
 import struct
+import zlib
+from array import array
+from collections.abc import Iterator
 from dataclasses import dataclass, field
 from enum import IntEnum
 
@@ -37,9 +40,9 @@ class TransportOp(IntEnum):
 TRANSPORT_NAMES: dict[int, str] = {op.value: op.name for op in TransportOp}
 
 
-def get_transport_opcode(data: bytes) -> int:
-    """Read the 2-byte big-endian transport opcode from raw packet data."""
-    return struct.unpack(">H", data[:2])[0]
+def get_transport_opcode(data: bytes, offset: int = 0) -> int:
+    """Read the 2-byte big-endian transport opcode at *offset* in *data*."""
+    return struct.unpack_from(">H", data, offset)[0]
 
 
 def transport_name(op: int) -> str:
@@ -48,37 +51,24 @@ def transport_name(op: int) -> str:
 
 # ---------------------------------------------------------------------------
 # CRC-32  (EQEmu SOE variant: key bytes precede packet bytes)
+#
+# The SOE CRC is a plain CRC-32 over ``key(4 LE) + packet``, so the key
+# prefix can be folded into a zlib running-CRC seed once per session and
+# every packet then costs a single C-level ``zlib.crc32`` call.
 # ---------------------------------------------------------------------------
-def _generate_crc_table() -> list[int]:
-    table = []
-    for i in range(256):
-        crc = i
-        for _ in range(8):
-            if crc & 1:
-                crc = (crc >> 1) ^ 0xEDB88320
-            else:
-                crc >>= 1
-        table.append(crc)
-    return table
-
-
-_CRC_TABLE = _generate_crc_table()
+def crc_seed(key: int) -> int:
+    """Return the running CRC-32 after feeding the 4 little-endian key bytes."""
+    return zlib.crc32(key.to_bytes(4, "little"))
 
 
 def soe_crc32(data: bytes, key: int) -> int:
-    crc = 0xFFFFFFFF
-    for byte in key.to_bytes(4, "little") + data:
-        crc = _CRC_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
-    return (~crc) & 0xFFFFFFFF
+    return zlib.crc32(data, crc_seed(key))
 
 
-def append_crc(packet: bytes, key: int, crc_bytes: int) -> bytes:
+def append_crc(packet: bytes, key: int, crc_bytes: int) -> bytes | bytearray:
     if crc_bytes == 0:
         return packet
-    crc = soe_crc32(packet, key)
-    if crc_bytes == 2:
-        return packet + struct.pack(">H", crc & 0xFFFF)
-    return packet + struct.pack(">I", crc)
+    return SessionCrc(key, crc_bytes).append(packet)
 
 
 def strip_crc(packet: bytes, crc_bytes: int) -> bytes:
@@ -87,6 +77,146 @@ def strip_crc(packet: bytes, crc_bytes: int) -> bytes:
     return packet[:-crc_bytes]
 
 
+class SessionCrc:
+    """CRC parameters negotiated by one ``OP_SessionResponse``.
+
+    The key is pre-folded into :attr:`seed` when the session is configured,
+    so computing, appending and verifying a packet CRC never rebuilds the
+    ``key + data`` buffer.
+    """
+
+    __slots__ = ("crc_bytes", "key", "seed")
+
+    def __init__(self, key: int = 0, crc_bytes: int = 0):
+        self.configure(key, crc_bytes)
+
+    def configure(self, key: int, crc_bytes: int) -> None:
+        self.key = key
+        self.crc_bytes = crc_bytes
+        self.seed = crc_seed(key)
+
+    def reset(self) -> None:
+        self.configure(0, 0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.crc_bytes != 0
+
+    def compute(self, data: bytes | bytearray | memoryview) -> int:
+        return zlib.crc32(data, self.seed)
+
+    def append(self, packet: bytes | bytearray | memoryview) -> bytearray:
+        """Return *packet* with the big-endian CRC trailer appended.
+
+        The result is one buffer sized for the packet and its trailer; the
+        packet is copied in once and the CRC written into the tail in place.
+        """
+        size = len(packet)
+        out = bytearray(size + self.crc_bytes)
+        body = memoryview(out)[:size]
+        # Through the view: slice-assigning bytes to a bytearray copies twice.
+        body[:] = packet
+        if self.crc_bytes == 2:
+            struct.pack_into(">H", out, size, zlib.crc32(body, self.seed) & 0xFFFF)
+        elif self.crc_bytes == 4:
+            struct.pack_into(">I", out, size, zlib.crc32(body, self.seed))
+        return out
+
+    def verify(self, packet: bytes | bytearray | memoryview) -> bool:
+        """Return True if the trailing CRC of *packet* matches its body."""
+        n = self.crc_bytes
+        if n == 0:
+            return True
+        if len(packet) < n:
+            return False
+        view = memoryview(packet)
+        crc = zlib.crc32(view[:-n], self.seed)
+        if n == 2:
+            crc &= 0xFFFF
+        return int.from_bytes(view[-n:], "big") == crc
+
+
+# ---------------------------------------------------------------------------
+# Compression  (SessionResponse encode_pass1/encode_pass2 == 0x01)
+#
+# After the transport opcode (2 bytes, or 1 for a non-0x00-prefixed packet)
+# comes a flag byte: 0x5A means the rest is a zlib stream, 0xA5 means the
+# rest is stored raw. The CRC, when present, covers the encoded form.
+# ---------------------------------------------------------------------------
+ENCODE_COMPRESSION = 0x01
+COMPRESSED_FLAG = 0x5A
+UNCOMPRESSED_FLAG = 0xA5
+_COMPRESSED_FLAG_BYTE = bytes((COMPRESSED_FLAG,))
+_UNCOMPRESSED_FLAG_BYTE = bytes((UNCOMPRESSED_FLAG,))
+
+# Upper bound on an inflated packet; SOE datagrams are far smaller, so
+# anything larger is corrupt (or hostile) input.
+MAX_DECOMPRESSED_SIZE = 0x10000
+
+# Upper bound on a reassembled fragment sequence. The first fragment's
+# length field is preallocated, so a larger claim is dropped, not trusted.
+MAX_REASSEMBLED_SIZE = 0x100000
+
+
+class SoeCodec:
+    """Streaming zlib codec for SOE packets on a compressed session.
+
+    The inflater/deflater are built once and ``copy()``-ed per packet, so
+    per-packet setup is a state clone rather than a fresh zlib init. When
+    the session did not negotiate compression both directions pass
+    packets through untouched.
+    """
+
+    __slots__ = ("_deflater", "_inflater", "enabled")
+
+    def __init__(self):
+        self.enabled = False
+        self._inflater = zlib.decompressobj()
+        self._deflater = zlib.compressobj(zlib.Z_BEST_SPEED)
+
+    def configure(self, encode_pass1: int, encode_pass2: int) -> None:
+        self.enabled = ENCODE_COMPRESSION in (encode_pass1, encode_pass2)
+
+    def reset(self) -> None:
+        self.enabled = False
+
+    @staticmethod
+    def _flag_offset(packet: bytes | bytearray) -> int:
+        return 2 if packet[0] == 0x00 else 1
+
+    def decode(self, packet: bytes | bytearray | memoryview) -> bytes | bytearray | memoryview:
+        """Strip the compression flag (inflating if needed) from *packet*.
+
+        *packet* must already have its CRC removed. Raises ``zlib.error``
+        on a corrupt or oversized stream.
+        """
+        if not self.enabled or len(packet) < 3:
+            return packet
+        off = self._flag_offset(packet)
+        flag = packet[off]
+        if flag == COMPRESSED_FLAG:
+            inflater = self._inflater.copy()
+            body = inflater.decompress(memoryview(packet)[off + 1 :], MAX_DECOMPRESSED_SIZE)
+            if inflater.unconsumed_tail:
+                raise zlib.error("decompressed packet exceeds size limit")
+            return b"".join((packet[:off], body))
+        if flag == UNCOMPRESSED_FLAG:
+            return b"".join((packet[:off], memoryview(packet)[off + 1 :]))
+        return packet
+
+    def encode(self, packet: bytes | bytearray) -> bytes | bytearray:
+        """Add the compression flag, deflating only when that is smaller."""
+        if not self.enabled or len(packet) < 2:
+            return packet
+        off = self._flag_offset(packet)
+        body = memoryview(packet)[off:]
+        deflater = self._deflater.copy()
+        compressed = deflater.compress(body) + deflater.flush()
+        if len(compressed) < len(body):
+            return b"".join((packet[:off], _COMPRESSED_FLAG_BYTE, compressed))
+        return b"".join((packet[:off], _UNCOMPRESSED_FLAG_BYTE, body))
+
+
 # ---------------------------------------------------------------------------
 # Packet builders
 # ---------------------------------------------------------------------------
@@ -102,19 +232,87 @@ def build_disconnect() -> bytes:
     return struct.pack(">H", TransportOp.SessionDisconnect)
 
 
+def build_session_request(connect_code: int, max_packet_size: int = 512) -> bytes:
+    """Build OP_SessionRequest: opcode + protocol version + connect code + max length."""
+    return struct.pack(">HIII", TransportOp.SessionRequest, 2, connect_code, max_packet_size)
+
+
+def build_session_disconnect(connect_code: int) -> bytes:
+    """Build OP_SessionDisconnect for *connect_code* (CRC not included)."""
+    return struct.pack(">HI", TransportOp.SessionDisconnect, connect_code)
+
+
 def build_combined(sub_packets: list[bytes]) -> bytes:
     """Build OP_Combined from raw sub-packet datagrams.
 
     Each sub-packet is length-prefixed: 1 byte if <255, else 0xFF + 2-byte BE.
     """
-    body = b""
+    parts = [struct.pack(">H", TransportOp.Combined)]
     for sub in sub_packets:
         slen = len(sub)
         if slen >= 0xFF:
-            body += b"\xff" + struct.pack(">H", slen) + sub
+            parts.append(b"\xff" + slen.to_bytes(2, "big"))
+        else:
+            parts.append(bytes((slen,)))
+        parts.append(sub)
+    return b"".join(parts)
+
+
+# Transport ops that may ride inside an OP_Combined built by the proxy.
+# Session setup/teardown and anything the proxy doesn't understand is always
+# sent as its own datagram.
+COMBINABLE_OPS = frozenset(
+    {
+        TransportOp.Ack,
+        TransportOp.OutOfOrder,
+        TransportOp.Packet,
+        TransportOp.Fragment,
+    }
+)
+
+
+def coalesce_packets(packets: list[bytes], max_len: int) -> list[bytes]:
+    """Pack queued outbound datagrams (before CRC) into as few as possible.
+
+    Consecutive combinable packets (and the subs of any queued
+    ``OP_Combined``) are greedily packed into ``OP_Combined`` datagrams of
+    at most *max_len* bytes; order is preserved throughout. A batch holding
+    a single packet is emitted unwrapped. Non-combinable packets flush the
+    current batch and go out on their own.
+    """
+    out: list[bytes] = []
+    batch: list[bytes] = []
+    batch_len = 2  # Combined opcode
+
+    def close_batch() -> None:
+        nonlocal batch, batch_len
+        if len(batch) == 1:
+            out.append(batch[0])
+        elif batch:
+            out.append(build_combined(batch))
+        batch = []
+        batch_len = 2
+
+    for pkt in packets:
+        if len(pkt) < 2:
+            continue
+        op = get_transport_opcode(pkt)
+        if op == TransportOp.Combined:
+            subs = parse_combined(pkt)
+        elif op in COMBINABLE_OPS:
+            subs = [pkt]
         else:
-            body += struct.pack("B", slen) + sub
-    return struct.pack(">H", TransportOp.Combined) + body
+            close_batch()
+            out.append(pkt)
+            continue
+        for sub in subs:
+            cost = len(sub) + (1 if len(sub) < 0xFF else 3)
+            if batch and batch_len + cost > max_len:
+                close_batch()
+            batch.append(sub)
+            batch_len += cost
+    close_batch()
+    return out
 
 
 def wrap_app_packet(sequence: int, app_payload: bytes) -> bytes:
@@ -150,6 +348,50 @@ def parse_session_response(data: bytes) -> dict:
     }
 
 
+def parse_session_stat_request(data: bytes) -> dict:
+    """Parse OP_SessionStatRequest (40 bytes).
+
+    Wire layout::
+
+        opcode(2 BE) + request_id(2 BE) + last_local_delta(4 BE)
+        + average_delta(4 BE) + low_delta(4 BE) + high_delta(4 BE)
+        + last_remote_delta(4 BE) + packets_sent(8 BE) + packets_recv(8 BE)
+    """
+    if len(data) < 40:
+        raise ValueError(f"SessionStatRequest too short ({len(data)} bytes)")
+    request_id, packets_sent, packets_recv = struct.unpack(">H20xQQ", data[2:40])
+    return {
+        "request_id": request_id,
+        "packets_sent": packets_sent,
+        "packets_recv": packets_recv,
+    }
+
+
+def build_session_stat_response(
+    request_id: int,
+    client_sent: int,
+    client_recv: int,
+    server_sent: int,
+    server_recv: int,
+    timestamp_ms: int,
+) -> bytes:
+    """Build OP_SessionStatResponse (40 bytes).
+
+    Echoes the client's request id and packet counts next to the
+    responder's own counts, the same way EQEmu answers the request.
+    """
+    return struct.pack(
+        ">HHIQQQQ",
+        TransportOp.SessionStatResponse,
+        request_id & 0xFFFF,
+        timestamp_ms & 0xFFFFFFFF,
+        client_sent,
+        client_recv,
+        server_sent,
+        server_recv,
+    )
+
+
 def parse_combined(data: bytes) -> list[bytes]:
     """Split an OP_Combined packet into its sub-packets.
 
@@ -166,7 +408,7 @@ def parse_combined(data: bytes) -> list[bytes]:
             pos += 2
         if sublen == 0 or pos + sublen > length:
             break
-        subs.append(bytes(data[pos : pos + sublen]))
+        subs.append(bytes(memoryview(data)[pos : pos + sublen]))
         pos += sublen
     return subs
 
@@ -175,9 +417,13 @@ def parse_combined(data: bytes) -> list[bytes]:
 class CombinedPacket:
     """Parsed view of an OP_Combined packet.
 
-    Provides iteration over sub-packets with their offsets into
-    the original buffer, supporting both read-only splitting and
-    in-place mutation (e.g. ACK sequence rewriting).
+    Sub-packets are indexed column-wise: ``offsets[i]`` (absolute offset
+    into the original buffer), ``lengths[i]`` and ``ops[i]`` (the 2-byte
+    BE transport opcode) live in parallel ``array`` columns, so parsing
+    and dispatching a Combined allocates nothing per sub-packet. The
+    index supports both read-only splitting and in-place mutation (e.g.
+    ACK sequence rewriting) and is meant to be parsed once per datagram
+    and shared by every stage that inspects it.
 
     Can be constructed from raw bytes via ``CombinedPacket.parse()``
     or from a mutable bytearray with an optional ``start_index``
@@ -186,7 +432,7 @@ class CombinedPacket:
 
     @dataclass
     class SubPacket:
-        """One sub-packet inside a Combined."""
+        """One sub-packet inside a Combined (materialized on iteration)."""
 
         offset: int  # absolute offset in the buffer
         length: int
@@ -195,7 +441,9 @@ class CombinedPacket:
     buf: bytearray | bytes
     start: int = 0
     end: int = 0
-    subs: list[SubPacket] = field(default_factory=list)
+    offsets: array = field(default_factory=lambda: array("I"))
+    lengths: array = field(default_factory=lambda: array("H"))
+    ops: array = field(default_factory=lambda: array("H"))
 
     @classmethod
     def parse(
@@ -209,29 +457,45 @@ class CombinedPacket:
             length = len(buf) - start_index
         end = start_index + length
         pos = start_index + 2  # skip Combined opcode
-        subs: list[CombinedPacket.SubPacket] = []
+        cp = cls(buf=buf, start=start_index, end=end)
+        offsets = cp.offsets
+        lengths = cp.lengths
+        ops = cp.ops
         while pos < end:
             sublen = buf[pos]
             pos += 1
             if sublen == 0xFF and pos + 2 <= end:
-                sublen = int.from_bytes(buf[pos : pos + 2], "big")
+                sublen = (buf[pos] << 8) | buf[pos + 1]
                 pos += 2
-            if sublen == 0 or pos + sublen > end:
+            if sublen < 2 or pos + sublen > end:
                 break
-            op = struct.unpack(">H", buf[pos : pos + 2])[0]
-            subs.append(cls.SubPacket(offset=pos, length=sublen, transport_op=op))
+            offsets.append(pos)
+            lengths.append(sublen)
+            ops.append((buf[pos] << 8) | buf[pos + 1])
             pos += sublen
-        return cls(buf=buf, start=start_index, end=end, subs=subs)
+        return cp
 
-    def __iter__(self):
-        return iter(self.subs)
+    def __iter__(self) -> Iterator[SubPacket]:
+        for i in range(len(self.ops)):
+            yield self.SubPacket(offset=self.offsets[i], length=self.lengths[i], transport_op=self.ops[i])
 
     def __len__(self):
-        return len(self.subs)
-
-    def sub_bytes(self, sub: SubPacket) -> bytes:
-        """Return the raw bytes of a sub-packet."""
-        return bytes(self.buf[sub.offset : sub.offset + sub.length])
+        return len(self.ops)
+
+    def index_of(self, transport_op: int) -> int:
+        """Return the index of the first sub with *transport_op*, or -1."""
+        try:
+            return self.ops.index(transport_op)
+        except ValueError:
+            return -1
+
+    def sub_bytes(self, sub: SubPacket | int) -> bytes:
+        """Return the raw bytes of a sub-packet (object or column index)."""
+        if isinstance(sub, int):
+            offset, length = self.offsets[sub], self.lengths[sub]
+        else:
+            offset, length = sub.offset, sub.length
+        return bytes(self.buf[offset : offset + length])
 
 
 def get_app_payload(packet: bytes) -> tuple[int, bytes]:
@@ -242,7 +506,7 @@ def get_app_payload(packet: bytes) -> tuple[int, bytes]:
 
 def get_sequence(data: bytes, offset: int = 0) -> int:
     """Read the 2-byte big-endian sequence from an OP_Packet or OP_Fragment."""
-    return struct.unpack(">H", data[offset + 2 : offset + 4])[0]
+    return struct.unpack_from(">H", data, offset + 2)[0]
 
 
 def set_sequence(data: bytearray, offset: int, seq: int) -> None:
@@ -312,80 +576,90 @@ def build_fragments(
 class FragmentAssembler:
     """Reassembles fragmented responses (e.g. large server lists).
 
-    Uses accumulated byte length rather than a predicted fragment count
-    to decide when reassembly is complete.
+    The first fragment's ``total_len`` sizes a single preallocated
+    ``bytearray``; in-order fragment payloads are written straight into it
+    at a running contiguous-length watermark, so each ``add`` is O(1) and
+    completion needs no join. Fragments that arrive ahead of a gap are
+    parked in :attr:`fragments` until the gap is filled.
     """
 
     def __init__(self):
         self.fragments: dict[int, bytes] = {}
         self.total_len: int | None = None
         self.first_seq: int | None = None
+        self._buf: bytearray | None = None
+        self._next_seq: int = 0
+        self._filled: int = 0
 
     @property
     def active(self) -> bool:
         return self.first_seq is not None
 
-    def add(self, seq: int, raw_frag: bytes) -> bytes | None:
+    @property
+    def contiguous_seq(self) -> int | None:
+        """Sequence of the last fragment in the contiguous run from the first."""
+        if self.first_seq is None:
+            return None
+        return (self._next_seq - 1) & 0xFFFF
+
+    def add(self, seq: int, raw_frag: bytes | bytearray | memoryview) -> memoryview | None:
         """Feed a raw OP_Fragment datagram (after CRC strip).
 
-        Returns reassembled app payload when all fragments arrive.
+        Returns a ``memoryview`` of the reassembled app payload when all
+        fragments have arrived. The view stays valid after :meth:`reset`.
         """
         if len(raw_frag) < SUBSEQUENT_FRAG_OVERHEAD:
             return None
-        frag_data = raw_frag[SUBSEQUENT_FRAG_OVERHEAD:]
+        frag_data = memoryview(raw_frag)[SUBSEQUENT_FRAG_OVERHEAD:]
 
         starts_new_sequence = (
             self.first_seq is not None and seq != self.first_seq and ((seq - self.first_seq) & 0xFFFF) > 0x7FFF
         )
         if self.first_seq is None or starts_new_sequence:
             if starts_new_sequence:
-                self.fragments.clear()
+                self.reset()
             if len(frag_data) < 4:
                 return None
+            total_len = int.from_bytes(frag_data[:4], "big")
+            if total_len > MAX_REASSEMBLED_SIZE:
+                logger.warning("Dropping fragment sequence claiming %d bytes", total_len)
+                return None
             self.first_seq = seq
-            self.total_len = struct.unpack(">I", frag_data[:4])[0]
-            self.fragments[seq] = frag_data[4:]
+            self.total_len = total_len
+            self._buf = bytearray(total_len)
+            self._next_seq = seq
+            self._write(frag_data[4:])
         elif seq == self.first_seq:
-            if len(frag_data) < 4:
-                return None
-            total_len = struct.unpack(">I", frag_data[:4])[0]
-            if total_len != self.total_len:
-                return None
-            self.fragments[seq] = frag_data[4:]
+            # Duplicate first fragment; its payload is already written.
+            return None
         else:
-            self.fragments[seq] = frag_data
-
-        if self.total_len is not None and self._contiguous_len() >= self.total_len:
-            return self._reassemble()
+            ahead = (seq - self._next_seq) & 0xFFFF
+            if ahead == 0:
+                self._write(frag_data)
+            elif ahead <= 0x7FFF:
+                self.fragments[seq] = bytes(frag_data)
+            # Otherwise a duplicate of a fragment behind the watermark.
+
+        while self._next_seq in self.fragments:
+            self._write(self.fragments.pop(self._next_seq))
+
+        if self._buf is not None and self._filled >= len(self._buf):
+            return memoryview(self._buf)
         return None
 
-    def _contiguous_len(self) -> int:
-        if self.first_seq is None:
-            return 0
-        total = 0
-        seq = self.first_seq
-        for _ in range(len(self.fragments)):
-            payload = self.fragments.get(seq)
-            if payload is None:
-                break
-            total += len(payload)
-            seq = (seq + 1) & 0xFFFF
-        return total
-
-    def _reassemble(self) -> bytes:
-        assert self.first_seq is not None
-        assert self.total_len is not None
-        chunks = []
-        size = 0
-        seq = self.first_seq
-        while size < self.total_len:
-            payload = self.fragments[seq]
-            chunks.append(payload)
-            size += len(payload)
-            seq = (seq + 1) & 0xFFFF
-        return b"".join(chunks)[: self.total_len]
+    def _write(self, payload: bytes | memoryview) -> None:
+        assert self._buf is not None
+        n = min(len(payload), len(self._buf) - self._filled)
+        memoryview(self._buf)[self._filled : self._filled + n] = payload[:n]
+        self._filled += n
+        self._next_seq = (self._next_seq + 1) & 0xFFFF
 
     def reset(self):
         self.fragments.clear()
         self.total_len = None
         self.first_seq = None
+        # Drop (rather than clear) the buffer so views handed out by add()
+        # remain valid.
+        self._buf = None
+        self._next_seq = 0
+        self._filled = 0
@@ -0,0 +1,83 @@
+"""Short-lived cache of SSO login credentials.
+
+A ``login_auth`` round trip over the WebSocket costs up to
+``config.SSO_TIMEOUT`` seconds, and players often log the same name in again
+shortly after (a crash, a camp to another character). The answer for a
+typed login name is kept for ``sso_credential_cache_ttl`` seconds so such
+repeat logins are rewritten on the spot.
+
+An entry is dropped when it could be stale:
+
+* a ``delta`` touching its account, or any ``full_state``, arrives;
+* the SSO server answers the name with an error;
+* the login server rejects the credentials (the bad-password retry).
+
+Written from the WebSocket's thread and read from the proxy's, so every
+access holds a lock.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+from p99_sso_login_proxy import config
+
+
+class SsoCredentialCache:
+    """``(real_user, encrypted_credentials)`` per typed login name.
+
+    A ``ttl`` or ``max_entries`` of 0 disables the cache. Beyond
+    ``max_entries`` the least recently used name is dropped.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # username -> (real_user, encrypted, stored_at)
+        self._entries: OrderedDict[str, tuple[str, bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, username: str) -> tuple[str, bytes] | None:
+        """Return fresh ``(real_user, encrypted)`` for *username*, if any."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            real_user, encrypted, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return real_user, encrypted
+
+    def put(self, username: str, real_user: str, encrypted: bytes) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (real_user, encrypted, time.monotonic())
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def invalidate_account(self, account: str) -> None:
+        """Drop every login name that resolved to *account*."""
+        account = account.lower()
+        with self._lock:
+            for username in [name for name, entry in self._entries.items() if entry[0].lower() == account]:
+                del self._entries[username]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+SSO_CREDENTIALS = SsoCredentialCache(config.SSO_CREDENTIAL_CACHE_TTL, config.SSO_CREDENTIAL_CACHE_SIZE)
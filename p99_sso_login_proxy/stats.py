@@ -0,0 +1,152 @@
+"""UI-agnostic proxy statistics.
+
+``PROXY_STATS`` is the sink the proxy reports connection events to. It
+starts out as a plain :class:`ProxyStats`; the Qt front end replaces it with
+its signal-emitting subclass in ``ui.start_ui`` and the headless daemon with
+:class:`LoggingProxyStats`.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+logger = logging.getLogger("stats")
+
+# Login server health states reported by health.LoginServerMonitor.
+LOGIN_SERVER_UNKNOWN = "Unknown"
+LOGIN_SERVER_UP = "Up"
+LOGIN_SERVER_SLOW = "Slow"
+LOGIN_SERVER_DOWN = "Down"
+
+
+class ProxyStats:
+    """Track proxy connection statistics.
+
+    Front ends observe changes by overriding the ``notify_*`` hooks, which
+    are no-ops here.
+    """
+
+    def __init__(self):
+        self.total_connections = 0
+        self.active_connections = 0
+        self.completed_connections = 0
+        self.proxy_status = "Initializing..."
+        self.listening_address = "0.0.0.0"
+        self.listening_port = 0
+        self.start_time = time.time()
+        self.login_server_state = LOGIN_SERVER_UNKNOWN
+        self.login_server_rtt_p50: float | None = None
+        self.login_server_rtt_p95: float | None = None
+        self.login_server_loss: float | None = None
+
+    def notify_stats_updated(self):
+        """Hook: counters or status changed."""
+
+    def notify_user_connected(self, alias, account, method):
+        """Hook: a user logged in through the proxy."""
+
+    def notify_auth_error(self, username, detail):
+        """Hook: the server rejected a login attempt."""
+
+    def notify_login_server_state(self, state):
+        """Hook: the login server health state changed."""
+
+    def reset_uptime(self):
+        """Reset the start time for uptime calculation"""
+        self.start_time = time.time()
+
+    def update_status(self, status):
+        """Update the proxy status"""
+        self.proxy_status = status
+        self.notify_stats_updated()
+
+    def update_listening_info(self, address, port):
+        """Update the listening address and port"""
+        self.listening_address = address
+        self.listening_port = port
+        self.notify_stats_updated()
+
+    def connection_started(self):
+        """Increment connection counters when a new connection starts"""
+        self.total_connections += 1
+        self.active_connections += 1
+        self.notify_stats_updated()
+
+    def connection_completed(self):
+        """Update counters when a connection completes"""
+        self.active_connections = max(0, self.active_connections - 1)
+        self.completed_connections += 1
+        self.notify_stats_updated()
+
+    def update_login_server_health(self, state, rtt_p50, rtt_p95, loss):
+        """Record the latest login server probe summary (RTTs in seconds, loss 0-1)"""
+        changed = state != self.login_server_state
+        self.login_server_state = state
+        self.login_server_rtt_p50 = rtt_p50
+        self.login_server_rtt_p95 = rtt_p95
+        self.login_server_loss = loss
+        if changed:
+            self.notify_login_server_state(state)
+        self.notify_stats_updated()
+
+    def get_login_server_health(self):
+        """Return the login server health in human-readable format"""
+        if self.login_server_rtt_p50 is None:
+            if self.login_server_loss is None:
+                return self.login_server_state
+            return f"{self.login_server_state} ({self.login_server_loss:.0%} loss)"
+        return (
+            f"{self.login_server_state} - {self.login_server_rtt_p50 * 1000:.0f} ms "
+            f"(p95 {self.login_server_rtt_p95 * 1000:.0f} ms), {self.login_server_loss:.0%} loss"
+        )
+
+    def login_server_warning(self):
+        """Return why launching EQ now is likely to time out, or None"""
+        if self.login_server_state == LOGIN_SERVER_DOWN:
+            return "The login server is not answering the proxy's probes."
+        if self.login_server_state == LOGIN_SERVER_SLOW:
+            return f"The login server is responding slowly ({self.get_login_server_health()})."
+        return None
+
+    def get_uptime(self):
+        """Return uptime in human-readable format"""
+        uptime_seconds = int(time.time() - self.start_time)
+        hours, remainder = divmod(uptime_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+
+        if hours > 0:
+            return f"{hours}h {minutes}m {seconds}s"
+        if minutes > 0:
+            return f"{minutes}m {seconds}s"
+        return f"{seconds}s"
+
+    def user_login(self, alias, account, method):
+        """Signal that a user has logged in.
+
+        alias:   what the user typed in the EQ login screen
+        account: the effective account name sent to the login server
+        method:  one of "sso", "local", "local_char", "proxy_only", "skip_sso", "passthrough"
+        """
+        self.notify_user_connected(alias, account, method)
+
+    def auth_error(self, username, detail):
+        """Signal that the server rejected a login attempt with a reason."""
+        self.notify_auth_error(username, detail)
+
+
+class LoggingProxyStats(ProxyStats):
+    """Stats sink for headless runs: reports events to the log."""
+
+    def notify_user_connected(self, alias, account, method):
+        logger.info("Login: %s -> %s (%s)", alias, account, method)
+
+    def notify_auth_error(self, username, detail):
+        logger.warning("Login rejected for %s: %s", username, detail)
+
+    def notify_login_server_state(self, state):
+        level = logging.INFO if state == LOGIN_SERVER_UP else logging.WARNING
+        logger.log(level, "Login server is %s", self.get_login_server_health())
+
+
+PROXY_STATS: ProxyStats = ProxyStats()
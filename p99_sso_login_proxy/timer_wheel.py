@@ -0,0 +1,95 @@
+"""Hashed timer wheel for coarse, frequently pushed-back deadlines.
+
+Idle timeouts are re-armed by every packet, so giving each session its own
+``loop.call_at`` handle would mean cancelling and re-creating a handle per
+datagram. The wheel instead keeps items in ``slots`` buckets of ``tick``
+seconds and wakes once per tick to fire the current bucket. Firing calls
+``on_expire(item)``, which looks at the item's real state and returns the
+seconds until its next deadline (to keep it) or ``None`` (to drop it), so
+activity only has to update a timestamp the item already keeps. A callback
+that raises is logged and its item dropped; the wheel keeps running.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from collections.abc import Callable, Hashable
+
+logger = logging.getLogger("timer_wheel")
+
+
+class TimerWheel:
+    """Coarse timers for many items on the running event loop."""
+
+    def __init__(self, on_expire: Callable[[Hashable], float | None], tick: float = 1.0, slots: int = 64):
+        self.tick = tick
+        self._on_expire = on_expire
+        # Each slot maps item -> absolute tick number it is due at; items due
+        # more than one revolution out wait in their slot until then.
+        self._slots: list[dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._where: dict[Hashable, int] = {}
+        self._current = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._handle: asyncio.TimerHandle | None = None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._where
+
+    def schedule(self, item: Hashable, delay: float) -> None:
+        """Fire *item* about *delay* seconds from now (rounded up to a tick)."""
+        loop = asyncio.get_running_loop()
+        if self._handle is None:
+            # Nothing is pending, so the wheel is stopped; restart it at now.
+            self._loop = loop
+            self._current = int(loop.time() / self.tick)
+            self._arm()
+        self.discard(item)
+        due = max(math.ceil((loop.time() + delay) / self.tick), self._current + 1)
+        slot = due % len(self._slots)
+        self._slots[slot][item] = due
+        self._where[item] = slot
+
+    def discard(self, item: Hashable) -> None:
+        slot = self._where.pop(item, None)
+        if slot is not None:
+            del self._slots[slot][item]
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for slot in self._slots:
+            slot.clear()
+        self._where.clear()
+
+    def _arm(self) -> None:
+        assert self._loop is not None
+        self._handle = self._loop.call_at((self._current + 1) * self.tick, self._advance)
+
+    def _advance(self) -> None:
+        assert self._loop is not None
+        # Catch up on every tick that passed (the loop may have been busy).
+        target = max(int(self._loop.time() / self.tick), self._current + 1)
+        while self._current < target:
+            self._current += 1
+            slot = self._slots[self._current % len(self._slots)]
+            for item in [item for item, due in slot.items() if due <= self._current]:
+                del slot[item]
+                del self._where[item]
+                try:
+                    delay = self._on_expire(item)
+                except Exception:
+                    logger.exception("Timer callback failed for %r; dropping it", item)
+                    continue
+                if delay is not None:
+                    self.schedule(item, delay)
+        # Stay asleep while nothing is tracked.
+        if self._where:
+            self._arm()
+        else:
+            self._handle = None
@@ -54,9 +54,12 @@ from PySide6.QtWidgets import (
 from p99_sso_login_proxy import (
     config,
     count_display,
+    credentials,
     eq_config,
     local_characters,
     log_handler,
+    routing,
+    stats,
     update_scheduler,
     updater,
     utils,
@@ -371,6 +374,7 @@ class ProxyUI(QMainWindow):
         self._list_filter_data: dict = {}
         self._ws_error_shown = False
         self.start_eq_func = None
+        self.prewarm_func = None
         self._adv_tab_click_times: list[float] = []
 
         assert PROXY_STATS is not None
@@ -639,6 +643,9 @@ class ProxyUI(QMainWindow):
         self.proxy_status_text = self._add_label_value_row(tab, status_layout, "EQ Config:", "Checking...")
         self.last_username_label = self._add_label_value_row(tab, status_layout, "Last Username:", "")
         self.uptime_value = self._add_label_value_row(tab, status_layout, "Uptime:", PROXY_STATS.get_uptime())
+        self.login_server_value = self._add_label_value_row(
+            tab, status_layout, "Login Server:", PROXY_STATS.get_login_server_health()
+        )
 
         stats_box = QGroupBox("Statistics")
         stats_layout = QFormLayout(stats_box)
@@ -1198,6 +1205,7 @@ class ProxyUI(QMainWindow):
         assert PROXY_STATS is not None
         self.address_value.setText(f"{PROXY_STATS.listening_address}:{PROXY_STATS.listening_port}")
         self.uptime_value.setText(PROXY_STATS.get_uptime())
+        self.login_server_value.setText(PROXY_STATS.get_login_server_health())
         self.total_value.setText(str(PROXY_STATS.total_connections))
         self.active_value.setText(str(PROXY_STATS.active_connections))
         self.completed_value.setText(str(PROXY_STATS.completed_connections))
@@ -1209,6 +1217,7 @@ class ProxyUI(QMainWindow):
         tooltip = (
             f"{config.APP_NAME}\n"
             f"Status: {PROXY_STATS.proxy_status}\n"
+            f"Login Server: {PROXY_STATS.login_server_state}\n"
             f"Connections: {PROXY_STATS.active_connections} active, "
             f"{PROXY_STATS.total_connections} total\n"
             f"Local Accounts: {len(config.LOCAL_ACCOUNTS)}\n"
@@ -1264,8 +1273,23 @@ class ProxyUI(QMainWindow):
             QMessageBox.critical(self, "Error", "EverQuest directory not found.")
             return
         eqgame_path = os.path.join(eq_dir, "eqgame.exe")
+        assert PROXY_STATS is not None
+        warning = PROXY_STATS.login_server_warning()
+        if warning:
+            reply = QMessageBox.question(
+                self,
+                "Login Server",
+                f"{warning}\n\nLaunch EverQuest anyway?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
         try:
             if os.path.exists(eqgame_path) and self.start_eq_func:
+                # Let the proxy get SSO and the login server ready while
+                # EverQuest loads.
+                if self.prewarm_func:
+                    self.prewarm_func()
                 self.start_eq_func(eq_dir)
             else:
                 QMessageBox.critical(self, "Error", f"EverQuest executable not found in {eq_dir}")
@@ -1477,6 +1501,8 @@ class ProxyUI(QMainWindow):
     def on_refresh_account_cache(self):
         self._ws_error_shown = False
         config.LOCAL_ACCOUNTS, config.LOCAL_ACCOUNT_NAME_MAP = utils.load_local_accounts(config.LOCAL_ACCOUNTS_FILE)
+        routing.invalidate()
+        credentials.prime()
         ws_client.request_reconnect()
         if hasattr(self, "ws_status_text"):
             self.ws_status_text.setText("Connecting...")
@@ -1567,6 +1593,8 @@ class ProxyUI(QMainWindow):
         config.LOCAL_ACCOUNT_NAME_MAP[account_name] = account_name
         for alias in aliases:
             config.LOCAL_ACCOUNT_NAME_MAP[alias] = account_name
+        routing.invalidate()
+        credentials.prime()
 
         if not utils.save_local_accounts(config.LOCAL_ACCOUNTS, config.LOCAL_ACCOUNTS_FILE):
             QMessageBox.critical(self, "Error", "Failed to save local accounts.")
@@ -1610,6 +1638,8 @@ class ProxyUI(QMainWindow):
         config.LOCAL_ACCOUNTS[account_name] = {"password": password, "aliases": aliases}
         for alias in aliases:
             config.LOCAL_ACCOUNT_NAME_MAP[alias] = account_name
+        routing.invalidate()
+        credentials.prime()
 
         if not utils.save_local_accounts(config.LOCAL_ACCOUNTS, config.LOCAL_ACCOUNTS_FILE):
             QMessageBox.critical(self, "Error", "Failed to save local accounts.")
@@ -1643,6 +1673,8 @@ class ProxyUI(QMainWindow):
             del config.LOCAL_ACCOUNT_NAME_MAP[account_name]
 
         del config.LOCAL_ACCOUNTS[account_name]
+        routing.invalidate()
+        credentials.prime()
 
         if not utils.save_local_accounts(config.LOCAL_ACCOUNTS, config.LOCAL_ACCOUNTS_FILE):
             QMessageBox.critical(self, "Error", "Failed to save local accounts.")
@@ -2083,6 +2115,8 @@ def start_ui():
     if app is None:
         raise RuntimeError("QApplication must be created before start_ui()")
     PROXY_STATS = proxy_stats.ProxyStats(parent=app)
+    # The proxy reports through the UI-agnostic sink; route it to the Qt one.
+    stats.PROXY_STATS = PROXY_STATS
 
     main_window = ProxyUI()
     main_window.show()
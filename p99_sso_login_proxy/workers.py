@@ -0,0 +1,207 @@
+"""Multi-process worker pool for the headless proxy.
+
+Each worker process binds the listen port with ``SO_REUSEPORT`` and runs
+its own :class:`server.LoginProxy`. The kernel picks a socket by hashing
+the datagram's address 4-tuple, so every datagram from one client lands on
+the same worker for as long as the pool is up, and that worker holds the
+client's whole session.
+
+The parent process binds nothing itself; it owns the single SSO WebSocket.
+Workers ask it for credentials and receive account-name cache updates over
+a socketpair carrying newline-delimited JSON messages:
+
+* worker -> parent: ``{"type": "login_auth", "id": N, "username": ...}``
+* parent -> worker: ``{"type": "login_auth_result", "id": N,
+  "real_user": ..., "encrypted_credentials": <base64>, "error": ...}``
+* parent -> worker: ``{"type": "cached_names", "names": [...]}``
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import contextlib
+import itertools
+import json
+import logging
+import multiprocessing
+import socket
+
+from p99_sso_login_proxy import config, routing, server, stats, ws_client
+from p99_sso_login_proxy.sso_cache import SSO_CREDENTIALS
+
+logger = logging.getLogger("workers")
+
+_LOG_FORMAT = "%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s"
+
+# Seconds to wait for workers to exit after their channel closes.
+_SHUTDOWN_GRACE = 5
+
+
+def supported() -> bool:
+    """Return True if this platform can share a UDP port between processes."""
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def _send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write(json.dumps(message).encode() + b"\n")
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+class AuthChannel:
+    """Worker end of the IPC channel; stands in for ``ws_client`` auth."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._closed = False
+
+    async def request_login_auth(self, username: str) -> tuple[str | None, bytes | None, str | None]:
+        """Same contract as :func:`ws_client.request_login_auth`."""
+        if self._closed:
+            return None, None, "Proxy parent process unavailable"
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            _send(self._writer, {"type": "login_auth", "id": request_id, "username": username})
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def serve(self) -> None:
+        """Apply messages from the parent until it closes the channel."""
+        try:
+            while line := await self._reader.readline():
+                message = json.loads(line)
+                if message["type"] == "login_auth_result":
+                    future = self._pending.get(message["id"])
+                    if future is None or future.done():
+                        continue
+                    enc_b64 = message.get("encrypted_credentials")
+                    future.set_result(
+                        (
+                            message.get("real_user"),
+                            base64.b64decode(enc_b64) if enc_b64 else None,
+                            message.get("error"),
+                        )
+                    )
+                elif message["type"] == "cached_names":
+                    config.ALL_CACHED_NAMES = message["names"]
+                    routing.invalidate()
+                    # Account changes only reach this process as a new name
+                    # list, so any of them may have moved a cached login.
+                    SSO_CREDENTIALS.clear()
+        finally:
+            self._closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_result((None, None, "Proxy parent process unavailable"))
+
+
+async def _run_worker(sock: socket.socket, index: int) -> None:
+    reader, writer = await asyncio.open_connection(sock=sock)
+    channel = AuthChannel(reader, writer)
+    # One worker probing the login server is enough; N would send N times the probes.
+    transport = await server.main(
+        reuse_port=True,
+        login_auth=channel.request_login_auth,
+        probe_login_server=index == 0,
+    )
+    try:
+        await channel.serve()
+    finally:
+        transport.close()
+        writer.close()
+
+
+def worker_main(sock: socket.socket, index: int) -> None:
+    """Entry point of worker process number *index*."""
+    logging.basicConfig(level=logging.INFO, format=_LOG_FORMAT)
+    stats.PROXY_STATS = stats.LoggingProxyStats()
+    loop = server.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        with contextlib.suppress(KeyboardInterrupt):
+            loop.run_until_complete(_run_worker(sock, index))
+    finally:
+        loop.close()
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+async def _answer_login_auth(writer: asyncio.StreamWriter, message: dict) -> None:
+    real_user, encrypted, error = await ws_client.request_login_auth(message["username"])
+    _send(
+        writer,
+        {
+            "type": "login_auth_result",
+            "id": message["id"],
+            "real_user": real_user,
+            "encrypted_credentials": base64.b64encode(encrypted).decode() if encrypted else None,
+            "error": error,
+        },
+    )
+
+
+async def serve_worker(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer one worker's credential requests until its channel closes."""
+    requests: set[asyncio.Task] = set()
+    _send(writer, {"type": "cached_names", "names": list(config.ALL_CACHED_NAMES)})
+    while line := await reader.readline():
+        message = json.loads(line)
+        if message["type"] == "login_auth":
+            # Answer concurrently; one slow lookup must not hold up the rest.
+            task = asyncio.create_task(_answer_login_auth(writer, message))
+            requests.add(task)
+            task.add_done_callback(requests.discard)
+
+
+async def run_pool(count: int, stop: asyncio.Event) -> None:
+    """Run *count* proxy workers plus the shared WebSocket until *stop*."""
+    ctx = multiprocessing.get_context("spawn")
+    writers: list[asyncio.StreamWriter] = []
+    processes = []
+    serving: list[asyncio.Task] = []
+
+    def _broadcast_names():
+        names = list(config.ALL_CACHED_NAMES)
+        for writer in writers:
+            if not writer.is_closing():
+                _send(writer, {"type": "cached_names", "names": names})
+
+    ws_client.ON_CACHE_UPDATED.append(_broadcast_names)
+    ws_task = asyncio.create_task(ws_client.start())
+    try:
+        for index in range(count):
+            parent_sock, child_sock = socket.socketpair()
+            process = ctx.Process(
+                target=worker_main, args=(child_sock, index), name=f"proxy-worker-{index}", daemon=True
+            )
+            process.start()
+            child_sock.close()
+            reader, writer = await asyncio.open_connection(sock=parent_sock)
+            writers.append(writer)
+            processes.append(process)
+            serving.append(asyncio.create_task(serve_worker(reader, writer)))
+        logger.info("Started %d proxy workers on %s:%s", count, config.LISTEN_HOST, config.LISTEN_PORT)
+        await stop.wait()
+    finally:
+        ws_client.ON_CACHE_UPDATED.remove(_broadcast_names)
+        # Closing a channel tells its worker to shut down.
+        for writer in writers:
+            writer.close()
+        for process in processes:
+            await asyncio.to_thread(process.join, _SHUTDOWN_GRACE)
+            if process.is_alive():
+                logger.warning("Worker %s did not exit; terminating", process.name)
+                process.terminate()
+        for task in (*serving, ws_task):
+            task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.gather(*serving, ws_task, return_exceptions=True)
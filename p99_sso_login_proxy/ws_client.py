@@ -1,5 +1,7 @@
 """WebSocket client for real-time account data from the SSO API."""
 
+from __future__ import annotations
+
 import asyncio
 import base64
 import contextlib
@@ -7,20 +9,27 @@ import json
 import logging
 import ssl
 import uuid
+from collections.abc import Callable
 
 import certifi
 import websockets
-from PySide6.QtCore import QObject, Signal
-from PySide6.QtWidgets import QApplication
 
-from p99_sso_login_proxy import __version__, config, eq_config, utils
+try:
+    from PySide6.QtCore import QObject, Signal
+    from PySide6.QtWidgets import QApplication
+except ImportError:  # headless installs run without Qt; UI signals are skipped
+    QObject = None
+
+from p99_sso_login_proxy import __version__, config, eq_config, routing, utils
+from p99_sso_login_proxy.sso_cache import SSO_CREDENTIALS
 
+if QObject is not None:
 
-class WsClientSignals(QObject):
-    """Marshals WebSocket-driven UI refresh to the Qt main thread."""
+    class WsClientSignals(QObject):
+        """Marshals WebSocket-driven UI refresh to the Qt main thread."""
 
-    cache_updated = Signal()
-    rustle_ui_warning = Signal(str)  # message body
+        cache_updated = Signal()
+        rustle_ui_warning = Signal(str)  # message body
 
 
 _ws_signals: WsClientSignals | None = None
@@ -30,6 +39,8 @@ def get_ws_signals() -> WsClientSignals | None:
     """Return the shared WsClientSignals object (after QApplication exists)."""
     global _ws_signals
     if _ws_signals is None:
+        if QObject is None:
+            return None
         app = QApplication.instance()
         if app is None:
             return None
@@ -44,9 +55,18 @@ _task: asyncio.Task | None = None
 _connected = False
 _auth_failed_detail: str | None = None
 _pending_auth: dict[str, asyncio.Future] = {}
+# Optional protocol features the backend listed in its full_state.
+_server_features: frozenset[str] = frozenset()
+# login_auth requests waiting to go out together as one login_auth_batch.
+_auth_batch: list[dict[str, str]] = []
+_auth_batch_handle: asyncio.TimerHandle | None = None
+_auth_batch_sends: set[asyncio.Task] = set()
 # character_name.lower() -> last sent update_location payload fields (excl. type)
 _last_sent_location: dict[str, dict[str, object]] = {}
 
+# Callbacks invoked (on the event loop) whenever the account cache changes.
+ON_CACHE_UPDATED: list[Callable[[], None]] = []
+
 RECONNECT_MIN = 1
 RECONNECT_MAX = 60
 
@@ -186,15 +206,18 @@ async def request_login_auth(
     _pending_auth[request_id] = future
 
     try:
-        await _ws.send(
-            json.dumps(
-                {
-                    "type": "login_auth",
-                    "request_id": request_id,
-                    "username": username,
-                }
+        if _batching_login_auth():
+            _queue_login_auth({"request_id": request_id, "username": username})
+        else:
+            await _ws.send(
+                json.dumps(
+                    {
+                        "type": "login_auth",
+                        "request_id": request_id,
+                        "username": username,
+                    }
+                )
             )
-        )
         result = await asyncio.wait_for(future, timeout=config.SSO_TIMEOUT)
         return result
     except TimeoutError:
@@ -207,6 +230,55 @@ async def request_login_auth(
         _pending_auth.pop(request_id, None)
 
 
+def _batching_login_auth() -> bool:
+    return config.SSO_BATCH_WINDOW_MS > 0 and "login_auth_batch" in _server_features
+
+
+def _queue_login_auth(request: dict[str, str]) -> None:
+    """Hold *request* briefly so logins made together share one message."""
+    global _auth_batch_handle
+    _auth_batch.append(request)
+    if _auth_batch_handle is None:
+        _auth_batch_handle = asyncio.get_running_loop().call_later(
+            config.SSO_BATCH_WINDOW_MS / 1000, _start_login_auth_batch
+        )
+
+
+def _start_login_auth_batch() -> None:
+    global _auth_batch, _auth_batch_handle
+    batch, _auth_batch = _auth_batch, []
+    _auth_batch_handle = None
+    task = asyncio.ensure_future(_send_login_auth_batch(batch))
+    _auth_batch_sends.add(task)
+    task.add_done_callback(_auth_batch_sends.discard)
+
+
+async def _send_login_auth_batch(batch: list[dict[str, str]]) -> None:
+    # A lone request goes out in the plain form.
+    message = {"type": "login_auth_batch", "requests": batch} if len(batch) > 1 else {"type": "login_auth", **batch[0]}
+    try:
+        if _ws is None:
+            raise ConnectionError("WebSocket not connected")
+        await _ws.send(json.dumps(message))
+    except Exception:
+        logger.debug("login_auth batch of %d failed to send", len(batch), exc_info=True)
+        for request in batch:
+            future = _pending_auth.get(request["request_id"])
+            if future is not None and not future.done():
+                future.set_result((None, None, "Login auth request failed"))
+    else:
+        logger.debug("Sent %d login_auth request(s) in one message", len(batch))
+
+
+def _drop_login_auth_batch() -> None:
+    """Forget queued requests (their futures are cancelled separately)."""
+    global _auth_batch_handle
+    if _auth_batch_handle is not None:
+        _auth_batch_handle.cancel()
+        _auth_batch_handle = None
+    _auth_batch.clear()
+
+
 def _resolve_login_auth_response(msg: dict):
     """Resolve a pending login_auth future from a server response."""
     request_id = msg.get("request_id")
@@ -290,6 +362,7 @@ def _apply_full_state(data: dict):
     dynamic_tag_zones = data.get("dynamic_tag_zones", [])
     dynamic_tag_classes = data.get("dynamic_tag_classes", [])
 
+    SSO_CREDENTIALS.clear()
     _rebuild_cache(account_tree, dynamic_tag_zones, dynamic_tag_classes)
 
 
@@ -299,6 +372,8 @@ def _apply_delta(data: dict):
     for change in data.get("changes", []):
         action = change.get("action")
         account = change.get("account")
+        if account:
+            SSO_CREDENTIALS.invalidate_account(account)
 
         if action == "add":
             tree[account] = change.get("data", {})
@@ -359,6 +434,7 @@ def _rebuild_cache(account_tree: dict, dynamic_tag_zones=None, dynamic_tag_class
     config.CHARACTERS_CACHED = characters
     config.ACCOUNTS_CACHE_REAL_COUNT = len(account_tree)
     config.ACCOUNTS_CACHE_TIMESTAMP = datetime.datetime.now()
+    routing.invalidate()
 
     _notify_ui()
 
@@ -371,15 +447,22 @@ def _notify_ui():
             sig.cache_updated.emit()
     except Exception:
         pass
+    for cb in list(ON_CACHE_UPDATED):
+        try:
+            cb()
+        except Exception:
+            logger.exception("Error in ws_client ON_CACHE_UPDATED callback")
 
 
 async def _run(reconnect_requested: asyncio.Event):
     """Main WebSocket loop with auto-reconnect."""
-    global _ws, _connected, _auth_failed_detail
+    global _ws, _connected, _auth_failed_detail, _server_features, _wake_event
     delay = RECONNECT_MIN
+    _wake_event = asyncio.Event()
 
     while True:
         reconnect_requested.clear()
+        _wake_event.clear()
         _auth_failed_detail = None
 
         if not config.USER_API_TOKEN or not config.SSO_API:
@@ -454,6 +537,7 @@ async def _run(reconnect_requested: asyncio.Event):
                             msg.get("count", 0),
                         )
                         _connected = True
+                        _server_features = frozenset(msg.get("features", []))
                         _notify_ui()
                         delay = RECONNECT_MIN
                         _apply_full_state(msg)
@@ -475,6 +559,10 @@ async def _run(reconnect_requested: asyncio.Event):
                     elif msg_type == "login_auth_response":
                         _resolve_login_auth_response(msg)
 
+                    elif msg_type == "login_auth_batch_response":
+                        for response in msg.get("responses", []):
+                            _resolve_login_auth_response(response)
+
                     elif msg_type == "ping":
                         await ws.send(json.dumps({"type": "pong"}))
 
@@ -498,6 +586,8 @@ async def _run(reconnect_requested: asyncio.Event):
         finally:
             _ws = None
             _connected = False
+            _server_features = frozenset()
+            _drop_login_auth_batch()
             _cancel_pending_auth()
             _last_sent_location.clear()
             _rebuild_cache({}, [], [])
@@ -510,11 +600,23 @@ async def _run(reconnect_requested: asyncio.Event):
             delay = RECONNECT_MIN
             continue
 
-        await asyncio.sleep(delay)
-        delay = min(delay * 2, RECONNECT_MAX)
+        # asyncio.wait returns at the timeout instead of raising, which
+        # keeps this independent of how TimeoutError is spelled on 3.10.
+        wake = asyncio.ensure_future(_wake_event.wait())
+        try:
+            await asyncio.wait({wake}, timeout=delay)
+        finally:
+            wake.cancel()
+        if _wake_event.is_set():
+            logger.info("Reconnecting now for an upcoming login")
+            delay = RECONNECT_MIN
+        else:
+            delay = min(delay * 2, RECONNECT_MAX)
 
 
 _reconnect_event: asyncio.Event | None = None
+# Set by prewarm() to cut a reconnect backoff short.
+_wake_event: asyncio.Event | None = None
 
 
 def request_reconnect():
@@ -523,6 +625,22 @@ def request_reconnect():
         _reconnect_event.set()
 
 
+def prewarm():
+    """Get the WebSocket connected now if it is down (a login is coming).
+
+    Skips the rest of a reconnect backoff, or retries a token the server
+    refused. An open or opening connection is left alone. Call on the
+    WebSocket's event loop.
+    """
+    if _connected or _reconnect_event is None:
+        return
+    if _auth_failed_detail is not None:
+        logger.info("Retrying SSO authentication ahead of a login")
+        _reconnect_event.set()
+    elif _wake_event is not None:
+        _wake_event.set()
+
+
 async def start():
     """Start the WebSocket client task on the current event loop."""
     global _task, _reconnect_event
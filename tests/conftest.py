@@ -4,13 +4,22 @@ The autouse ``_reset_local_characters_state`` fixture isolates tests that touch
 ``p99_sso_login_proxy.local_characters`` so one test can't leak module-level
 globals (the pending-login slot, the LOCAL_CHARACTERS dict, the debounce timer,
 or the AUTO_ADD flag) into the next.
+
+The ``proxy`` / ``make_proxy`` fixtures and the packet builders below serve the
+``LoginProxy`` tests; import the builders with ``from conftest import ...``.
 """
 
 from __future__ import annotations
 
+import struct
+import time
+from unittest import mock
+
 import pytest
 
-from p99_sso_login_proxy import config, local_characters
+from p99_sso_login_proxy import config, local_characters, routing
+from p99_sso_login_proxy import login_protocol as lp
+from p99_sso_login_proxy import soe_protocol as soe
 
 
 @pytest.fixture(autouse=True)
@@ -37,6 +46,7 @@ def _reset_local_characters_state(tmp_path, monkeypatch):
     config.LOCAL_CHARACTER_NAMES.clear()
     local_characters._pending_local_account = None
     local_characters.ON_UPDATED.clear()
+    routing.invalidate()
 
     monkeypatch.setattr(config, "LOCAL_CHARACTERS_FILE", str(tmp_path / "local_characters.csv"))
 
@@ -59,3 +69,91 @@ def _reset_local_characters_state(tmp_path, monkeypatch):
     config.AUTO_ADD_LOCAL_CHARACTERS = saved["AUTO_ADD"]
     local_characters._pending_local_account = saved["pending"]
     local_characters.ON_UPDATED[:] = saved["on_updated"]
+    routing.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def _numeric_login_server(monkeypatch):
+    """Point the proxy at a numeric login server.
+
+    Nothing is sent to an unresolved hostname, and most tests drive the
+    proxy without an event loop to look one up.
+    """
+    monkeypatch.setattr(config, "EQEMU_ADDR", ("127.0.0.1", 5998))
+
+
+# ---------------------------------------------------------------------------
+# LoginProxy fixtures and packet builders
+# ---------------------------------------------------------------------------
+def session_request() -> bytearray:
+    """A client SessionRequest asking for a 512-byte max packet."""
+    return bytearray(struct.pack(">HII", soe.TransportOp.SessionRequest, 2, 0x1234) + struct.pack(">I", 512))
+
+
+def session_response(key: int = 0, crc_bytes: int = 2) -> bytes:
+    """The login server's SessionResponse with CRC *key* and no compression."""
+    return (
+        struct.pack(">HII", soe.TransportOp.SessionResponse, 1, key) + bytes([crc_bytes, 0, 0]) + struct.pack("<I", 512)
+    )
+
+
+def login_combined(username: str, password: str = "typed", seq: int = 1) -> bytearray:
+    """Combined[Ack(0), Packet(seq, Login)] as the client sends it, without a CRC."""
+    app_payload = struct.pack("<H", lp.AppOp.Login) + struct.pack("<iBbI", 3, 0, 2, 0)
+    packet_sub = struct.pack(">HH", soe.TransportOp.Packet, seq) + app_payload
+    packet_sub += lp.encrypt_login_credentials(username, password, config.ENCRYPTION_KEY, config.iv())
+    ack_sub = struct.pack(">HH", soe.TransportOp.Ack, 0)
+    body = bytes([len(ack_sub)]) + ack_sub + bytes([len(packet_sub)]) + packet_sub
+    return bytearray(struct.pack(">H", soe.TransportOp.Combined) + body)
+
+
+def add_client(proxy, addr: tuple[str, int]):
+    """Register the client at *addr* with *proxy*, as its first datagram would."""
+    return proxy._client_for(addr, time.time())
+
+
+def connect(proxy, addr: tuple[str, int], key: int = 0) -> None:
+    """Run a SOE session handshake for the client at *addr*."""
+    proxy.handle_client_packet(session_request(), addr)
+    proxy.handle_server_packet(session_response(key))
+
+
+@pytest.fixture
+def proxy_stats():
+    """Replace ``stats.PROXY_STATS`` with a mock for the test."""
+    with mock.patch("p99_sso_login_proxy.stats.PROXY_STATS", new=mock.MagicMock()) as stub:
+        yield stub
+
+
+@pytest.fixture
+def make_proxy(proxy_stats):
+    """Factory for ``LoginProxy`` instances with a mock transport."""
+    from p99_sso_login_proxy import server as server_mod
+
+    def _make(**kwargs):
+        proxy = server_mod.LoginProxy(**kwargs)
+        proxy.transport = mock.MagicMock()
+        return proxy
+
+    return _make
+
+
+@pytest.fixture
+def proxy(make_proxy):
+    return make_proxy()
+
+
+# ---------------------------------------------------------------------------
+# ws_client fixtures
+# ---------------------------------------------------------------------------
+@pytest.fixture
+def ws_state(monkeypatch):
+    """Let ``ws_client`` run against a stand-in SSO server, undoing its config writes."""
+    from p99_sso_login_proxy import ws_client
+
+    monkeypatch.setattr(config, "USER_API_TOKEN", "token")
+    monkeypatch.setattr(config, "WARN_RUSTLE", False)
+    for name in ("ACCOUNTS_CACHED", "ALL_CACHED_NAMES", "CHARACTERS_CACHED", "ACCOUNTS_CACHE_REAL_COUNT"):
+        monkeypatch.setattr(config, name, getattr(config, name))
+    monkeypatch.setattr(config, "ACCOUNTS_CACHE_TIMESTAMP", config.ACCOUNTS_CACHE_TIMESTAMP)
+    monkeypatch.setattr(ws_client.eq_config, "get_client_settings", dict)
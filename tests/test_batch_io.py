@@ -0,0 +1,150 @@
+"""Tests for the batched datagram transport."""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+from unittest import mock
+
+import pytest
+from conftest import session_request, session_response
+
+from p99_sso_login_proxy import batch_io, config
+from p99_sso_login_proxy import soe_protocol as soe
+
+pytestmark = pytest.mark.skipif(not batch_io.supported(), reason="batched transport is Linux-only")
+
+
+class _Recorder(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.received: list[tuple[bytes, tuple[str, int]]] = []
+        self.types: set[type] = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.types.add(type(data))
+        self.received.append((bytes(data), addr))
+
+
+def _peer() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(1)
+    return sock
+
+
+def test_burst_is_drained_in_one_readiness_event():
+    async def _run():
+        loop = asyncio.get_running_loop()
+        transport, proto = await batch_io.create_datagram_endpoint(loop, _Recorder, local_addr=("127.0.0.1", 0))
+        await asyncio.sleep(0)
+        addr = transport.get_extra_info("sockname")
+        peer = _peer()
+        for i in range(10):
+            peer.sendto(bytes([i]) * (i + 1), addr)
+        with (
+            mock.patch.object(transport, "_read_ready", wraps=transport._read_ready) as read_ready,
+            mock.patch.object(batch_io, "_recvmmsg", wraps=batch_io._recvmmsg) as recvmmsg,
+        ):
+            loop.remove_reader(transport.get_extra_info("socket").fileno())
+            loop.add_reader(transport.get_extra_info("socket").fileno(), read_ready)
+            await asyncio.sleep(0.05)
+        transport.close()
+        peer_addr = peer.getsockname()
+        peer.close()
+        return proto, read_ready.call_count, recvmmsg.call_count, peer_addr
+
+    proto, calls, syscalls, peer_addr = asyncio.run(_run())
+    assert [data for data, _ in proto.received] == [bytes([i]) * (i + 1) for i in range(10)]
+    assert {addr for _, addr in proto.received} == {peer_addr}
+    assert proto.types == {memoryview}
+    assert calls == 1
+    assert syscalls == 1
+
+
+def test_sends_are_flushed_together_at_end_of_tick():
+    async def _run():
+        loop = asyncio.get_running_loop()
+        transport, _ = await batch_io.create_datagram_endpoint(loop, _Recorder, local_addr=("127.0.0.1", 0))
+        peer = _peer()
+        peer.setblocking(False)
+        target = peer.getsockname()
+        with mock.patch.object(batch_io, "_sendmmsg", wraps=batch_io._sendmmsg) as sendmmsg:
+            for i in range(3):
+                transport.sendto(bytearray([i]), target)
+            with pytest.raises(BlockingIOError):
+                peer.recv(16)
+            await asyncio.sleep(0.01)
+        got = [peer.recv(16) for _ in range(3)]
+        transport.close()
+        peer.close()
+        return got, sendmmsg.call_count
+
+    assert asyncio.run(_run()) == ([b"\x00", b"\x01", b"\x02"], 1)
+
+
+def test_unusable_address_drops_only_that_datagram():
+    async def _run():
+        loop = asyncio.get_running_loop()
+        transport, proto = await batch_io.create_datagram_endpoint(loop, _Recorder, local_addr=("127.0.0.1", 0))
+        proto.error_received = mock.MagicMock()
+        peer = _peer()
+        transport.sendto(b"before", peer.getsockname())
+        transport.sendto(b"lost", ("login.example.com", 5998))
+        transport.sendto(b"after", peer.getsockname())
+        await asyncio.sleep(0.01)
+        got = [peer.recv(16) for _ in range(2)]
+        transport.close()
+        peer.close()
+        return got, proto.error_received.call_count
+
+    assert asyncio.run(_run()) == ([b"before", b"after"], 1)
+
+
+@pytest.mark.parametrize(
+    "addr",
+    [("203.0.113.7", 5998), ("2001:db8::1", 5998, 0, 0)],
+)
+def test_sockaddrs_round_trip(addr):
+    assert batch_io._decode_sockaddr(batch_io._encode_sockaddr(addr)) == addr
+
+
+def test_proxy_runs_on_batched_transport(monkeypatch, proxy_stats):
+    monkeypatch.setattr(config, "BATCHED_DATAGRAM_IO", True)
+    monkeypatch.setattr(config, "LOGIN_PROBE_INTERVAL", 0)
+
+    async def _run():
+        login = _peer()
+        login.setblocking(False)
+        monkeypatch.setattr(config, "EQEMU_ADDR", login.getsockname())
+        monkeypatch.setattr(config, "LISTEN_HOST", "127.0.0.1")
+        monkeypatch.setattr(config, "LISTEN_PORT", 0)
+        from p99_sso_login_proxy import server as server_mod
+
+        proxy_transport = await server_mod.main()
+        await asyncio.sleep(0)
+        proxy = proxy_transport._protocol
+        client = _peer()
+        client.setblocking(False)
+        request = bytes(session_request())
+        client.sendto(request, proxy_transport.get_extra_info("sockname"))
+
+        loop = asyncio.get_running_loop()
+        data, upstream_addr = await asyncio.wait_for(loop.sock_recvfrom(login, 64), timeout=1)
+        assert data == request
+        login.sendto(session_response(0xBEEF), upstream_addr)
+        response = await asyncio.wait_for(loop.sock_recv(client, 64), timeout=1)
+
+        (session,) = proxy.clients.values()
+        assert isinstance(session.upstream, batch_io.BatchDatagramTransport)
+        session.close()
+        proxy_transport.close()
+        client.close()
+        login.close()
+        return proxy_transport, response
+
+    transport, response = asyncio.run(_run())
+    assert isinstance(transport, batch_io.BatchDatagramTransport)
+    assert soe.parse_session_response(response)["encode_key"] == 0xBEEF
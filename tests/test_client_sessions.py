@@ -0,0 +1,185 @@
+"""Tests for the per-client session table in ``LoginProxy``."""
+
+from __future__ import annotations
+
+import struct
+from unittest import mock
+
+from conftest import connect, session_request, session_response
+
+from p99_sso_login_proxy import config
+from p99_sso_login_proxy import soe_protocol as soe
+
+CLIENT_A = ("127.0.0.1", 4001)
+CLIENT_B = ("127.0.0.1", 4002)
+
+
+def test_each_client_keeps_its_own_crc_and_sequences(proxy):
+    connect(proxy, CLIENT_A, 0x11111111)
+    connect(proxy, CLIENT_B, 0x22222222)
+    assert set(proxy.clients) == {CLIENT_A, CLIENT_B}
+    assert proxy.clients[CLIENT_A].crc.key == 0x11111111
+    assert proxy.clients[CLIENT_B].crc.key == 0x22222222
+    proxy.transport.reset_mock()
+
+    packet = struct.pack(">HH", soe.TransportOp.Packet, 0) + b"\x04\x00hello"
+    proxy.handle_client_packet(bytearray(soe.append_crc(packet, 0x11111111, 2)), CLIENT_A)
+
+    assert proxy.corrupt_packets == 0, "A's packet verifies against A's key even though B connected last"
+    sent = proxy.transport.sendto.call_args_list
+    assert sent[-1].args == (soe.append_crc(packet, 0x11111111, 2), config.EQEMU_ADDR)
+    assert proxy.clients[CLIENT_A].session.client_window.get(0) is not None
+    assert len(proxy.clients[CLIENT_B].session.client_window) == 0
+
+
+def test_server_replies_go_to_the_client_that_last_sent_upstream(proxy):
+    connect(proxy, CLIENT_A, 0)
+    connect(proxy, CLIENT_B, 0)
+    proxy.handle_client_packet(bytearray(soe.append_crc(soe.build_ack(0), 0, 2)), CLIENT_A)
+    proxy.transport.reset_mock()
+
+    proxy.handle_server_packet(soe.append_crc(soe.build_ack(0), 0, 2))
+
+    assert proxy.transport.sendto.call_args.args[1] == CLIENT_A
+
+
+def test_server_packets_before_any_client_are_dropped(proxy):
+    proxy.handle_server_packet(session_response())
+
+    assert proxy.clients == {}
+    assert proxy.transport.sendto.call_count == 0
+
+
+def test_idle_clients_are_retired_on_schedule(monkeypatch):
+    import asyncio
+
+    from p99_sso_login_proxy import server as server_mod
+    from p99_sso_login_proxy import stats
+
+    monkeypatch.setattr(server_mod, "CLIENT_IDLE_TIMEOUT", 0.2)
+    monkeypatch.setattr(config, "EQEMU_ADDR", ("127.0.0.1", 9))
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    proxy_stats = stats.ProxyStats()
+    monkeypatch.setattr(stats, "PROXY_STATS", proxy_stats)
+
+    async def _run():
+        proxy = server_mod.LoginProxy()
+        proxy.transport = mock.MagicMock()
+        proxy._idle_wheel.tick = 0.05
+        connect(proxy, CLIENT_A, 0)
+        connect(proxy, CLIENT_B, 0)
+        client_a = proxy.clients[CLIENT_A]
+        assert proxy_stats.active_connections == 2
+        # Only B keeps talking.
+        for _ in range(8):
+            await asyncio.sleep(0.05)
+            proxy.handle_client_packet(bytearray(soe.append_crc(soe.build_keepalive(), 0, 2)), CLIENT_B)
+        return proxy, client_a
+
+    proxy, client_a = asyncio.run(_run())
+    assert list(proxy.clients) == [CLIENT_B]
+    assert client_a.closed
+    assert proxy_stats.active_connections == 1
+    assert proxy_stats.completed_connections == 1
+
+
+def test_repeated_session_requests_count_one_connection(proxy):
+    from p99_sso_login_proxy import stats
+
+    proxy_stats = stats.ProxyStats()
+    with mock.patch.object(stats, "PROXY_STATS", proxy_stats):
+        proxy.handle_client_packet(session_request(), CLIENT_A)
+        proxy.handle_client_packet(session_request(), CLIENT_A)
+        proxy.handle_server_packet(session_response(0))
+        proxy.handle_client_packet(bytearray(soe.append_crc(soe.build_disconnect(), 0, 2)), CLIENT_A)
+    assert proxy_stats.total_connections == 1
+    assert proxy_stats.active_connections == 0
+
+
+def test_each_client_gets_its_own_upstream_socket(monkeypatch, proxy_stats):
+    import asyncio
+
+    class _Recorder(asyncio.DatagramProtocol):
+        def __init__(self, on_datagram=None):
+            self.received: list[tuple[bytes, tuple[str, int]]] = []
+            self.on_datagram = on_datagram
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.received.append((data, addr))
+            if self.on_datagram:
+                self.on_datagram(self.transport, data, addr)
+
+    def _login_server_reply(transport, data, addr):
+        # Key each session by the source port the login server sees.
+        transport.sendto(session_response(addr[1]), addr)
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        login_transport, login_server = await loop.create_datagram_endpoint(
+            lambda: _Recorder(_login_server_reply), local_addr=("127.0.0.1", 0)
+        )
+        monkeypatch.setattr(config, "EQEMU_ADDR", login_transport.get_extra_info("sockname"))
+        monkeypatch.setattr(config, "LOGIN_PROBE_INTERVAL", 0)
+        from p99_sso_login_proxy import server as server_mod
+
+        proxy_transport, proxy = await loop.create_datagram_endpoint(server_mod.LoginProxy, local_addr=("127.0.0.1", 0))
+        proxy_addr = proxy_transport.get_extra_info("sockname")
+        clients = [await loop.create_datagram_endpoint(_Recorder, local_addr=("127.0.0.1", 0)) for _ in range(2)]
+        for transport, _ in clients:
+            transport.sendto(bytes(session_request()), proxy_addr)
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if all(proto.received for _, proto in clients):
+                break
+
+        upstream_ports = {addr[1] for _, addr in login_server.received}
+        assert len(upstream_ports) == 2, "each client reaches the login server from its own socket"
+        assert proxy_addr[1] not in upstream_ports
+        for transport, proto in clients:
+            client_addr = transport.get_extra_info("sockname")
+            ((response, _),) = proto.received
+            key = soe.parse_session_response(response)["encode_key"]
+            assert proxy.clients[client_addr].crc.key == key
+            assert proxy.clients[client_addr].upstream.get_extra_info("sockname")[1] == key
+
+        for transport, _ in clients:
+            transport.close()
+        proxy_transport.close()
+        await asyncio.sleep(0)
+        assert all(client.closed and client.upstream is None for client in proxy.clients.values()), (
+            "closing the listen socket closes every client's upstream socket"
+        )
+        login_transport.close()
+
+    asyncio.run(_run())
+
+
+def test_workers_never_fall_back_to_the_shared_socket(monkeypatch, make_proxy):
+    import asyncio
+
+    from p99_sso_login_proxy import server as server_mod
+
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    opened = []
+
+    async def _refuse(protocol_factory, **kwargs):
+        opened.append(kwargs["remote_addr"])
+        raise OSError("no more sockets")
+
+    monkeypatch.setattr(server_mod, "_create_datagram_endpoint", _refuse)
+
+    async def _run():
+        proxy = make_proxy(reuse_port=True)
+        proxy.handle_client_packet(session_request(), CLIENT_A)
+        client = proxy.clients[CLIENT_A]
+        await client.upstream_task
+        return proxy, client
+
+    proxy, client = asyncio.run(_run())
+    assert opened == [config.EQEMU_ADDR], "per_client_upstream is forced on under SO_REUSEPORT"
+    assert proxy.clients == {}
+    assert client.closed
+    assert proxy.transport.sendto.call_count == 0, "nothing goes out on the shared listen socket"
@@ -0,0 +1,44 @@
+"""Tests for the pre-encrypted local account credential store."""
+
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from conftest import login_combined
+
+from p99_sso_login_proxy import config, credentials, local_characters, routing
+from p99_sso_login_proxy import login_protocol as lp
+
+
+@pytest.fixture(autouse=True)
+def _accounts(monkeypatch):
+    monkeypatch.setattr(config, "PROXY_ONLY", False)
+    monkeypatch.setattr(config, "LOCAL_ACCOUNTS", {"bankacct": {"password": "hunter2", "aliases": ["bank"]}})
+    monkeypatch.setattr(config, "LOCAL_ACCOUNT_NAME_MAP", {"bankacct": "bankacct", "bank": "bankacct"})
+    monkeypatch.setattr(credentials, "_cache", {})
+    routing.invalidate()
+
+
+def test_prime_encrypts_each_account_once_and_drops_stale_entries():
+    credentials.prime()
+    enc = credentials.encrypted("bankacct")
+    assert enc == lp.encrypt_login_credentials("bankacct", "hunter2", config.ENCRYPTION_KEY, config.iv())
+
+    config.LOCAL_ACCOUNTS["bankacct"]["password"] = "correcthorse"
+    assert credentials.encrypted("bankacct") != enc, "a changed password never hits the old ciphertext"
+    credentials.prime()
+    assert len(credentials._cache) == 1
+
+
+@pytest.mark.parametrize(("login_name", "method"), [("bank", "local"), ("bankchar", "local_char")])
+def test_local_rewrite_runs_no_crypto(proxy, login_name, method):
+    local_characters.set_entry({"name": "Bankchar", "account": "bankacct"})
+    credentials.prime()
+    login = lp.LoginPacket.parse(login_combined(login_name, "whatever"), config.ENCRYPTION_KEY, config.iv())
+    with mock.patch.object(lp.DES, "new", side_effect=AssertionError("DES at login time")):
+        rewritten, got = proxy._try_sync_rewrite(login.buf, login)
+    assert got == method
+    assert lp.LoginPacket.parse(rewritten, config.ENCRYPTION_KEY, config.iv()).password == "hunter2", (
+        "the spliced ciphertext carries the local account's password"
+    )
@@ -0,0 +1,66 @@
+"""Tests for the headless (Qt-free) proxy entry point."""
+
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import sys
+import types
+
+from p99_sso_login_proxy import config, headless, ws_client
+
+
+def test_headless_modules_import_without_pyside6():
+    code = "import sys; sys.modules['PySide6'] = None; import p99_sso_login_proxy.headless"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+
+def test_headless_run_serves_until_stopped(monkeypatch):
+    monkeypatch.setattr(config, "LISTEN_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "LISTEN_PORT", 0)
+    ws_started = []
+
+    async def _fake_ws_start():
+        ws_started.append(True)
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(ws_client, "start", _fake_ws_start)
+
+    async def _run():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.05, stop.set)
+        await headless.run(stop)
+
+    asyncio.run(asyncio.wait_for(_run(), timeout=5))
+    assert ws_started == [True]
+
+
+def test_new_event_loop_uses_uvloop_when_enabled(monkeypatch):
+    from p99_sso_login_proxy import server
+
+    created = []
+
+    def _fake_new_event_loop():
+        loop = asyncio.new_event_loop()
+        created.append(loop)
+        return loop
+
+    monkeypatch.setattr(config, "USE_UVLOOP", True)
+    monkeypatch.setattr(server.sys, "platform", "linux")
+    monkeypatch.setitem(sys.modules, "uvloop", types.SimpleNamespace(new_event_loop=_fake_new_event_loop))
+    loop = server.new_event_loop()
+    loop.close()
+    assert created == [loop]
+
+
+def test_new_event_loop_falls_back_without_uvloop(monkeypatch, caplog):
+    from p99_sso_login_proxy import server
+
+    monkeypatch.setattr(config, "USE_UVLOOP", True)
+    monkeypatch.setattr(server.sys, "platform", "linux")
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    loop = server.new_event_loop()
+    loop.close()
+    assert isinstance(loop, asyncio.BaseEventLoop)
+    assert "uvloop is not installed" in caplog.text
@@ -0,0 +1,148 @@
+"""Tests for the login server latency probe and health monitor."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import struct
+from unittest import mock
+
+import pytest
+
+from p99_sso_login_proxy import config, health, resolver, stats
+from p99_sso_login_proxy import soe_protocol as soe
+
+CRC_KEY = 0x0BADF00D
+
+
+class _FakeLoginServer(asyncio.DatagramProtocol):
+    """Answers SessionRequests and records everything it receives."""
+
+    def __init__(self):
+        self.received: list[bytes] = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received.append(data)
+        if soe.get_transport_opcode(data) == soe.TransportOp.SessionRequest:
+            connect_code = struct.unpack(">I", data[6:10])[0]
+            self.transport.sendto(
+                struct.pack(">HII", soe.TransportOp.SessionResponse, connect_code, CRC_KEY)
+                + bytes([2, 0, 0])
+                + struct.pack("<I", 512),
+                addr,
+            )
+
+
+def _monitor(addresses) -> health.LoginServerMonitor:
+    res = resolver.LoginServerResolver()
+    res._target = config.EQEMU_ADDR
+    res._addresses = list(addresses)
+    res._expires = math.inf
+    return health.LoginServerMonitor(res, interval=30)
+
+
+def test_probe_times_a_session_and_disconnects_it():
+    async def _run():
+        loop = asyncio.get_running_loop()
+        transport, server = await loop.create_datagram_endpoint(_FakeLoginServer, local_addr=("127.0.0.1", 0))
+        monitor = _monitor([transport.get_extra_info("sockname")])
+        with mock.patch.object(stats, "PROXY_STATS", stats.ProxyStats()) as proxy_stats:
+            await monitor.probe_all()
+            await asyncio.sleep(0.05)
+        transport.close()
+        return server, proxy_stats
+
+    server, proxy_stats = asyncio.run(_run())
+    request, disconnect = server.received
+    assert soe.get_transport_opcode(request) == soe.TransportOp.SessionRequest
+    assert soe.get_transport_opcode(disconnect) == soe.TransportOp.SessionDisconnect
+    assert soe.SessionCrc(CRC_KEY, 2).verify(disconnect)
+    assert disconnect[2:6] == request[6:10], "the disconnect names the probe's own session"
+    assert proxy_stats.login_server_state == stats.LOGIN_SERVER_UP
+    assert proxy_stats.login_server_loss == 0
+    assert proxy_stats.login_server_warning() is None
+
+
+def test_unanswered_probe_is_lost(monkeypatch):
+    monkeypatch.setattr(health, "PROBE_TIMEOUT", 0.05)
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        # A bound socket that never answers.
+        silent, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, local_addr=("127.0.0.1", 0))
+        monitor = _monitor([silent.get_extra_info("sockname")])
+        rtt = await monitor.probe(silent.get_extra_info("sockname"))
+        silent.close()
+        return rtt
+
+    assert asyncio.run(_run()) is None
+
+
+def test_health_states_and_routing_feedback():
+    addr_a, addr_b = ("10.0.0.1", 5998), ("10.0.0.2", 5998)
+    monitor = _monitor([addr_a, addr_b])
+    for _ in range(health.DOWN_AFTER):
+        monitor.record(addr_a, None)
+        monitor.record(addr_b, 0.9)
+    assert monitor.address_health(addr_a)[0] == stats.LOGIN_SERVER_DOWN
+    state, p50, p95, loss = monitor.summary()
+    assert (state, p50, p95, loss) == (stats.LOGIN_SERVER_SLOW, 0.9, 0.9, 0)
+    assert monitor.login_server.pick() == addr_b, "a down address is routed around"
+
+    monitor.record(addr_a, 0.03)
+    assert monitor.address_health(addr_a)[0] == stats.LOGIN_SERVER_UP
+    assert monitor.summary()[0] == stats.LOGIN_SERVER_UP
+
+
+def test_unresolved_login_server_is_unknown_and_probing_continues(monkeypatch):
+    monitor = _monitor([])
+    assert monitor.summary() == (stats.LOGIN_SERVER_UNKNOWN, None, None, None)
+
+    rounds = []
+
+    async def _probe_all():
+        rounds.append(len(rounds))
+        if len(rounds) == 1:
+            raise OSError("resolver blew up")
+
+    monitor.interval = 0.01
+    monkeypatch.setattr(monitor, "probe_all", _probe_all)
+
+    async def _run():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        task = monitor._task
+        monitor.stop()
+        return task
+
+    task = asyncio.run(_run())
+    assert len(rounds) > 1, "a failed round does not end the probe loop"
+    assert task.cancelled()
+
+
+@pytest.mark.parametrize(
+    ("state", "p50", "loss", "text", "warns"),
+    [
+        (stats.LOGIN_SERVER_UNKNOWN, None, None, "Unknown", False),
+        (stats.LOGIN_SERVER_DOWN, None, 1.0, "Down (100% loss)", True),
+        (stats.LOGIN_SERVER_SLOW, 0.8, 0.1, "Slow - 800 ms (p95 800 ms), 10% loss", True),
+        (stats.LOGIN_SERVER_UP, 0.042, 0.0, "Up - 42 ms (p95 42 ms), 0% loss", False),
+    ],
+)
+def test_proxy_stats_health_text(state, p50, loss, text, warns):
+    proxy_stats = stats.ProxyStats()
+    proxy_stats.update_login_server_health(state, p50, p50, loss)
+    assert proxy_stats.get_login_server_health() == text
+    assert (proxy_stats.login_server_warning() is not None) == warns
+
+
+def test_logging_stats_report_state_changes_once(caplog):
+    proxy_stats = stats.LoggingProxyStats()
+    with caplog.at_level(logging.INFO, logger="stats"):
+        proxy_stats.update_login_server_health(stats.LOGIN_SERVER_DOWN, None, None, 1.0)
+        proxy_stats.update_login_server_health(stats.LOGIN_SERVER_DOWN, None, None, 1.0)
+    assert [r.levelno for r in caplog.records] == [logging.WARNING]
@@ -0,0 +1,102 @@
+"""Allocation benchmark for the packet forwarding path.
+
+Forwarding should hold a datagram in at most a couple of buffers: the
+``bytearray`` rewritten in place and the framed datagram handed to the
+socket (plus the retransmit window's copy for sequenced client packets).
+These tests measure the traced-memory high-water mark while one large
+packet goes through the proxy, in units of the packet size, so a stray
+``bytes()``/slice copy creeping back into the pipeline fails here.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import struct
+import tracemalloc
+
+import pytest
+from conftest import connect
+
+from p99_sso_login_proxy import config
+from p99_sso_login_proxy import soe_protocol as soe
+
+CLIENT = ("127.0.0.1", 4001)
+CRC_KEY = 0xABCD
+# Big enough that fixed per-packet overhead is noise next to a copy.
+PAYLOAD = 4000
+
+
+class _Transport:
+    def __init__(self):
+        self.sent: list[bytes] = []
+
+    def sendto(self, data, addr=None):
+        self.sent.append(data)
+
+
+@pytest.fixture
+def proxy(monkeypatch, make_proxy):
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    proxy = make_proxy()
+    proxy.transport = _Transport()
+    connect(proxy, CLIENT, CRC_KEY)
+    proxy.transport.sent.clear()
+    return proxy
+
+
+def _copies_while(forward, packets) -> float:
+    """Return the worst high-water mark, in packet sizes, over *packets*."""
+    worst = 0.0
+    for packet in packets:
+        view = memoryview(packet)
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            forward(view)
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+        worst = max(worst, peak / len(packet))
+    return worst
+
+
+def _wire(op: int, seq: int) -> bytes:
+    return soe.SessionCrc(CRC_KEY, 2).append(struct.pack(">HH", op, seq) + bytes(PAYLOAD))
+
+
+@pytest.mark.parametrize(
+    ("op", "budget"),
+    [
+        (soe.TransportOp.Ack, 2.5),
+        # Sequenced packets also keep one copy in the retransmit window.
+        (soe.TransportOp.Packet, 3.5),
+    ],
+)
+def test_client_to_server_copies(proxy, op, budget):
+    packets = [_wire(op, seq) for seq in range(1, 6)]
+    copies = _copies_while(lambda view: proxy.handle_client_packet(view, CLIENT), packets)
+    assert len(proxy.transport.sent) == len(packets)
+    assert copies <= budget, f"client->server forwarding holds {copies:.2f} copies of each packet"
+
+
+def test_server_to_client_copies(proxy):
+    packets = [_wire(soe.TransportOp.Packet, seq) for seq in range(5)]
+    copies = _copies_while(lambda view: proxy.handle_server_packet(view, config.EQEMU_ADDR), packets)
+    assert len(proxy.transport.sent) == len(packets)
+    assert copies <= 2.5, f"server->client forwarding holds {copies:.2f} copies of each packet"
+
+
+def test_queued_forwarding_copies(proxy):
+    """Inside the loop sends are queued (one copy) and framed at the flush."""
+    packets = [_wire(soe.TransportOp.Ack, seq) for seq in range(1, 6)]
+
+    def _forward(view):
+        proxy.handle_client_packet(view, CLIENT)
+        proxy.flush_outbound()
+
+    async def _run():
+        return _copies_while(_forward, packets)
+
+    copies = asyncio.run(_run())
+    assert len(proxy.transport.sent) == len(packets)
+    assert copies <= 2.5, f"queued forwarding holds {copies:.2f} copies of each packet"
@@ -0,0 +1,87 @@
+"""Tests for pre-warming the login path before the first Login packet."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+from conftest import session_request
+from websockets.asyncio.server import serve
+
+from p99_sso_login_proxy import config, ws_client
+
+
+class _FlakySso:
+    """Stand-in SSO endpoint that turns away its first connection."""
+
+    def __init__(self, first: str):
+        # "drop": close without a word; "refuse": reject the token.
+        self.first = first
+        self.connections = 0
+
+    async def handler(self, ws) -> None:
+        self.connections += 1
+        await ws.recv()  # auth
+        if self.connections == 1:
+            if self.first == "refuse":
+                await ws.send(json.dumps({"type": "error", "detail": "Invalid access key"}))
+            return
+        await ws.send(json.dumps({"type": "full_state", "count": 0, "account_tree": {}}))
+        await ws.wait_closed()
+
+
+@pytest.fixture
+def ws_state(ws_state, monkeypatch):
+    # Long enough that only a pre-warm gets a second attempt within the test.
+    monkeypatch.setattr(ws_client, "RECONNECT_MIN", 30)
+
+
+async def _wait_for(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+@pytest.mark.parametrize("first", ["drop", "refuse"])
+def test_prewarm_reconnects_without_waiting(monkeypatch, ws_state, first):
+    async def _run():
+        sso = _FlakySso(first)
+        async with serve(sso.handler, "127.0.0.1", 0) as server:
+            monkeypatch.setattr(config, "SSO_API", f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            client = asyncio.create_task(ws_client.start())
+            assert await _wait_for(lambda: sso.connections == 1)
+            await asyncio.sleep(0.05)
+            assert not ws_client.is_connected()
+
+            ws_client.prewarm()
+            connected = await _wait_for(ws_client.is_connected)
+            await ws_client.stop()
+            assert client.done()
+        return connected, sso.connections
+
+    assert asyncio.run(_run()) == (True, 2)
+
+
+def test_first_session_request_prewarms_once(monkeypatch, make_proxy):
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    monkeypatch.setattr(config, "EQEMU_ADDR", ("127.0.0.1", 9))
+
+    async def _run():
+        proxy = make_proxy()
+        with (
+            mock.patch.object(ws_client, "prewarm") as ws_prewarm,
+            mock.patch.object(proxy.login_server, "refresh", mock.AsyncMock(return_value=True)) as refresh,
+            mock.patch.object(proxy.login_server_monitor, "probe_all", mock.AsyncMock()) as probe_all,
+        ):
+            proxy.handle_client_packet(session_request(), ("127.0.0.1", 4001))
+            proxy.handle_client_packet(session_request(), ("127.0.0.1", 4002))
+            await asyncio.sleep(0.01)
+        # Opening upstream sockets resolves too, so only require the refresh.
+        assert refresh.await_count >= 1
+        return ws_prewarm.call_count, probe_all.await_count
+
+    assert asyncio.run(_run()) == (1, 1)
@@ -0,0 +1,161 @@
+"""Tests for background login server resolution and address selection."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import socket
+from unittest import mock
+
+import pytest
+from conftest import session_request, session_response
+
+from p99_sso_login_proxy import config, resolver
+
+HOST = ("login.example.test", 5998)
+ADDR_A = ("10.0.0.1", 5998)
+ADDR_B = ("10.0.0.2", 5998)
+CLIENT = ("127.0.0.1", 4001)
+
+
+@pytest.fixture(autouse=True)
+def _login_host(monkeypatch):
+    monkeypatch.setattr(config, "EQEMU_ADDR", HOST)
+
+
+def _seed(res: resolver.LoginServerResolver, addresses):
+    """Mark *addresses* as a fresh lookup result."""
+    res._target = config.EQEMU_ADDR
+    res._addresses = list(addresses)
+    res._known.update(addresses)
+    res._expires = math.inf
+
+
+def _getaddrinfo_returning(*addresses):
+    async def _getaddrinfo(host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_DGRAM, 0, "", addr) for addr in addresses]
+
+    return _getaddrinfo
+
+
+def test_lookup_runs_on_the_loop_and_is_cached():
+    res = resolver.LoginServerResolver(refresh_interval=60)
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        lookup = mock.AsyncMock(side_effect=_getaddrinfo_returning(ADDR_A, ADDR_B, ADDR_A))
+        with mock.patch.object(loop, "getaddrinfo", lookup):
+            first = await res.resolve()
+            second = await res.resolve()
+        return first, second, lookup.await_count
+
+    first, second, lookups = asyncio.run(_run())
+    assert first == second == [ADDR_A, ADDR_B]
+    assert lookups == 1
+    assert res.is_server(ADDR_B)
+
+
+def test_failed_lookup_never_hands_out_the_hostname():
+    res = resolver.LoginServerResolver(refresh_interval=60)
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        with mock.patch.object(loop, "getaddrinfo", side_effect=socket.gaierror("no dns")):
+            return await res.refresh(), await res.resolve()
+
+    ok, addresses = asyncio.run(_run())
+    assert not ok
+    assert addresses == []
+    assert res.pick() is None
+    assert not res.is_server(HOST)
+
+
+def test_numeric_login_server_needs_no_lookup(monkeypatch):
+    monkeypatch.setattr(config, "EQEMU_ADDR", ADDR_A)
+    res = resolver.LoginServerResolver()
+    assert res.resolved
+    assert res.pick() == ADDR_A
+
+
+def test_pick_prefers_unmeasured_then_fastest_and_skips_failures():
+    res = resolver.LoginServerResolver()
+    _seed(res, [ADDR_A, ADDR_B])
+    res.record_rtt(ADDR_A, 0.080)
+    assert res.pick() == ADDR_B, "addresses without a measurement are tried first"
+    res.record_rtt(ADDR_B, 0.020)
+    assert res.pick() == ADDR_B
+    res.record_failure(ADDR_B)
+    assert res.pick() == ADDR_A
+    res.record_failure(ADDR_A)
+    assert res.pick() == ADDR_B, "with every address failing, the fastest is still used"
+
+
+def test_changed_config_address_is_not_served_from_stale_results(monkeypatch):
+    res = resolver.LoginServerResolver()
+    _seed(res, [ADDR_A])
+    monkeypatch.setattr(config, "EQEMU_ADDR", ("other.example.test", 6000))
+    assert not res.resolved
+    assert res.pick() is None
+
+
+@pytest.fixture
+def proxy(monkeypatch, make_proxy):
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    proxy = make_proxy()
+    _seed(proxy.login_server, [ADDR_A, ADDR_B])
+    return proxy
+
+
+def test_replies_from_any_resolved_address_reach_the_client(proxy):
+    proxy.datagram_received(bytes(session_request()), CLIENT)
+    client = proxy.clients[CLIENT]
+    assert proxy.transport.sendto.call_args.args[1] == client.server_addr
+    proxy.datagram_received(session_response(0x1111), client.server_addr)
+    assert client.in_session
+    assert proxy.transport.sendto.call_args.args[1] == CLIENT
+    assert client.server_addr in proxy.login_server._rtt
+
+
+def test_unanswered_session_request_fails_over(proxy):
+    proxy.handle_client_packet(session_request(), CLIENT)
+    client = proxy.clients[CLIENT]
+    first = client.server_addr
+    proxy.handle_client_packet(session_request(), CLIENT)
+    assert client.server_addr != first
+    assert {first, client.server_addr} == {ADDR_A, ADDR_B}
+    assert proxy.transport.sendto.call_args.args[1] == client.server_addr
+
+
+def test_datagrams_wait_for_a_retried_lookup(monkeypatch, make_proxy):
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    monkeypatch.setattr(resolver, "PENDING_RETRY_INTERVAL", 0)
+    proxy = make_proxy()
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        lookups = [socket.gaierror("no dns"), await _getaddrinfo_returning(ADDR_A)(*HOST)]
+        with mock.patch.object(loop, "getaddrinfo", mock.AsyncMock(side_effect=lookups)):
+            proxy.datagram_received(bytes(session_request()), CLIENT)
+            proxy.flush_outbound()
+            client = proxy.clients[CLIENT]
+            assert client.upstream_backlog == [bytes(session_request())]
+            await client.upstream_task
+
+    asyncio.run(_run())
+    client = proxy.clients[CLIENT]
+    assert client.server_addr == ADDR_A
+    assert proxy.transport.sendto.call_args.args == (bytes(session_request()), ADDR_A)
+    proxy.datagram_received(session_response(0x1111), ADDR_A)
+    assert client.in_session
+
+
+def test_a_failing_address_is_logged_once(caplog):
+    res = resolver.LoginServerResolver()
+    _seed(res, [ADDR_A, ADDR_B])
+    with caplog.at_level(logging.INFO, logger="resolver"):
+        for _ in range(3):
+            res.record_failure(ADDR_A)
+        res.record_rtt(ADDR_A, 0.05)
+        res.record_failure(ADDR_A)
+    assert len(caplog.records) == 2, "only going from answering to silent is logged"
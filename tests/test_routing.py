@@ -0,0 +1,82 @@
+"""Tests for the login-name routing index."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from p99_sso_login_proxy import config, local_characters, routing
+
+
+@pytest.fixture(autouse=True)
+def _sources(monkeypatch):
+    monkeypatch.setattr(config, "PROXY_ONLY", False)
+    monkeypatch.setattr(config, "SKIP_SSO_ACCOUNTS", ["mule"])
+    monkeypatch.setattr(config, "ALL_CACHED_NAMES", ["raidbox", "mule", "bankchar", "pal", "bigtag"])
+    monkeypatch.setattr(config, "LOCAL_ACCOUNTS", {"bankacct": {"password": "pw", "aliases": ["bank"]}})
+    monkeypatch.setattr(config, "LOCAL_ACCOUNT_NAME_MAP", {"bankacct": "bankacct", "bank": "bankacct"})
+    local_characters.set_entry({"name": "Bankchar", "account": "BankAcct"})
+    local_characters.set_entry({"name": "Orphan", "account": ""})
+
+
+@pytest.mark.parametrize(
+    ("name", "expected"),
+    [
+        ("raidbox", (routing.SSO, None)),
+        ("mule", (routing.SKIP_SSO, "mule")),
+        ("bank", (routing.LOCAL, "bankacct")),
+        ("bankchar", (routing.LOCAL_CHAR, "bankacct")),
+        ("orphan", (routing.LOCAL_CHAR, None)),
+        ("stranger", (routing.PASSTHROUGH, "stranger")),
+    ],
+)
+def test_routes_follow_dispatch_precedence(name, expected):
+    assert routing.route(name) == expected
+
+
+def test_proxy_only_overrides_every_name(monkeypatch):
+    monkeypatch.setattr(config, "PROXY_ONLY", True)
+    assert routing.route("raidbox") == (routing.PROXY_ONLY, "raidbox")
+
+
+def test_sources_changes_rebuild_eagerly_and_lookups_never_build(monkeypatch):
+    builds = []
+    real_build = routing.build
+    monkeypatch.setattr(routing, "build", lambda: builds.append(1) or real_build())
+
+    routing.route("raidbox")
+    routing.route("pal")
+    assert builds == [], "the fixture's edits already built the index"
+
+    # The account cache refresh replaces the roster list and announces it.
+    monkeypatch.setattr(config, "ALL_CACHED_NAMES", ["newbox"])
+    routing.invalidate()
+    assert routing.route("newbox") == (routing.SSO, None)
+    assert routing.route("raidbox")[0] == routing.PASSTHROUGH
+
+    config.LOCAL_ACCOUNT_NAME_MAP["bank"] = "otheracct"
+    routing.invalidate()
+    assert routing.route("bank") == (routing.LOCAL, "otheracct")
+
+    local_characters.delete_entry("Bankchar")
+    assert routing.route("bankchar")[0] == routing.PASSTHROUGH
+    assert len(builds) == 3
+
+
+def test_build_tolerates_concurrent_character_edits():
+    stop = threading.Event()
+
+    def _churn():
+        while not stop.is_set():
+            local_characters.set_entry({"name": "Churn", "account": "bankacct"})
+            local_characters.delete_entry("Churn")
+
+    thread = threading.Thread(target=_churn)
+    thread.start()
+    try:
+        for _ in range(200):
+            routing.invalidate()
+    finally:
+        stop.set()
+        thread.join()
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import struct
-from unittest import mock
 
+from conftest import add_client
+
+from p99_sso_login_proxy import login_protocol as lp
 from p99_sso_login_proxy import soe_protocol as soe
 
 
@@ -11,6 +14,22 @@ def test_crc_matches_eqemu_keyed_vectors():
     assert soe.soe_crc32(b"123456789", 0x12345678) == 0xAAD05244
 
 
+def test_session_crc_seed_matches_keyed_vectors():
+    crc = soe.SessionCrc(0x12345678, 4)
+    assert crc.compute(b"123456789") == 0xAAD05244
+    assert crc.append(b"123456789") == b"123456789" + struct.pack(">I", 0xAAD05244)
+
+
+def test_session_crc_verifies_two_and_four_byte_trailers():
+    for crc_bytes in (2, 4):
+        crc = soe.SessionCrc(0x12345678, crc_bytes)
+        wire = crc.append(b"\x00\x09\x00\x01payload")
+        assert crc.verify(wire)
+        corrupt = bytearray(wire)
+        corrupt[5] ^= 0x01
+        assert not crc.verify(corrupt)
+
+
 def test_duplicate_fragments_do_not_complete_with_gap():
     payload = bytes(range(40))
     fragments = soe.build_fragments(payload, 10, 16)
@@ -35,6 +54,15 @@ def test_duplicate_first_fragment_does_not_copy_total_length():
     assert assembler.add(23, fragments[3]) == payload
 
 
+def test_oversized_total_length_is_dropped_without_allocating():
+    first = bytearray(soe.build_fragments(bytes(40), 20, 16)[0])
+    first[soe.SUBSEQUENT_FRAG_OVERHEAD : soe.SUBSEQUENT_FRAG_OVERHEAD + 4] = (0xFFFFFFFF).to_bytes(4, "big")
+    assembler = soe.FragmentAssembler()
+
+    assert assembler.add(20, first) is None
+    assert not assembler.active
+
+
 def test_fragments_reassemble_across_sequence_wrap():
     payload = bytes(range(40))
     fragments = soe.build_fragments(payload, 0xFFFE, 16)
@@ -46,23 +74,316 @@ def test_fragments_reassemble_across_sequence_wrap():
     assert assembler.add(1, fragments[3]) == payload
 
 
-def test_proxy_applies_negotiated_crc_to_server_packets():
-    with mock.patch("p99_sso_login_proxy.ui.PROXY_STATS", new=mock.MagicMock()):
-        from p99_sso_login_proxy import server as server_mod
+def test_fragments_reassemble_out_of_order_into_single_view():
+    payload = bytes(range(256)) * 40
+    fragments = soe.build_fragments(payload, 100, 512)
+    assembler = soe.FragmentAssembler()
+
+    assert assembler.add(100, fragments[0]) is None
+    for i in range(len(fragments) - 1, 1, -1):
+        assert assembler.add(100 + i, fragments[i]) is None
+    result = assembler.add(101, fragments[1])
+
+    assert isinstance(result, memoryview)
+    assert result == payload
+    assembler.reset()
+    assert result == payload, "view must survive reset()"
+
+
+def test_combined_index_is_columnar():
+    long_sub = struct.pack(">HH", soe.TransportOp.Packet, 7) + b"x" * 300
+    ack_sub = struct.pack(">HH", soe.TransportOp.Ack, 3)
+    buf = soe.build_combined([ack_sub, long_sub])
+
+    cp = soe.CombinedPacket.parse(buf)
+
+    assert list(cp.ops) == [soe.TransportOp.Ack, soe.TransportOp.Packet]
+    assert list(cp.offsets) == [3, 10]
+    assert list(cp.lengths) == [4, 304]
+    assert cp.index_of(soe.TransportOp.Packet) == 1
+    assert cp.index_of(soe.TransportOp.Fragment) == -1
+    assert cp.sub_bytes(1) == long_sub
+    assert [sub.transport_op for sub in cp] == list(cp.ops)
+
+
+def test_coalesce_packets_respects_max_len_and_order():
+    ack = soe.build_ack(1)
+    packets = [soe.wrap_app_packet(seq, b"\x04\x00" + b"p" * 100) for seq in range(5)]
+    session_request = struct.pack(">HII", soe.TransportOp.SessionRequest, 2, 3)
+
+    out = soe.coalesce_packets([ack, *packets[:2], session_request, packets[2], soe.build_combined(packets[3:])], 250)
+
+    assert all(len(dgram) <= 250 for dgram in out)
+    assert out[1] == session_request, "non-combinable packets go out alone, in order"
+    flattened = []
+    for dgram in out:
+        if soe.get_transport_opcode(dgram) == soe.TransportOp.Combined:
+            flattened.extend(soe.parse_combined(dgram))
+        else:
+            flattened.append(dgram)
+    assert flattened == [ack, packets[0], packets[1], session_request, packets[2], packets[3], packets[4]]
+    assert len(out) == 4
+
+
+def test_build_combined_uses_long_length_prefix():
+    sub = b"\x00\x09" + b"z" * 300
+    assert soe.build_combined([sub]) == b"\x00\x03\xff\x01\x2e" + sub
 
-        proxy = server_mod.LoginProxy()
 
-    proxy.transport = mock.MagicMock()
-    proxy.client_addr = ("127.0.0.1", 4321)
+def test_proxy_applies_negotiated_crc_to_server_packets(proxy):
+    client = add_client(proxy, ("127.0.0.1", 4321))
     key = 0x12345678
     session_response = (
         struct.pack(">HII", soe.TransportOp.SessionResponse, 1, key) + bytes([2, 0, 0]) + struct.pack("<I", 512)
     )
-    proxy.handle_server_packet(session_response)
+    proxy.handle_server_packet(session_response, client=client)
 
     clean_packet = struct.pack(">HH", soe.TransportOp.Packet, 0) + b"\x17\x00payload"
     wire_packet = soe.append_crc(clean_packet, key, 2)
-    proxy.handle_server_packet(wire_packet)
+    proxy.handle_server_packet(wire_packet, client=client)
 
     sent = [bytes(call.args[0]) for call in proxy.transport.sendto.call_args_list]
     assert sent == [session_response, wire_packet]
+
+
+def test_proxy_drops_and_counts_packets_with_bad_crc(proxy):
+    client = add_client(proxy, ("127.0.0.1", 4321))
+    key = 0x12345678
+    session_response = (
+        struct.pack(">HII", soe.TransportOp.SessionResponse, 1, key) + bytes([2, 0, 0]) + struct.pack("<I", 512)
+    )
+    proxy.handle_server_packet(session_response, client=client)
+    proxy.transport.reset_mock()
+
+    wire_packet = bytearray(soe.append_crc(struct.pack(">HH", soe.TransportOp.Packet, 0) + b"\x17\x00", key, 2))
+    wire_packet[-1] ^= 0xFF
+    proxy.handle_server_packet(bytes(wire_packet), client=client)
+
+    assert proxy.transport.sendto.call_count == 0
+    assert proxy.corrupt_packets == 1
+
+
+def test_proxy_acks_server_list_fragments_when_enabled(monkeypatch, proxy):
+    from p99_sso_login_proxy import config
+
+    monkeypatch.setattr(config, "ACK_SERVER_FRAGMENTS", True)
+    client = add_client(proxy, ("127.0.0.1", 4321))
+    app_payload = b"\x18\x00" + bytes(16) + struct.pack("<I", 0) + bytes(1000)
+    fragments = soe.build_fragments(app_payload, 5, 512)
+
+    # Deliver out of order: the ACK only advances over the contiguous run.
+    proxy.handle_server_packet(fragments[0], client=client)
+    proxy.handle_server_packet(fragments[2], client=client)
+    proxy.handle_server_packet(fragments[1], client=client)
+
+    server_acks = [
+        soe.get_sequence(call.args[0])
+        for call in proxy.transport.sendto.call_args_list
+        if call.args[1] == config.EQEMU_ADDR
+    ]
+    assert server_acks == [5, 5, 7]
+    client_sent = [call.args[0] for call in proxy.transport.sendto.call_args_list if call.args[1] != config.EQEMU_ADDR]
+    assert len(client_sent) == 1, "only the rebuilt server list reaches the client"
+
+
+def test_retransmit_past_a_gap_acks_only_the_contiguous_run(monkeypatch, proxy):
+    from p99_sso_login_proxy import config
+
+    monkeypatch.setattr(config, "ACK_SERVER_FRAGMENTS", True)
+    client = add_client(proxy, ("127.0.0.1", 4321))
+    app_payload = b"\x18\x00" + bytes(16) + struct.pack("<I", 0) + bytes(1000)
+    fragments = soe.build_fragments(app_payload, 5, 512)
+
+    # 6 is lost; 7 arrives twice.
+    proxy.handle_server_packet(fragments[0], client=client)
+    proxy.handle_server_packet(fragments[2], client=client)
+    proxy.handle_server_packet(fragments[2], client=client)
+
+    server_acks = [
+        soe.get_sequence(call.args[0])
+        for call in proxy.transport.sendto.call_args_list
+        if call.args[1] == config.EQEMU_ADDR
+    ]
+    assert server_acks == [5, 5, 5], "the server must still resend 6"
+
+
+def test_codec_round_trips_and_only_compresses_when_smaller():
+    codec = soe.SoeCodec()
+    codec.configure(soe.ENCODE_COMPRESSION, 0)
+    big = soe.wrap_app_packet(3, b"\x18\x00" + b"Project 1999 " * 40)
+    small = soe.build_ack(9)
+
+    big_wire = codec.encode(big)
+    small_wire = codec.encode(small)
+
+    assert big_wire[2] == soe.COMPRESSED_FLAG and len(big_wire) < len(big)
+    assert small_wire == b"\x00\x15" + bytes((soe.UNCOMPRESSED_FLAG,)) + b"\x00\x09"
+    assert codec.decode(big_wire) == big
+    assert codec.decode(small_wire) == small
+
+
+def test_proxy_decodes_compressed_session_transparently(proxy):
+    client = add_client(proxy, ("127.0.0.1", 4321))
+    key = 0x12345678
+    session_response = (
+        struct.pack(">HII", soe.TransportOp.SessionResponse, 1, key)
+        + bytes([2, soe.ENCODE_COMPRESSION, 0])
+        + struct.pack("<I", 512)
+    )
+    proxy.handle_server_packet(session_response, client=client)
+    client.session.seq_to_client = 4
+
+    codec = soe.SoeCodec()
+    codec.configure(soe.ENCODE_COMPRESSION, 0)
+    clean_packet = soe.wrap_app_packet(0, b"\x16\x00" + b"welcome " * 30)
+    proxy.handle_server_packet(soe.append_crc(codec.encode(clean_packet), key, 2), client=client)
+
+    forwarded = proxy.transport.sendto.call_args_list[-1].args[0]
+    assert soe.SessionCrc(key, 2).verify(forwarded)
+    decoded = codec.decode(soe.strip_crc(forwarded, 2))
+    assert soe.get_sequence(decoded) == 4, "sequence rewrite must see the inflated packet"
+    assert decoded[4:] == clean_packet[4:]
+
+
+def test_proxy_answers_transport_probes_locally(monkeypatch, proxy):
+    from p99_sso_login_proxy import config
+
+    monkeypatch.setattr(config, "LOCAL_TRANSPORT_PROBES", True)
+    client = ("127.0.0.1", 4321)
+    session_response = struct.pack(">HII", soe.TransportOp.SessionResponse, 1, 0) + bytes(3) + struct.pack("<I", 512)
+    client_session = add_client(proxy, client)
+    proxy.handle_server_packet(session_response, client=client_session)
+    client_session.last_recv_time = 1e12  # keep the session from timing out
+    proxy.transport.reset_mock()
+
+    proxy.handle_client_packet(bytearray(soe.build_keepalive()), client)
+    stat_request = struct.pack(">HH20xQQ", soe.TransportOp.SessionStatRequest, 42, 7, 3)
+    proxy.handle_client_packet(bytearray(stat_request), client)
+
+    sends = proxy.transport.sendto.call_args_list
+    assert all(call.args[1] == client for call in sends), "nothing is forwarded upstream"
+    assert len(sends) == 1
+    response = bytes(sends[0].args[0])
+    op, request_id, _ts, client_sent, client_recv, server_sent, server_recv = struct.unpack(">HHIQQQQ", response)
+    assert (op, request_id, client_sent, client_recv) == (soe.TransportOp.SessionStatResponse, 42, 7, 3)
+    assert (server_sent, server_recv) == (1, 2), "SessionResponse went to the client; two probes came back"
+
+    proxy._upstream_keepalive(proxy.clients[client])
+    assert proxy.transport.sendto.call_args_list[-1].args == (soe.build_keepalive(), config.EQEMU_ADDR)
+    proxy.transport.reset_mock()
+    proxy._upstream_keepalive(proxy.clients[client])
+    assert proxy.transport.sendto.call_count == 0, "no keep-alive while upstream was recently used"
+
+
+def test_queued_datagrams_are_not_tied_to_the_callers_buffer(proxy):
+    client = add_client(proxy, ("127.0.0.1", 4321))
+
+    async def _run():
+        buf = bytearray(soe.build_ack(1))
+        proxy.send_to_client(client, buf)
+        buf[:] = soe.build_ack(7)
+        await asyncio.sleep(0)
+
+    asyncio.run(_run())
+    assert bytes(proxy.transport.sendto.call_args.args[0]) == soe.build_ack(1)
+
+
+def test_session_disconnect_stops_the_upstream_keepalive(monkeypatch, proxy):
+    from p99_sso_login_proxy import config
+
+    monkeypatch.setattr(config, "LOCAL_TRANSPORT_PROBES", True)
+    client = ("127.0.0.1", 4321)
+    session_response = struct.pack(">HII", soe.TransportOp.SessionResponse, 1, 0) + bytes(3) + struct.pack("<I", 512)
+
+    async def _run():
+        client_session = add_client(proxy, client)
+        proxy.handle_server_packet(session_response, client=client_session)
+        proxy.handle_client_packet(bytearray(soe.build_keepalive()), client)
+        handle = proxy.clients[client].keepalive_handle
+        assert handle is not None
+        proxy.handle_client_packet(bytearray(struct.pack(">HI", soe.TransportOp.SessionDisconnect, 0)), client)
+        return handle
+
+    handle = asyncio.run(_run())
+    assert handle.cancelled()
+    assert proxy.clients[client].keepalive_handle is None
+
+
+def _server_list_payload(names: list[str]) -> bytes:
+    entries = b"".join(
+        b"127.0.0.1\x00" + struct.pack("<II", i, i) + name.encode() + b"\x00EN\x00US\x00" + struct.pack("<II", 1, 0)
+        for i, name in enumerate(names)
+    )
+    return b"\x18\x00" + bytes(16) + struct.pack("<I", len(names)) + entries
+
+
+def test_server_list_is_refragmented_to_client_max_length():
+    from p99_sso_login_proxy.session import ProxySessionState
+
+    state = ProxySessionState()
+    state.max_packet_len = 128
+    state.seq_to_client = 3
+    payload = _server_list_payload([f"Project 1999 Test {i}" for i in range(8)] + ["Other Server"])
+
+    out = None
+    for frag in soe.build_fragments(payload, 0, 512):
+        out = state.recv_fragment(bytearray(frag))
+    assert out is not None
+
+    assert len(out) > 1
+    assert all(len(pkt) <= 128 for pkt in out)
+    assert [soe.get_sequence(pkt) for pkt in out] == list(range(3, 3 + len(out)))
+    assert state.seq_to_client == 3 + len(out)
+
+    assembler = soe.FragmentAssembler()
+    for pkt in out:
+        rebuilt = assembler.add(soe.get_sequence(pkt), pkt)
+    servers, _ = lp.parse_server_list(rebuilt)
+    assert [s.name for s in servers] == [f"Project 1999 Test {i}" for i in range(8)]
+
+
+def test_small_server_list_stays_a_single_packet():
+    from p99_sso_login_proxy.session import ProxySessionState
+
+    state = ProxySessionState()
+    payload = _server_list_payload(["Project 1999 Green", "Other Server"])
+    out = None
+    for frag in soe.build_fragments(payload, 0, 64):
+        out = state.recv_fragment(bytearray(frag))
+
+    assert out is not None and len(out) == 1
+    assert soe.get_transport_opcode(out[0]) == soe.TransportOp.Packet
+    assert state.seq_to_client == 1
+
+
+def test_cached_server_list_is_served_on_first_fragment_and_refreshed(proxy):
+    from p99_sso_login_proxy import config
+
+    proxy.server_list_cache.ttl = 30  # the cache is opt-in
+    client = add_client(proxy, ("127.0.0.1", 4321))
+    names = [f"Project 1999 Test {i}" for i in range(8)]
+    for frag in soe.build_fragments(_server_list_payload(names), 0, 256):
+        proxy.handle_server_packet(frag, client=client)
+    first_login = [bytes(call.args[0]) for call in proxy.transport.sendto.call_args_list]
+    assert len(first_login) == 1
+    assert proxy.server_list_cache.get() is not None
+
+    # Next box: same server list, new session.
+    client.session_free()
+    proxy.transport.reset_mock()
+    fragments = soe.build_fragments(_server_list_payload(names[:3]), 0, 64)
+    assert len(fragments) > 2
+    proxy.handle_server_packet(fragments[0], client=client)
+    assert [bytes(call.args[0]) for call in proxy.transport.sendto.call_args_list] == [
+        soe.build_ack(0),
+        first_login[0],
+    ], "cached list goes to the client on the first fragment, which the proxy ACKs itself"
+
+    for frag in fragments[1:]:
+        proxy.handle_server_packet(frag, client=client)
+    sends = proxy.transport.sendto.call_args_list
+    assert [call.args[1] for call in sends].count(client.addr) == 1, "the upstream copy is not forwarded"
+    assert sends[-1].args == (soe.build_ack(len(fragments) - 1), config.EQEMU_ADDR)
+
+    servers, _ = lp.parse_server_list(proxy.server_list_cache.get())
+    assert [s.name for s in servers] == names[:3], "cache is refreshed from the live upstream copy"
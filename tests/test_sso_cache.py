@@ -0,0 +1,121 @@
+"""Tests for the short-lived SSO credential cache."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest import mock
+
+import pytest
+from conftest import connect, login_combined
+
+from p99_sso_login_proxy import config, routing, ws_client
+from p99_sso_login_proxy import login_protocol as lp
+from p99_sso_login_proxy import soe_protocol as soe
+from p99_sso_login_proxy.sso_cache import SSO_CREDENTIALS, SsoCredentialCache
+
+CLIENT_A = ("127.0.0.1", 4001)
+CLIENT_B = ("127.0.0.1", 4002)
+ENCRYPTED = lp.encrypt_login_credentials("realacct", "sso-password")
+
+
+@pytest.fixture(autouse=True)
+def _sso(monkeypatch):
+    monkeypatch.setattr(config, "PROXY_ONLY", False)
+    monkeypatch.setattr(config, "USER_API_TOKEN", "token")
+    monkeypatch.setattr(config, "ALL_CACHED_NAMES", ["raidbox"])
+    monkeypatch.setattr(config, "ACCOUNTS_CACHED", {"realacct": {"aliases": ["raidbox"]}})
+    monkeypatch.setattr(config, "CHARACTERS_CACHED", [])
+    monkeypatch.setattr(config, "ACCOUNTS_CACHE_REAL_COUNT", 1)
+    monkeypatch.setattr(config, "ACCOUNTS_CACHE_TIMESTAMP", config.ACCOUNTS_CACHE_TIMESTAMP)
+    monkeypatch.setattr(SSO_CREDENTIALS, "ttl", 120)
+    monkeypatch.setattr(SSO_CREDENTIALS, "max_entries", 64)
+    routing.invalidate()
+    SSO_CREDENTIALS.clear()
+    yield
+    SSO_CREDENTIALS.clear()
+
+
+def test_entries_expire_and_are_bounded():
+    cache = SsoCredentialCache(ttl=60, max_entries=2)
+    with mock.patch("time.monotonic", return_value=1000.0):
+        cache.put("a", "acct1", b"1")
+        cache.put("b", "acct2", b"2")
+        assert cache.get("a") == ("acct1", b"1")
+        cache.put("c", "acct2", b"3")
+        assert cache.get("b") is None, "the least recently used name is dropped"
+    with mock.patch("time.monotonic", return_value=1061.0):
+        assert cache.get("a") is None
+    cache.put("c", "acct2", b"3")
+    cache.invalidate_account("ACCT2")
+    assert len(cache) == 0
+    assert SsoCredentialCache(ttl=0, max_entries=2).get("a") is None
+
+
+def _login(username: str) -> bytearray:
+    return bytearray(soe.append_crc(login_combined(username, seq=0), 0, 2))
+
+
+@pytest.fixture
+def proxy(monkeypatch, make_proxy):
+    monkeypatch.setattr(config, "PER_CLIENT_UPSTREAM", False)
+    monkeypatch.setattr(config, "EQEMU_ADDR", ("127.0.0.1", 9))
+    return make_proxy(login_auth=mock.AsyncMock(return_value=("realacct", ENCRYPTED, None)))
+
+
+def test_repeat_login_is_rewritten_without_asking_again(proxy):
+    async def _run():
+        connect(proxy, CLIENT_A)
+        proxy.handle_client_packet(_login("raidbox"), CLIENT_A)
+        assert proxy.clients[CLIENT_A].auth_in_flight
+        await asyncio.sleep(0.01)
+
+        connect(proxy, CLIENT_B)
+        proxy.handle_client_packet(_login("raidbox"), CLIENT_B)
+        # Rewritten and queued on the spot, no auth task.
+        session_b = proxy.clients[CLIENT_B]
+        assert not session_b.auth_in_flight
+        assert session_b.sso_retry_armed
+        return lp.LoginPacket.parse(bytearray(session_b.session.client_window.get(0)))
+
+    forwarded = asyncio.run(_run())
+    assert proxy._login_auth.await_count == 1
+    assert (forwarded.username, forwarded.password) == ("realacct", "sso-password")
+
+
+def test_refused_credentials_are_forgotten(proxy):
+    SSO_CREDENTIALS.put("raidbox", "realacct", ENCRYPTED)
+    connect(proxy, CLIENT_A)
+    client = proxy.clients[CLIENT_A]
+    client.sso_login_name = "raidbox"
+    client.sso_original_login = bytes(_login("raidbox"))[:-2]
+    proxy._fire_sso_retry(client, 1)
+    assert SSO_CREDENTIALS.get("raidbox") is None
+
+
+def test_auth_errors_are_not_cached(proxy):
+    proxy._login_auth.return_value = (None, None, "Account locked")
+
+    async def _run():
+        for addr in (CLIENT_A, CLIENT_B):
+            connect(proxy, addr)
+            proxy.handle_client_packet(_login("raidbox"), addr)
+            await asyncio.sleep(0.01)
+
+    asyncio.run(_run())
+    assert len(SSO_CREDENTIALS) == 0
+    assert proxy._login_auth.await_count == 2
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"changes": [{"action": "update", "account": "realacct", "fields": {"aliases": {"remove": ["raidbox"]}}}]},
+        {"changes": [{"action": "remove", "account": "realacct"}]},
+    ],
+)
+def test_delta_touching_the_account_forgets_it(message):
+    SSO_CREDENTIALS.put("raidbox", "realacct", ENCRYPTED)
+    SSO_CREDENTIALS.put("othername", "otheracct", ENCRYPTED)
+    ws_client._apply_delta(message)
+    assert SSO_CREDENTIALS.get("raidbox") is None
+    assert SSO_CREDENTIALS.get("othername") is not None
@@ -17,9 +17,9 @@ import struct
 import time
 from collections.abc import Iterable
 from pathlib import Path
-from unittest import mock
 
 import pytest
+from conftest import add_client
 
 from p99_sso_login_proxy import login_protocol as lp
 from p99_sso_login_proxy import soe_protocol as soe
@@ -27,6 +27,7 @@ from p99_sso_login_proxy.session import ProxySessionState
 
 CAPTURES_DIR = Path(__file__).resolve().parents[2] / "example_data"
 LOGIN_PORT = 5998
+CLIENT_ADDR = ("127.0.0.1", 4321)
 
 
 # ---------------------------------------------------------------------------
@@ -267,21 +268,16 @@ def _make_login_accepted_combined(account_id: int, status: int, server_seq: int
 
 
 @pytest.fixture
-def login_proxy():
-    """Stand up a ``LoginProxy`` with stubbed UI/transport for testing."""
-    with mock.patch("p99_sso_login_proxy.ui.PROXY_STATS", new=mock.MagicMock()):
-        from p99_sso_login_proxy import server as server_mod
+def login_client(proxy):
+    """A client of the shared ``proxy`` fixture, mid-session."""
+    client = add_client(proxy, CLIENT_ADDR)
 
-        proxy = server_mod.LoginProxy()
-        proxy.transport = mock.MagicMock()
-        proxy.client_addr = ("127.0.0.1", 4321)
-
-        # Mimic post-handshake state: ChatMessage (server seq=0) was forwarded.
-        proxy.in_session = True
-        proxy.last_recv_time = time.time()
-        proxy.session.seq_to_client = 1
-        proxy.session.seq_from_server = 1
-        yield proxy
+    # Mimic post-handshake state: ChatMessage (server seq=0) was forwarded.
+    client.in_session = True
+    client.last_recv_time = time.time()
+    client.session.seq_to_client = 1
+    client.session.seq_from_server = 1
+    return client
 
 
 def _server_sends(proxy) -> list[bytes]:
@@ -292,16 +288,16 @@ def _server_sends(proxy) -> list[bytes]:
 
 
 def _client_sends(proxy) -> list[bytes]:
-    return [bytes(call.args[0]) for call in proxy.transport.sendto.call_args_list if call.args[1] == proxy.client_addr]
+    return [bytes(call.args[0]) for call in proxy.transport.sendto.call_args_list if call.args[1] == CLIENT_ADDR]
 
 
-def test_armed_bad_password_combined_is_suppressed_and_retry_is_sent(login_proxy):
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
+def test_armed_bad_password_combined_is_suppressed_and_retry_is_sent(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
 
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
 
     # The surviving server Ack(1) of the client's original Login MUST reach
     # the client so the client retires its packet and doesn't retransmit.
@@ -329,24 +325,57 @@ def test_armed_bad_password_combined_is_suppressed_and_retry_is_sent(login_proxy
     assert parsed.username == "user"
     assert parsed.password == "userpass"
 
-    assert proxy._sso_retry_armed is False
-    assert proxy._sso_retry_fired is True
-    assert proxy.session.cs_offset == 1
-    assert proxy.session.seq_from_server == 2
-    assert proxy.session.seq_to_client == 1, "client did not see the bad packet, so its sequence must not advance"
+    assert client.sso_retry_armed is False
+    assert client.sso_retry_fired is True
+    assert client.session.cs_offset == 1
+    assert client.session.seq_from_server == 2
+    assert client.session.seq_to_client == 1, "client did not see the bad packet, so its sequence must not advance"
+
+
+def test_retry_ack_and_login_are_coalesced_within_one_tick(proxy, login_client, monkeypatch):
+    """Inside the event loop, the retry's ACK and replayed Login share one datagram."""
+    import asyncio
+
+    from p99_sso_login_proxy import config
+
+    monkeypatch.setattr(config, "COALESCE_OUTBOUND", True)
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
+
+    async def _run():
+        proxy.handle_server_packet(
+            _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1), client=client
+        )
+        assert proxy.transport.sendto.call_count == 0, "sends are deferred to the end of the tick"
+        await asyncio.sleep(0)
 
+    asyncio.run(_run())
 
-def test_armed_good_login_passes_through_without_retry(login_proxy):
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
+    server_sent = _server_sends(proxy)
+    assert len(server_sent) == 1, "ACK + retried Login must go out as one Combined"
+    subs = soe.parse_combined(server_sent[0])
+    assert subs[0] == soe.build_ack(1)
+    assert [soe.get_transport_opcode(sub) for sub in subs] == [
+        soe.TransportOp.Ack,
+        soe.TransportOp.Ack,
+        soe.TransportOp.Packet,
+    ]
+    assert soe.get_sequence(subs[2]) == 2
+    assert len(_client_sends(proxy)) == 1
+
+
+def test_armed_good_login_passes_through_without_retry(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
 
     good = _make_login_accepted_combined(account_id=1, status=0x0007390F, server_seq=1)
-    proxy.handle_server_packet(good)
+    proxy.handle_server_packet(good, client=client)
 
-    assert proxy._sso_retry_armed is False, "armed flag must clear after a real login result"
-    assert proxy._sso_retry_fired is False
-    assert proxy.session.cs_offset == 0, "no retry => no offset"
+    assert client.sso_retry_armed is False, "armed flag must clear after a real login result"
+    assert client.sso_retry_fired is False
+    assert client.session.cs_offset == 0, "no retry => no offset"
     assert _server_sends(proxy) == [], "no ACK or retry should be sent"
 
     # The good Combined must reach the client EXACTLY ONCE (the previous
@@ -357,46 +386,46 @@ def test_armed_good_login_passes_through_without_retry(login_proxy):
     assert soe.get_transport_opcode(forwarded) == soe.TransportOp.Combined
 
 
-def test_unarmed_bad_password_is_not_intercepted(login_proxy):
-    proxy = login_proxy
-    proxy._sso_retry_armed = False
+def test_unarmed_bad_password_is_not_intercepted(proxy, login_client):
+    client = login_client
+    client.sso_retry_armed = False
 
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
 
-    assert proxy.session.cs_offset == 0
+    assert client.session.cs_offset == 0
     assert _server_sends(proxy) == [], "no ACK or retry should be sent when not armed"
     # Without arming, the proxy is just a transparent forwarder: client gets
     # the same Combined the server sent, exactly once.
     assert len(_client_sends(proxy)) == 1
 
 
-def test_already_fired_retry_does_not_retry_again(login_proxy):
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = False
-    proxy._sso_retry_fired = True
+def test_already_fired_retry_does_not_retry_again(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = False
+    client.sso_retry_fired = True
 
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=2)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
 
     assert _server_sends(proxy) == [], "second bad response must not trigger another retry"
 
 
-def test_post_retry_client_combined_packet_is_shifted(login_proxy):
+def test_post_retry_client_combined_packet_is_shifted(proxy, login_client):
     """After a retry, a client OP_Combined[Ack, Packet] must have its inner
     OP_Packet sequence shifted by +1 before forwarding to the server."""
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
     proxy.transport.reset_mock()
 
     server_list_request = _build_combined_ack_then_packet(
         ack_seq=1, packet_seq=2, app_payload=struct.pack("<H", lp.AppOp.ServerListRequest) + b"\x00" * 12
     )
-    proxy.handle_client_packet(server_list_request, ("127.0.0.1", 4321))
+    proxy.handle_client_packet(server_list_request, CLIENT_ADDR)
 
     server_sent = _server_sends(proxy)
     assert len(server_sent) == 1
@@ -408,16 +437,16 @@ def test_post_retry_client_combined_packet_is_shifted(login_proxy):
     )
 
 
-def test_post_retry_standalone_client_op_packet_is_shifted(login_proxy):
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
+def test_post_retry_standalone_client_op_packet_is_shifted(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
     proxy.transport.reset_mock()
 
     standalone = bytearray(struct.pack(">HH", soe.TransportOp.Packet, 3) + b"\x04\x00" + b"\x00" * 12)
-    proxy.handle_client_packet(standalone, ("127.0.0.1", 4321))
+    proxy.handle_client_packet(standalone, CLIENT_ADDR)
 
     server_sent = _server_sends(proxy)
     assert len(server_sent) == 1
@@ -426,17 +455,17 @@ def test_post_retry_standalone_client_op_packet_is_shifted(login_proxy):
     assert soe.get_sequence(forwarded) == 4, "standalone Packet seq=3 must be forwarded as seq=4"
 
 
-def test_post_retry_good_login_combined_is_translated_and_forwarded_once(login_proxy):
+def test_post_retry_good_login_combined_is_translated_and_forwarded_once(proxy, login_client):
     """End-to-end: bad-password Combined intercepted, retry fired, GOOD
     LoginAccepted Combined arrives, must be rewritten once and forwarded once.
     """
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
 
     # Bad-password response (server-seq=1).
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
     proxy.transport.reset_mock()
 
     # Server now responds to our retry with Combined[Ack(2), LoginAccepted(seq=2, good)].
@@ -445,7 +474,7 @@ def test_post_retry_good_login_combined_is_translated_and_forwarded_once(login_p
     cp = soe.CombinedPacket.parse(good)
     ack_sub = next(s for s in cp if s.transport_op == soe.TransportOp.Ack)
     soe.set_sequence(good, ack_sub.offset, 2)
-    proxy.handle_server_packet(good)
+    proxy.handle_server_packet(good, client=client)
 
     client_sent = _client_sends(proxy)
     assert len(client_sent) == 1, "good Combined must be forwarded EXACTLY ONCE post-retry"
@@ -463,22 +492,22 @@ def test_post_retry_good_login_combined_is_translated_and_forwarded_once(login_p
 
     # Session counters: seq_to_client advances from 1->2 (client sees 1 packet
     # forwarded), seq_from_server advances from 2->3.
-    assert proxy.session.seq_to_client == 2
-    assert proxy.session.seq_from_server == 3
+    assert client.session.seq_to_client == 2
+    assert client.session.seq_from_server == 3
 
 
-def test_post_retry_standalone_server_ack_is_translated(login_proxy):
+def test_post_retry_standalone_server_ack_is_translated(proxy, login_client):
     """A standalone server Ack post-retry must have cs_offset subtracted."""
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
     bad = _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1)
-    proxy.handle_server_packet(bad)
+    proxy.handle_server_packet(bad, client=client)
     proxy.transport.reset_mock()
 
     # Server sends standalone Ack(2) acknowledging our retry Login.
     raw_ack = bytearray(struct.pack(">HH", soe.TransportOp.Ack, 2))
-    proxy.handle_server_packet(raw_ack)
+    proxy.handle_server_packet(raw_ack, client=client)
 
     client_sent = _client_sends(proxy)
     assert len(client_sent) == 1
@@ -487,21 +516,96 @@ def test_post_retry_standalone_server_ack_is_translated(login_proxy):
     assert soe.get_sequence(out) == 1, "Ack(2) must be translated to Ack(1)"
 
 
-def test_session_disconnect_resets_retry_state(login_proxy):
-    proxy = login_proxy
-    proxy._sso_original_login = bytes(_make_login_combined("user", "userpass"))
-    proxy._sso_retry_armed = True
-    proxy._sso_retry_fired = True
-    proxy.session.cs_offset = 1
-    proxy.session.seq_from_server = 5
+def test_session_disconnect_resets_retry_state(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
+    client.sso_retry_fired = True
+    client.session.cs_offset = 1
+    client.session.seq_from_server = 5
 
     proxy.handle_client_packet(
         bytearray(struct.pack(">HHI", soe.TransportOp.SessionDisconnect, 0, 0)),
-        ("127.0.0.1", 4321),
+        CLIENT_ADDR,
+    )
+
+    assert client.sso_original_login is None
+    assert client.sso_retry_armed is False
+    assert client.sso_retry_fired is False
+    assert client.session.cs_offset == 0
+    assert client.session.seq_from_server == 0
+
+
+# ---------------------------------------------------------------------------
+# Retransmission windows
+# ---------------------------------------------------------------------------
+def test_server_retransmission_reuses_client_seq_without_advancing():
+    s = ProxySessionState()
+    s.seq_to_client = 1
+    s.seq_from_server = 1
+    s.note_suppressed_server_packet(1)
+
+    first = bytearray(struct.pack(">HH", soe.TransportOp.Packet, 2) + b"\x00\x00")
+    s.recv_packet(first)
+    assert soe.get_sequence(first) == 1
+
+    again = bytearray(struct.pack(">HH", soe.TransportOp.Packet, 2) + b"\x00\x00")
+    s.recv_packet(again)
+    assert soe.get_sequence(again) == 1, "retransmission must keep its original client seq"
+    assert s.seq_to_client == 2
+    assert s.seq_from_server == 3
+
+
+def test_retransmit_window_evicts_oldest():
+    from p99_sso_login_proxy.session import RetransmitWindow
+
+    w = RetransmitWindow(size=2)
+    w.put(1, "a")
+    w.put(2, "b")
+    w.put(3, "c")
+    assert 1 not in w
+    assert w.get(3) == "c"
+    assert len(w) == 2
+
+
+def test_retransmitted_suppressed_login_accepted_is_reacked_and_dropped(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
+    proxy.handle_server_packet(
+        _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1), client=client
+    )
+    proxy.transport.reset_mock()
+
+    proxy.handle_server_packet(
+        _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1), client=client
+    )
+
+    assert _server_sends(proxy) == [soe.build_ack(1)], "duplicate must only be re-ACKed, not retried again"
+    client_sent = _client_sends(proxy)
+    assert len(client_sent) == 1, "only the surviving Ack reaches the client"
+    assert soe.get_transport_opcode(client_sent[0]) == soe.TransportOp.Ack
+    assert client.session.cs_offset == 1
+
+
+def test_retransmitted_client_packet_replays_forwarded_bytes(proxy, login_client):
+    client = login_client
+    client.sso_original_login = bytes(_make_login_combined("user", "userpass"))
+    client.sso_retry_armed = True
+    proxy.handle_server_packet(
+        _make_login_accepted_combined(account_id=27392, status=0xFFFFFFFF, server_seq=1), client=client
     )
+    proxy.transport.reset_mock()
+
+    def _request():
+        return _build_combined_ack_then_packet(
+            ack_seq=1, packet_seq=2, app_payload=struct.pack("<H", lp.AppOp.ServerListRequest) + b"\x00" * 12
+        )
+
+    proxy.handle_client_packet(_request(), CLIENT_ADDR)
+    proxy.handle_client_packet(_request(), CLIENT_ADDR)
 
-    assert proxy._sso_original_login is None
-    assert proxy._sso_retry_armed is False
-    assert proxy._sso_retry_fired is False
-    assert proxy.session.cs_offset == 0
-    assert proxy.session.seq_from_server == 0
+    first, second = _server_sends(proxy)
+    assert first == second, "the retransmission must be forwarded exactly as the original was"
+    cp = soe.CombinedPacket.parse(bytearray(second))
+    assert soe.get_sequence(second, cp.offsets[cp.index_of(soe.TransportOp.Packet)]) == 3
@@ -0,0 +1,69 @@
+"""Tests for the hashed timer wheel behind session expiry."""
+
+from __future__ import annotations
+
+import asyncio
+
+from p99_sso_login_proxy.timer_wheel import TimerWheel
+
+
+def test_items_fire_once_their_deadline_passes():
+    fired = []
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        wheel = TimerWheel(lambda item: fired.append((item, loop.time())), tick=0.02, slots=8)
+        start = loop.time()
+        wheel.schedule("soon", 0.05)
+        wheel.schedule("later", 0.3)  # more than one revolution out
+        wheel.schedule("dropped", 0.05)
+        wheel.discard("dropped")
+        await asyncio.sleep(0.45)
+        return start, len(wheel)
+
+    start, remaining = asyncio.run(_run())
+    assert [item for item, _ in fired] == ["soon", "later"]
+    assert fired[0][1] - start >= 0.05
+    assert fired[1][1] - start >= 0.3
+    assert remaining == 0
+
+
+def test_callback_can_push_the_deadline_back():
+    checks = []
+
+    def _on_expire(item):
+        checks.append(item)
+        return 0.04 if len(checks) < 3 else None
+
+    async def _run():
+        wheel = TimerWheel(_on_expire, tick=0.02, slots=4)
+        wheel.schedule("session", 0.04)
+        await asyncio.sleep(0.3)
+        return wheel
+
+    wheel = asyncio.run(_run())
+    assert checks == ["session"] * 3
+    assert "session" not in wheel
+    assert wheel._handle is None, "the wheel stops ticking once empty"
+
+
+def test_a_failing_callback_does_not_stop_the_wheel(caplog):
+    fired = []
+
+    def _on_expire(item):
+        if item == "broken":
+            raise RuntimeError("boom")
+        fired.append(item)
+
+    async def _run():
+        wheel = TimerWheel(_on_expire, tick=0.02, slots=8)
+        wheel.schedule("broken", 0.02)
+        wheel.schedule("fine", 0.02)
+        await asyncio.sleep(0.1)
+        wheel.schedule("after", 0.02)
+        await asyncio.sleep(0.1)
+        return len(wheel)
+
+    assert asyncio.run(_run()) == 0
+    assert fired == ["fine", "after"]
+    assert "broken" in caplog.text
@@ -0,0 +1,107 @@
+"""Tests for the SO_REUSEPORT worker pool and its auth IPC channel."""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+
+import pytest
+
+from p99_sso_login_proxy import config, server, workers, ws_client
+
+
+def test_worker_auth_round_trips_through_parent(monkeypatch):
+    monkeypatch.setattr(config, "ALL_CACHED_NAMES", ["raidbox"])
+    lookups = []
+
+    async def _fake_login_auth(username):
+        lookups.append(username)
+        return "realacct", b"\x01\x02\x03", None
+
+    monkeypatch.setattr(ws_client, "request_login_auth", _fake_login_auth)
+
+    async def _run():
+        parent_sock, child_sock = socket.socketpair()
+        parent_reader, parent_writer = await asyncio.open_connection(sock=parent_sock)
+        child_reader, child_writer = await asyncio.open_connection(sock=child_sock)
+        parent_task = asyncio.create_task(workers.serve_worker(parent_reader, parent_writer))
+        channel = workers.AuthChannel(child_reader, child_writer)
+        worker_task = asyncio.create_task(channel.serve())
+
+        result = await asyncio.wait_for(channel.request_login_auth("raidbox"), timeout=5)
+
+        parent_writer.close()
+        await asyncio.wait_for(worker_task, timeout=5)
+        late = await channel.request_login_auth("raidbox")
+        child_writer.close()
+        parent_task.cancel()
+        return result, late
+
+    result, late = asyncio.run(_run())
+
+    assert result == ("realacct", b"\x01\x02\x03", None)
+    assert lookups == ["raidbox"]
+    assert late[2], "requests after the parent goes away fail instead of hanging"
+
+
+def test_parent_pushes_cached_names_to_workers(monkeypatch):
+    monkeypatch.setattr(config, "ALL_CACHED_NAMES", ["alpha", "beta"])
+
+    async def _run():
+        parent_sock, child_sock = socket.socketpair()
+        parent_reader, parent_writer = await asyncio.open_connection(sock=parent_sock)
+        child_reader, child_writer = await asyncio.open_connection(sock=child_sock)
+        parent_task = asyncio.create_task(workers.serve_worker(parent_reader, parent_writer))
+        await asyncio.sleep(0)  # parent sends its initial snapshot
+        # Now play the worker, which starts out with an empty cache.
+        config.ALL_CACHED_NAMES = []
+        channel = workers.AuthChannel(child_reader, child_writer)
+        worker_task = asyncio.create_task(channel.serve())
+        await asyncio.sleep(0.05)
+        parent_writer.close()
+        await asyncio.wait_for(worker_task, timeout=5)
+        child_writer.close()
+        parent_task.cancel()
+
+    asyncio.run(_run())
+    assert config.ALL_CACHED_NAMES == ["alpha", "beta"]
+
+
+@pytest.mark.skipif(not workers.supported(), reason="SO_REUSEPORT not available")
+def test_workers_can_share_the_listen_port(monkeypatch, proxy_stats):
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    monkeypatch.setattr(config, "LISTEN_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "LISTEN_PORT", port)
+
+    async def _run():
+        first = await server.main(reuse_port=True)
+        second = await server.main(reuse_port=True)
+        ports = {t.get_extra_info("sockname")[1] for t in (first, second)}
+        first.close()
+        second.close()
+        return ports
+
+    assert asyncio.run(_run()) == {port}
+
+
+def test_only_the_first_worker_probes_the_login_server(monkeypatch):
+    calls = []
+
+    async def _fake_main(**kwargs):
+        calls.append(kwargs["probe_login_server"])
+        raise ConnectionError("stop here")
+
+    monkeypatch.setattr(server, "main", _fake_main)
+
+    async def _run(index):
+        parent_sock, child_sock = socket.socketpair()
+        with pytest.raises(ConnectionError):
+            await workers._run_worker(child_sock, index)
+        parent_sock.close()
+
+    for index in range(3):
+        asyncio.run(_run(index))
+    assert calls == [True, False, False]
@@ -0,0 +1,87 @@
+"""Tests for batching SSO login_auth requests, against a local stand-in server."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+
+import pytest
+from websockets.asyncio.server import serve
+
+from p99_sso_login_proxy import config, ws_client
+
+BOXES = [f"box{i}" for i in range(6)]
+
+
+class _StandInSso:
+    """Just enough of the SSO WebSocket endpoint to answer login lookups."""
+
+    def __init__(self, features: list[str]):
+        self.features = features
+        self.messages: list[dict] = []
+
+    @staticmethod
+    def _answer(request: dict) -> dict:
+        return {
+            "request_id": request["request_id"],
+            "real_user": f"acct_{request['username']}",
+            "encrypted_credentials": base64.b64encode(request["username"].encode()).decode(),
+        }
+
+    async def handler(self, ws) -> None:
+        async for raw in ws:
+            message = json.loads(raw)
+            self.messages.append(message)
+            if message["type"] == "auth":
+                await ws.send(
+                    json.dumps({"type": "full_state", "count": 0, "account_tree": {}, "features": self.features})
+                )
+            elif message["type"] == "login_auth":
+                await ws.send(json.dumps({"type": "login_auth_response", **self._answer(message)}))
+            elif message["type"] == "login_auth_batch":
+                responses = [self._answer(request) for request in message["requests"]]
+                await ws.send(json.dumps({"type": "login_auth_batch_response", "responses": responses}))
+
+
+@pytest.fixture(autouse=True)
+def _ws_state(ws_state, monkeypatch):
+    monkeypatch.setattr(config, "SSO_BATCH_WINDOW_MS", 5)
+
+
+def _login_group(monkeypatch, features: list[str], names: list[str] = BOXES):
+    async def _run():
+        sso = _StandInSso(features)
+        async with serve(sso.handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            monkeypatch.setattr(config, "SSO_API", f"http://127.0.0.1:{port}")
+            client = asyncio.create_task(ws_client.start())
+            for _ in range(200):
+                if ws_client.is_connected():
+                    break
+                await asyncio.sleep(0.01)
+            results = await asyncio.gather(*(ws_client.request_login_auth(name) for name in names))
+            await ws_client.stop()
+            assert client.done()
+        return sso.messages[1:], results
+
+    return asyncio.run(_run())
+
+
+def test_group_logins_share_one_batch(monkeypatch):
+    sent, results = _login_group(monkeypatch, ["login_auth_batch"])
+    assert [message["type"] for message in sent] == ["login_auth_batch"]
+    assert [request["username"] for request in sent[0]["requests"]] == BOXES
+    assert results == [(f"acct_{name}", name.encode(), None) for name in BOXES]
+
+
+def test_backend_without_batch_support_gets_single_requests(monkeypatch):
+    sent, results = _login_group(monkeypatch, [])
+    assert [message["type"] for message in sent] == ["login_auth"] * len(BOXES)
+    assert results == [(f"acct_{name}", name.encode(), None) for name in BOXES]
+
+
+def test_a_lone_login_is_sent_as_a_plain_request(monkeypatch):
+    sent, results = _login_group(monkeypatch, ["login_auth_batch"], ["solo"])
+    assert [message["type"] for message in sent] == ["login_auth"]
+    assert results == [("acct_solo", b"solo", None)]